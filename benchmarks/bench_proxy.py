@@ -0,0 +1,268 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+End-to-end benchmark of the pvsr-proxy-probe against a local fake PVSR.
+
+Starts benchmarks/fake_pvsr.py, builds the probe exactly as the main
+module does and drives mplane.scheduler.Scheduler with query and measure
+specifications. The measurements the queries read are created in the fake
+PVSR before the timing starts, as a query needs an existing measurement.
+Reports specs/s, p50/p99 latency, PVSR calls per spec and peak RSS.
+Run from the repository root:
+
+    python3 benchmarks/bench_proxy.py --queries 200 --measures 10
+
+"""
+
+import argparse
+import collections
+import datetime
+import inspect
+import logging
+import os.path
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_pvsr
+
+#the probe talks to the fake PVSR instead of the SOAP client
+sys.modules["pvsr_soap_client"] = fake_pvsr
+
+import mplane.model
+import pvsr_proxy_probe
+import pvsr_proxy_service
+import tornado.ioloop
+
+SECTION = "pvsr-bench"
+EQUIPMENT = "mPlane bench"
+TYPES = ("#YHA", "#YHR")
+
+def bench_config(args, url):
+    return {
+        "soap": {
+            "url": url,
+            "wsdl_url": url,
+            "user": "bench",
+            "password": "bench",
+            "max_sessions": args.sessions,
+        },
+        "default_site": "mPlane bench",
+        "delete_created_measurements": True,
+        "pvsr_default_conf_check_cycle": args.conf_check_cycle,
+        "measurement_journal": "",
+        "type_snapshot": "",
+        "watermark_poll_interval": 1,
+        "execution_mode": args.execution_mode,
+        "measurements": {
+            SECTION: {
+                "types": {
+                    "#YHA": {
+                        "first": "pvsr.availability"
+                    },
+                    "#YHR": {
+                        "first": "rtt.ms"
+                    }
+                },
+                #every URL has its own measurements, a query finds them by the index
+                "index_mplane_name": "url",
+                "equipment": EQUIPMENT
+            }
+        }
+    }
+
+def start_probe(args, url):
+    """
+    Same initialization as in pvsr_proxy_probe __main__, without the HTTP server.
+    In asyncio mode the IOLoop the HTTP server would run is started in a thread
+    """
+    pvsr_proxy_probe.config = bench_config(args, url)
+    pvsr_proxy_probe.parse_measurements_section()
+    pvsr_proxy_probe.parse_soap_section()
+    pvsr_proxy_probe.pvsr_defaults()
+    pvsr_proxy_probe.preload_soap_data()
+    pvsr_proxy_probe.start_runtime()
+    scheduler = pvsr_proxy_probe.create_scheduler()
+    if args.execution_mode == "asyncio":
+        thread = threading.Thread(target=tornado.ioloop.IOLoop.current().start, name="bench-ioloop")
+        thread.daemon = True
+        thread.start()
+    return scheduler
+
+def seed_measurements(server, args):
+    """
+    Creates the measurements of the distinct URLs queried, with the PVSR period
+    the probe would create them with for the period of the queries
+    """
+    native_period = max(p for p in pvsr_proxy_service.PvsrService.valid_periods if args.period % p == 0)
+    server.pvsr.seed(EQUIPMENT, "Y", TYPES, [query_url(n) for n in range(args.distinct_urls)], native_period, SECTION)
+
+def capability(scheduler, verb):
+    for service in scheduler.services:
+        if service.capability().verb() == verb:
+            return service.capability()
+    raise ValueError("No {0} capability".format(verb))
+
+def query_url(n):
+    return "http://bench/{0}".format(n)
+
+def query_spec(cap, n, args):
+    spec = mplane.model.Specification(capability=cap)
+    spec.set_parameter_value("url", query_url(n % args.distinct_urls))
+    #distinct windows, the scheduler merges identical specifications
+    end = int(time.time()) - args.watermark_lag - n * args.period
+    end -= end % args.period
+    start = end - args.query_duration
+    spec.set_when("{0} ... {1} / {2}s".format(
+        datetime.datetime.fromtimestamp(start).strftime("%Y-%m-%d %H:%M:%S"),
+        datetime.datetime.fromtimestamp(end).strftime("%Y-%m-%d %H:%M:%S"),
+        args.period))
+    return spec
+
+def measure_spec(cap, n, args):
+    spec = mplane.model.Specification(capability=cap)
+    spec.set_parameter_value("url", "http://bench/measure/{0}".format(n))
+    spec.set_when("now + {0}s / {1}s".format(args.measure_duration, args.period))
+    return spec
+
+def submit(scheduler, spec):
+    """
+    Submits a specification, handles both the old and the new scheduler interface
+    """
+    if "user" in inspect.signature(scheduler.submit_job).parameters:
+        receipt = scheduler.submit_job(None, spec)
+    else:
+        receipt = scheduler.submit_job(spec)
+    if not isinstance(receipt, mplane.model.Receipt):
+        raise ValueError("Specification rejected: {0}".format(receipt))
+    return scheduler.jobs[receipt.get_token()]
+
+def percentile(values, p):
+    if len(values) == 0:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def run(scheduler, specs, concurrency, timeout):
+    """
+    Runs the specifications with at most concurrency jobs in flight,
+    returns the latencies of the successful ones and the number of failures
+    """
+    latencies = []
+    failures = collections.Counter()
+    pending = collections.deque(specs)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if len(pending) == 0:
+                    return
+                (kind, spec) = pending.popleft()
+            started = time.monotonic()
+            try:
+                job = submit(scheduler, spec)
+                #a failed job never finishes
+                while not job.finished() and not job.failed():
+                    if time.monotonic() - started > timeout:
+                        job.interrupt()
+                        raise TimeoutError("timeout")
+                    time.sleep(0.005)
+                reply = job.get_reply()
+                if not isinstance(reply, mplane.model.Result):
+                    raise ValueError(str(reply))
+                with lock:
+                    latencies.append((kind, time.monotonic() - started))
+            except Exception as e:
+                logging.debug("{0} failed: {1}".format(kind, e))
+                with lock:
+                    failures[kind] += 1
+
+    threads = [threading.Thread(target=worker) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (latencies, failures)
+
+def main():
+    parser = argparse.ArgumentParser(description="pvsr-proxy-probe end-to-end benchmark")
+    parser.add_argument("--queries", type=int, default=200, help="number of query specifications")
+    parser.add_argument("--measures", type=int, default=0, help="number of measure specifications")
+    parser.add_argument("--concurrency", type=int, default=16, help="specifications in flight")
+    parser.add_argument("--period", type=int, default=60, help="period of the specifications in seconds")
+    parser.add_argument("--query-duration", type=int, default=86400, help="window of the queries in seconds")
+    parser.add_argument("--measure-duration", type=int, default=60, help="duration of the measures in seconds")
+    parser.add_argument("--distinct-urls", type=int, default=10, help="distinct measurements queried")
+    parser.add_argument("--latency", type=float, default=0.02, help="PVSR call latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="PVSR call jitter in seconds")
+    parser.add_argument("--values", type=int, default=2, help="values per sample")
+    parser.add_argument("--watermark-lag", type=int, default=0, help="seconds PVSR loads the data behind real time")
+    parser.add_argument("--conf-check-cycle", type=int, default=0, help="PVSR configuration check cycle")
+    parser.add_argument("--sessions", type=int, default=8, help="PVSR sessions")
+    parser.add_argument("--execution-mode", default="thread", choices=("thread", "asyncio"))
+    parser.add_argument("--timeout", type=float, default=600, help="timeout of a specification in seconds")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+
+    server = fake_pvsr.FakePvsrServer(args.latency, args.jitter, args.values, args.watermark_lag)
+    server.start()
+    if args.queries > 0:
+        seed_measurements(server, args)
+
+    scheduler = start_probe(args, server.url)
+    server.pvsr.calls.clear()
+
+    query_cap = capability(scheduler, mplane.model.VERB_QUERY)
+    measure_cap = capability(scheduler, mplane.model.VERB_MEASURE)
+    specs = [("measure", measure_spec(measure_cap, n, args)) for n in range(args.measures)]
+    specs += [("query", query_spec(query_cap, n, args)) for n in range(args.queries)]
+
+    started = time.monotonic()
+    (latencies, failures) = run(scheduler, specs, args.concurrency, args.timeout)
+    elapsed = time.monotonic() - started
+
+    done = len(latencies)
+    calls = sum(server.pvsr.calls.values())
+    print("specs:          {0} done, {1} failed in {2:.2f} s".format(done, sum(failures.values()), elapsed))
+    print("throughput:     {0:.1f} specs/s".format(done / elapsed))
+    for kind in ("query", "measure"):
+        values = [latency for (k, latency) in latencies if k == kind]
+        if len(values) > 0:
+            print("{0:<15} p50 {1:.3f} s, p99 {2:.3f} s".format(kind + ":", percentile(values, 50), percentile(values, 99)))
+    print("pvsr calls:     {0} total, {1:.2f} per spec".format(calls, calls / max(done, 1)))
+    for method, count in sorted(server.pvsr.calls.items()):
+        print("    {0:<30} {1}".format(method, count))
+    print("peak RSS:       {0:.1f} MiB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+    server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Local stand-in for the PVSR SOAP server used by the benchmarks.
+
+FakePvsrServer serves the PVSR calls used by the proxy over HTTP
+(XML-RPC on localhost, the PVSR WSDL is not needed) with configurable
+latency, jitter and data volume, and counts the calls per method.
+PvsrSoapClient is a drop-in replacement of pvsr_soap_client.PvsrSoapClient
+talking to it.
+
+"""
+
+import collections
+import datetime
+import random
+import socketserver
+import threading
+import time
+import xmlrpc.client
+import xmlrpc.server
+
+class PvsrObject(dict):
+    """
+    PVSR object with attribute access, marshalled as a dict
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+def _to_wire(value):
+    if isinstance(value, dict):
+        return dict((k, _to_wire(v)) for k,v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_to_wire(v) for v in value]
+    return value
+
+def _from_wire(value):
+    if isinstance(value, dict):
+        return PvsrObject((k, _from_wire(v)) for k,v in value.items())
+    if isinstance(value, list):
+        return [_from_wire(v) for v in value]
+    return value
+
+class _ThreadingXMLRPCServer(socketserver.ThreadingMixIn, xmlrpc.server.SimpleXMLRPCServer):
+    daemon_threads = True
+
+class FakePvsr(object):
+    """
+    In-memory PVSR model behind the server
+    """
+    def __init__(self, latency, jitter, values_per_sample, watermark_lag, uda_names):
+        self._latency = latency
+        self._jitter = jitter
+        self._values_per_sample = values_per_sample
+        self._watermark_lag = watermark_lag
+        self._uda_names = uda_names
+        self._lock = threading.Lock()
+        self._next_id = 100
+        self._sites = {}
+        self._equipments = {}
+        self._measurements = {}
+        self.calls = collections.Counter()
+
+    def _call(self, method):
+        with self._lock:
+            self.calls[method] += 1
+        delay = self._latency + random.uniform(0, self._jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def seed(self, equipment, collector_type, types, indexes, period, section):
+        """
+        Creates the equipment and a measurement of every type for every index,
+        as if they had existed before the benchmark. The calls are not counted
+        """
+        eq = {"Id": self._new_id(), "Name": equipment, "ParentId": 1, "CollectorType": collector_type, "IntervalInSec": 300}
+        self._equipments[equipment] = eq
+        for index in indexes:
+            for meas_type in types:
+                meas_id = self._new_id()
+                with self._lock:
+                    self._measurements[meas_id] = {
+                        "Id": meas_id,
+                        "ParentId": eq["Id"],
+                        "Type": meas_type,
+                        "Index": index,
+                        "DescriptionToShow": "{0} Fake {1}".format(section, meas_type),
+                        "IntervalInSec": period,
+                        "Parameter": [],
+                    }
+
+    def getSiteByName(self, name):
+        self._call("getSiteByName")
+        return self._sites.get(name)
+
+    def addSite(self, site):
+        self._call("addSite")
+        site["Id"] = self._new_id()
+        self._sites[site["Name"]] = site
+        return site
+
+    def getEquipmentByName(self, name):
+        self._call("getEquipmentByName")
+        return self._equipments.get(name)
+
+    def addEquipment(self, eq):
+        self._call("addEquipment")
+        eq["Id"] = self._new_id()
+        self._equipments[eq["Name"]] = eq
+        return eq
+
+    def listMeasurementTypes(self, meas_type):
+        self._call("listMeasurementTypes")
+        return [{
+            "Type": meas_type["Type"],
+            "Name": "Fake " + meas_type["Type"],
+            "PropertyType": [{"Name": name, "Required": "No"} for name in self._uda_names],
+        }]
+
+    def listMeasurements(self, meas):
+        self._call("listMeasurements")
+        with self._lock:
+            found = list(self._measurements.values())
+        for attr in ("ParentId", "Type", "Index", "DescriptionToShow"):
+            if meas.get(attr) is not None:
+                found = [m for m in found if m.get(attr) == meas[attr]]
+        return found
+
+    def addMeasurement(self, meas):
+        self._call("addMeasurement")
+        meas["Id"] = self._new_id()
+        with self._lock:
+            self._measurements[meas["Id"]] = meas
+        return meas
+
+    def modMeasurement(self, meas):
+        self._call("modMeasurement")
+        with self._lock:
+            self._measurements[meas["Id"]] = meas
+        return meas
+
+    def delMeasurement(self, meas):
+        self._call("delMeasurement")
+        with self._lock:
+            self._measurements.pop(meas["Id"], None)
+        return True
+
+    def getLastLoadedDataTimestamp(self, period):
+        self._call("getLastLoadedDataTimestamp")
+        loaded_until = int(time.time()) - self._watermark_lag
+        return datetime.datetime.fromtimestamp(loaded_until - loaded_until % period)
+
+    def getMeasuredValues(self, input):
+        self._call("getMeasuredValues")
+        with self._lock:
+            meas = self._measurements.get(input["ObjId"])
+        if meas is None:
+            return {"D": []}
+        period = meas.get("IntervalInSec", 300)
+        first_time = int(input["From"].timestamp())
+        first_time += (period - first_time % period) % period
+        last_time = min(int(input["To"].timestamp()), int(time.time()) - self._watermark_lag)
+        samples = []
+        for t in range(first_time, last_time + 1, period):
+            samples.append({
+                "T": datetime.datetime.fromtimestamp(t),
+                "V": [random.randint(0, 1000) for i in range(self._values_per_sample)],
+            })
+        return {"D": samples}
+
+class FakePvsrServer(object):
+    def __init__(self, latency=0.05, jitter=0.02, values_per_sample=2, watermark_lag=30, uda_names=(), port=0):
+        self.pvsr = FakePvsr(latency, jitter, values_per_sample, watermark_lag, list(uda_names))
+        self._server = _ThreadingXMLRPCServer(("127.0.0.1", port), logRequests=False, allow_none=True, use_builtin_types=True)
+        self._server.register_instance(self.pvsr)
+        self.url = "http://127.0.0.1:{0}/".format(self._server.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self._server.serve_forever, name="fake-pvsr")
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+
+class PvsrSoapClient(object):
+    """
+    Same interface as pvsr_soap_client.PvsrSoapClient, one session per instance
+    """
+    def __init__(self, url, user, password, wsdl_url):
+        self._proxy = xmlrpc.client.ServerProxy(url, allow_none=True, use_builtin_types=True)
+
+    def set_options(self, **options):
+        """
+        suds client options, the fake has none
+        """
+        pass
+
+    def create_pvsr_object(self, name):
+        obj = PvsrObject()
+        if name == "Measurement":
+            obj.Index = None
+            obj.DescriptionToShow = None
+            obj.Parameter = []
+        return obj
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        method = getattr(self._proxy, name)
+        def call(*args):
+            return _from_wire(method(*[_to_wire(arg) for arg in args]))
+        return call
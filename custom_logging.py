@@ -24,11 +24,17 @@
 """
 DailyTimedRotatingFileHandler module. Log file name format: <name>.YYYYMMDD.log
 
+QueuedDailyTimedRotatingFileHandler writes the same files from a dedicated
+writer thread, the logging threads only put the records onto a queue
+
 """
 
 import logging
 import datetime
 import os
+import queue
+import threading
+import time
 
 class DailyTimedRotatingFileHandler(logging.FileHandler):
     def __init__(self, filename, mode='a', encoding=None, delay=False):
@@ -38,11 +44,16 @@ class DailyTimedRotatingFileHandler(logging.FileHandler):
         logging.FileHandler.__init__(self, self._filename_with_date, mode, encoding, delay)
 
     def _calc_next_file_name(self):
-        now_datetime=datetime.datetime.now()
-        if self._next_rotate_at is not None and now_datetime<self._next_rotate_at:
+        """
+        The wall clock is only read at rotation, in between the precomputed
+        monotonic deadline of the next midnight is checked
+        """
+        if self._next_rotate_at is not None and time.monotonic()<self._next_rotate_at:
             return 0
+        now_datetime=datetime.datetime.now()
         self._filename_with_date=self._filename_without_date.format(now_datetime.year,now_datetime.month,now_datetime.day)
-        self._next_rotate_at=datetime.datetime.combine(now_datetime.date()+datetime.timedelta(1),datetime.time())
+        midnight=datetime.datetime.combine(now_datetime.date()+datetime.timedelta(1),datetime.time())
+        self._next_rotate_at=time.monotonic()+(midnight-now_datetime).total_seconds()
         return 1
 
     def emit(self, record):
@@ -58,3 +69,95 @@ class DailyTimedRotatingFileHandler(logging.FileHandler):
             raise
         except:
             self.handleError(record)
+
+class QueuedDailyTimedRotatingFileHandler(DailyTimedRotatingFileHandler):
+    """
+    Records are put onto a bounded in-memory queue and written in batches by
+    a writer thread. When the queue is full the record is dropped and counted
+    """
+    def __init__(self, filename, mode='a', encoding=None, delay=False, queue_size=100000, batch_size=512):
+        DailyTimedRotatingFileHandler.__init__(self, filename, mode, encoding, delay)
+        self._queue=queue.Queue(queue_size)
+        self._batch_size=batch_size
+        self._dropped=0
+        #counted by the logging threads, reset by the writer
+        self._dropped_lock=threading.Lock()
+        #logging.shutdown holds the handler lock while closing, the writer uses its own
+        self._write_lock=threading.Lock()
+        self._thread=threading.Thread(target=self._run,name="log-writer")
+        self._thread.daemon=True
+        self._thread.start()
+
+    def prepare(self, record):
+        """
+        Merges the arguments into the message in the logging thread, the
+        arguments may change before the writer thread formats the record
+        """
+        if record.args:
+            record.msg=record.getMessage()
+            record.args=None
+        if record.exc_info:
+            record.exc_text=logging.Formatter().formatException(record.exc_info)
+            record.exc_info=None
+        return record
+
+    def emit(self, record):
+        try:
+            self._queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped+=1
+        except (KeyboardInterrupt, SystemExit): #pragma: no cover
+            raise
+        except:
+            self.handleError(record)
+
+    def _run(self):
+        while True:
+            batch=[self._queue.get()]
+            while len(batch)<self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._write_lock:
+                for record in batch:
+                    if record is None:
+                        self._flush_stream()
+                        return
+                    self._write(record)
+                self._flush_stream()
+
+    def _write(self, record):
+        try:
+            if self._calc_next_file_name():
+                if self.stream:
+                    self.stream.close()
+                    self.stream = None
+                self.baseFilename = os.path.abspath(self._filename_with_date)
+            if self.stream is None:
+                self.stream = self._open()
+            with self._dropped_lock:
+                dropped,self._dropped=self._dropped,0
+            if dropped>0:
+                self.stream.write("{0} log records dropped, the log queue was full{1}".format(dropped,self.terminator))
+            self.stream.write(self.format(record)+self.terminator)
+        except Exception:
+            self.handleError(record)
+
+    def _flush_stream(self):
+        if self.stream and hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+    def flush(self):
+        with self._write_lock:
+            self._flush_stream()
+
+    def close(self):
+        """
+        Writes the queued records before closing the file
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(5)
+        DailyTimedRotatingFileHandler.close(self)
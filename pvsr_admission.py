@@ -0,0 +1,183 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Admission control of the specifications. At most max_running specifications
+call PVSR at once and at most the limit of the equipment on one PVSR equipment.
+The slots are held during the phases calling PVSR, not while a specification
+waits for its data to be loaded.
+The others wait in a bounded priority queue, a waiting specification is
+started as soon as both its equipment and the global limit allow it. When
+the queue is full the specification is rejected at once with a retry hint.
+Only the first phase of a specification can be rejected, the later phases
+of a started specification wait for their slot.
+
+"""
+
+import logging
+import math
+import threading
+import time
+
+PRIORITY_QUERY = 0
+PRIORITY_MEASURE = 1
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after):
+        Exception.__init__(self, "The PVSR proxy is overloaded, retry after {0} seconds".format(retry_after))
+        self.retry_after = retry_after
+
+class _Ticket(object):
+    def __init__(self, equipment, priority, seq):
+        self.equipment = equipment
+        self.priority = priority
+        self.seq = seq
+        self.granted = False
+
+class _Admission(object):
+    def __init__(self, controller, equipment, priority, reject):
+        self._controller = controller
+        self._equipment = equipment
+        self._priority = priority
+        self._reject = reject
+
+    def __enter__(self):
+        self._controller._acquire(self._equipment, self._priority, self._reject)
+        self._started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._controller._release(self._equipment, self._priority, time.monotonic() - self._started)
+        return False
+
+class AdmissionController(object):
+    def __init__(self, max_running, max_queued, equipment_limits, queue_timeout):
+        """
+        equipment_limits: {equipment name: limit}, equipments not listed are only globally limited
+        """
+        self._max_running = max_running
+        self._max_queued = max_queued
+        self._equipment_limits = equipment_limits
+        self._queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = 0
+        self._running = 0
+        self._running_per_equipment = {}
+        self._rejected = 0
+        #moving average of the time a slot is held, per priority
+        self._avg_duration = {PRIORITY_QUERY: 1.0, PRIORITY_MEASURE: 1.0}
+
+    def admit(self, equipment, priority, reject=True):
+        """
+        Context manager holding a slot while a phase of the specification calls PVSR,
+        raises AdmissionRejected if the phase cannot be started. Without reject it
+        waits for the slot as long as needed, for the phases of a specification
+        which already started calling PVSR
+        """
+        return _Admission(self, equipment, priority, reject)
+
+    def set_equipment_limits(self, equipment_limits):
+        """
+        Replaces the limits of the equipments, the running specifications keep their slots
+        """
+        with self._cond:
+            self._equipment_limits = equipment_limits
+            self._dispatch()
+
+    def stats(self):
+        """
+        (running, queued, rejected)
+        """
+        with self._cond:
+            return (self._running, len(self._queue), self._rejected)
+
+    def _can_run(self, equipment):
+        if self._running >= self._max_running:
+            return False
+        limit = self._equipment_limits.get(equipment)
+        return limit is None or self._running_per_equipment.get(equipment, 0) < limit
+
+    def _dispatch(self):
+        """
+        Grants slots to the waiting tickets in priority order
+        """
+        granted = False
+        for ticket in sorted(self._queue, key=lambda ticket: (ticket.priority, ticket.seq)):
+            if self._running >= self._max_running:
+                break
+            if self._can_run(ticket.equipment):
+                self._queue.remove(ticket)
+                self._grant(ticket.equipment)
+                ticket.granted = True
+                granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _grant(self, equipment):
+        self._running += 1
+        self._running_per_equipment[equipment] = self._running_per_equipment.get(equipment, 0) + 1
+
+    def _retry_after(self, priority):
+        """
+        Seconds until a slot is expected to be free for the priority
+        """
+        waiting = len([ticket for ticket in self._queue if ticket.priority <= priority])
+        return max(1, int(math.ceil(self._avg_duration[priority] * (1 + waiting / float(self._max_running)))))
+
+    def _reject(self, priority):
+        self._rejected += 1
+        retry_after = self._retry_after(priority)
+        logging.warning("Specification rejected, running: %s, queued: %s, retry after %s seconds", self._running, len(self._queue), retry_after)
+        raise AdmissionRejected(retry_after)
+
+    def _acquire(self, equipment, priority, reject):
+        with self._cond:
+            if len(self._queue) == 0 and self._can_run(equipment):
+                self._grant(equipment)
+                return
+            if reject and len(self._queue) >= self._max_queued:
+                self._reject(priority)
+            self._seq += 1
+            ticket = _Ticket(equipment, priority, self._seq)
+            self._queue.append(ticket)
+            self._dispatch()
+            deadline = time.monotonic() + self._queue_timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if not reject:
+                    self._cond.wait()
+                    continue
+                if remaining <= 0:
+                    self._queue.remove(ticket)
+                    self._reject(priority)
+                self._cond.wait(remaining)
+
+    def _release(self, equipment, priority, duration):
+        with self._cond:
+            self._running -= 1
+            self._running_per_equipment[equipment] -= 1
+            if self._running_per_equipment[equipment] == 0:
+                del self._running_per_equipment[equipment]
+            self._avg_duration[priority] = 0.8 * self._avg_duration[priority] + 0.2 * duration
+            self._dispatch()
@@ -0,0 +1,183 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+asyncio execution engine. Specifications run as coroutines on the event loop
+of the tornado IOLoop, the blocking SOAP client is called through a bounded
+thread pool, so a waiting specification does not hold a worker thread.
+The work which cannot be split into SOAP calls, e.g. a bulk specification
+or the building of a large result, runs in a second bounded thread pool,
+neither pool is shared with the HTTP handlers.
+AsyncScheduler submits the specifications of the services having run_async
+as tasks of the event loop instead of starting a thread per job.
+
+"""
+
+import asyncio
+import concurrent.futures
+import datetime
+import functools
+import logging
+import mplane.model
+import mplane.scheduler
+import pvsr_scheduler
+import pvsr_singleflight
+
+class AsyncEngine(object):
+    def __init__(self, ioloop, max_workers, max_blocking_workers):
+        self._loop = ioloop.asyncio_loop
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pvsr-soap")
+        self._blocking_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_blocking_workers, thread_name_prefix="pvsr-blocking")
+
+    def run(self, coro):
+        """
+        Runs the coroutine on the event loop and waits for its result.
+        Must not be called from the thread of the event loop
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def schedule(self, coro_fn, start_delay, interrupt=None, end_delay=None):
+        """
+        Starts the coroutine of coro_fn as a task after start_delay seconds,
+        interrupt is called after end_delay seconds unless it is None.
+        Can be called from any thread
+        """
+        def start():
+            if interrupt is not None and end_delay is not None:
+                self._loop.call_later(end_delay, interrupt)
+            self._loop.call_later(start_delay, lambda: self._loop.create_task(coro_fn()))
+        self._loop.call_soon_threadsafe(start)
+
+    async def call(self, fn, *args):
+        """
+        Calls a blocking function in the bounded executor
+        """
+        return await self._loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    async def run_blocking(self, fn, *args):
+        """
+        Calls a function which may block for long, e.g. a whole bulk specification,
+        in its own bounded executor, so it can starve neither the SOAP calls nor
+        the HTTP handlers using the default executor
+        """
+        return await self._loop.run_in_executor(self._blocking_executor, functools.partial(fn, *args))
+
+    async def wait_watermark(self, watermark, period, last_time, deadline, check_interrupt=None):
+        """
+        Coroutine variant of WatermarkPoller.wait. If check_interrupt is given
+        it is checked every second and the wait is abandoned when it returns True
+        """
+        future = self._loop.create_future()
+
+        def wake(loaded):
+            self._loop.call_soon_threadsafe(_set_result, future, loaded)
+
+        waiter = watermark.subscribe(period, last_time, deadline, wake)
+        try:
+            while True:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), 1)
+                except asyncio.TimeoutError:
+                    if check_interrupt is not None and check_interrupt():
+                        logging.info("Interrupted while waiting for period %s data until %s", period, last_time)
+                        return False
+        finally:
+            watermark.unsubscribe(waiter)
+
+    async def wait_flight(self, flight, first_time, last_time, check_interrupt=None):
+        """
+        Coroutine variant of pvsr_singleflight.Flight.wait, the attached
+        specification does not hold a thread while it waits
+        """
+        future = self._loop.create_future()
+        flight.subscribe(lambda: self._loop.call_soon_threadsafe(_set_result, future, None))
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), 1)
+                break
+            except asyncio.TimeoutError:
+                if check_interrupt is not None and check_interrupt():
+                    raise pvsr_singleflight.Interrupted()
+        return flight.result(first_time, last_time)
+
+def _set_result(future, result):
+    if not future.done():
+        future.set_result(result)
+
+class AsyncJob(mplane.scheduler.Job):
+    """
+    mplane.scheduler.Job awaiting run_async of the service on the event loop
+    instead of calling run in a thread of its own
+    """
+    def __init__(self, engine, service, specification, session=None, callback=None):
+        mplane.scheduler.Job.__init__(self, service, specification, session, callback)
+        self._engine = engine
+
+    def schedule(self):
+        if self.specification.is_schedulable():
+            (start_delay, end_delay) = self.specification.when().timer_delays()
+        else:
+            (start_delay, end_delay) = (0, None)
+        if start_delay is None:
+            return
+        self._engine.schedule(self._run_async, start_delay, self.interrupt, end_delay)
+
+    async def _run_async(self):
+        self._started_at = datetime.datetime.utcnow()
+        try:
+            self.result = await self.service.run_async(self.specification, self._check_interrupt)
+        except Exception as e:
+            logging.error("Specification %s failed: %s", self.specification, e)
+            self.exception = mplane.model.Exception(token=self.specification.get_token(), errmsg=str(e))
+            self._exception_at = datetime.datetime.utcnow()
+        self._ended_at = datetime.datetime.utcnow()
+
+        if self._callback:
+            self._callback(self.receipt)
+
+class AsyncScheduler(pvsr_scheduler.ReloadableScheduler):
+    """
+    mplane.scheduler.Scheduler running the single (not repeated) specifications
+    of the services having run_async as AsyncJobs. The other specifications
+    are submitted the usual way
+    """
+    def __init__(self, engine):
+        pvsr_scheduler.ReloadableScheduler.__init__(self)
+        self._engine = engine
+
+    def submit_job(self, user, specification, session=None, callback=None):
+        service = None
+        for candidate in self.services:
+            if specification.fulfills(candidate.capability()):
+                service = candidate
+                break
+        if service is None or not hasattr(service, "run_async") or specification.when().is_repeated() or not self.azn.check(service.capability(), user):
+            return mplane.scheduler.Scheduler.submit_job(self, user, specification, session, callback)
+
+        job = AsyncJob(self._engine, service, specification, session, callback)
+        job_key = job.receipt.get_token()
+        if job_key in self.jobs:
+            return self.jobs[job_key].receipt
+        job.schedule()
+        self.jobs[job_key] = job
+        return job.receipt
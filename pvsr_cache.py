@@ -0,0 +1,149 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Lookup cache in front of the PVSR SOAP client. Equipments, sites and
+measurement lists are kept for a per kind TTL in a size bounded LRU,
+the modifying calls invalidate the affected entries. A missing equipment
+or site is not cached, another process may create it any time. Every
+other call is passed through to the client.
+
+"""
+
+import collections
+import copy
+import threading
+import time
+
+class CachingPvsrClient(object):
+    kinds = ("equipment","site","measurements")
+
+    def __init__(self, pvsr, ttls, max_entries):
+        self._pvsr = pvsr
+        self._ttls = ttls
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._hits = dict((kind,0) for kind in CachingPvsrClient.kinds)
+        self._misses = dict((kind,0) for kind in CachingPvsrClient.kinds)
+
+    def __getattr__(self, name):
+        return getattr(self._pvsr, name)
+
+    def stats(self):
+        """
+        Hit and miss counters per object kind
+        """
+        with self._lock:
+            return dict((kind,(self._hits[kind],self._misses[kind])) for kind in CachingPvsrClient.kinds)
+
+    def _get(self, key):
+        """
+        Returns (True, copy of the value) for a valid entry, (False, None) otherwise
+        """
+        kind = key[0]
+        with self._lock:
+            if key in self._entries:
+                (expires_at,value) = self._entries[key]
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self._hits[kind] += 1
+                    return (True,copy.deepcopy(value))
+                del self._entries[key]
+            self._misses[kind] += 1
+        return (False,None)
+
+    def _put(self, key, value):
+        ttl = self._ttls[key[0]]
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.time()+ttl,copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _invalidate(self, match):
+        with self._lock:
+            for key in [key for key,entry in self._entries.items() if match(key,entry[1])]:
+                del self._entries[key]
+
+    def _cached_call(self, key, fn, *args):
+        (found,value) = self._get(key)
+        if found:
+            return value
+        value = fn(*args)
+        if value is not None:
+            self._put(key, value)
+        return value
+
+    def getEquipmentByName(self, name):
+        return self._cached_call(("equipment",name), self._pvsr.getEquipmentByName, name)
+
+    def getSiteByName(self, name):
+        return self._cached_call(("site",name), self._pvsr.getSiteByName, name)
+
+    def listMeasurements(self, meas):
+        key = ("measurements",) + tuple(getattr(meas, attr, None) for attr in ("ParentId","Type","Index","DescriptionToShow"))
+        return self._cached_call(key, self._pvsr.listMeasurements, meas)
+
+    def addSite(self, site):
+        res = self._pvsr.addSite(site)
+        self._invalidate(lambda key,value: key[0] == "site")
+        return res
+
+    def addEquipment(self, eq):
+        res = self._pvsr.addEquipment(eq)
+        self._invalidate(lambda key,value: key[0] == "equipment" and key[1] == eq.Name)
+        return res
+
+    def addMeasurement(self, meas):
+        res = self._pvsr.addMeasurement(meas)
+        self._invalidate_measurements(meas.ParentId, None)
+        return res
+
+    def modMeasurement(self, meas):
+        res = self._pvsr.modMeasurement(meas)
+        self._invalidate_measurements(getattr(meas, "ParentId", None), meas.Id)
+        return res
+
+    def delMeasurement(self, meas):
+        res = self._pvsr.delMeasurement(meas)
+        self._invalidate_measurements(getattr(meas, "ParentId", None), meas.Id)
+        return res
+
+    def _invalidate_measurements(self, parent_id, meas_id):
+        """
+        Drops the measurement lists of the equipment and every list containing the measurement
+        """
+        def match(key, value):
+            if key[0] != "measurements":
+                return False
+            if parent_id is not None and key[1] == parent_id:
+                return True
+            if meas_id is not None and value is not None:
+                for m in value:
+                    if getattr(m, "Id", None) == meas_id:
+                        return True
+            return False
+        self._invalidate(match)
@@ -0,0 +1,132 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Compact columnar encoding of query results, built directly from the arrays
+of the ResultGrids without converting the values to strings:
+    b"PVSRCOL1"        magic
+    uint32             length of the header, little endian
+    header             UTF-8 JSON object:
+                       label, token, first_time, period, rows, index_name,
+                       index_values, columns: [{name, type}]
+    columns            for every column of the header, in order:
+                       validity bitmap of the rows (numpy.packbits order)
+                       values of the rows as little endian numpy type
+
+The times of the rows are first_time+period, ..., first_time+rows*period.
+A bulk result has one block of rows per index value, in the order of
+index_values, the column arrays cover all blocks.
+
+"""
+
+import json
+import struct
+import numpy
+
+CONTENT_TYPE = "application/x-pvsr-columnar"
+MAGIC = b"PVSRCOL1"
+
+_INT_TYPES = (numpy.int8, numpy.int16, numpy.int32, numpy.int64)
+
+def _column_type(values, valid):
+    """
+    The smallest type holding the valid values of a column
+    """
+    if values.dtype.kind == "f":
+        return numpy.dtype("<f8")
+    if not valid.any():
+        return numpy.dtype("<i1")
+    lowest = values[valid].min()
+    highest = values[valid].max()
+    for int_type in _INT_TYPES:
+        info = numpy.iinfo(int_type)
+        if info.min <= lowest and highest <= info.max:
+            return numpy.dtype(int_type).newbyteorder("<")
+    return numpy.dtype("<f8")
+
+def encode(label, token, targets, index_name=None):
+    """
+    Encodes the grids of a result. targets: [(index value, ResultGrid)] of
+    a bulk result, [(None, ResultGrid)] otherwise. All grids have the same window
+    """
+    first = targets[0][1]
+    names = []
+    for (index_value, grid) in targets:
+        for name in grid.column_names():
+            if name not in names:
+                names.append(name)
+    
+    total = first.rows * len(targets)
+    columns = []
+    blocks = []
+    for name in names:
+        dtypes = [grid.values[name].dtype for (index_value, grid) in targets if name in grid.values]
+        values = numpy.zeros(total, dtype=numpy.result_type(*dtypes))
+        valid = numpy.zeros(total, dtype=bool)
+        for block, (index_value, grid) in enumerate(targets):
+            if name in grid.values:
+                values[block * first.rows:(block + 1) * first.rows] = grid.values[name]
+                valid[block * first.rows:(block + 1) * first.rows] = grid.valid[name]
+        dtype = _column_type(values, valid)
+        columns.append({"name": name, "type": dtype.str})
+        blocks.append(numpy.packbits(valid).tobytes())
+        blocks.append(values.astype(dtype).tobytes())
+    
+    header = {
+        "label": label,
+        "token": token,
+        "first_time": first.first_time,
+        "period": first.period,
+        "rows": first.rows,
+        "index_name": index_name,
+        "index_values": [index_value for (index_value, grid) in targets] if index_name is not None else None,
+        "columns": columns,
+    }
+    header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return b"".join([MAGIC, struct.pack("<I", len(header)), header] + blocks)
+
+def decode(data):
+    """
+    Decodes an encoded result into (header, {name: (values, valid)}),
+    the arrays cover all rows of all blocks
+    """
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a columnar PVSR result")
+    offset = len(MAGIC)
+    (length,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset + length].decode("utf-8"))
+    offset += length
+    
+    blocks = len(header["index_values"]) if header["index_values"] is not None else 1
+    total = header["rows"] * blocks
+    columns = {}
+    for column in header["columns"]:
+        dtype = numpy.dtype(column["type"])
+        size = (total + 7) // 8
+        valid = numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8, count=size, offset=offset))[:total].astype(bool)
+        offset += size
+        values = numpy.frombuffer(data, dtype=dtype, count=total, offset=offset)
+        offset += total * dtype.itemsize
+        columns[column["name"]] = (values, valid)
+    return (header, columns)
@@ -0,0 +1,80 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Bounded concurrent execution of SOAP calls. The shared thread pool limits
+the number of calls in flight globally, every map call limits its own.
+A map called from a call of another map runs inline, so nested maps cannot
+exhaust the pool and wait for each other.
+
+"""
+
+import concurrent.futures
+import threading
+
+class FanOut(object):
+    def __init__(self, max_workers, limit):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._limit = limit
+        self._local = threading.local()
+
+    def _call(self, fn, item):
+        self._local.nested = True
+        try:
+            return fn(item)
+        finally:
+            self._local.nested = False
+
+    def map(self, fn, items, limit=None):
+        """
+        Calls fn for every item with at most limit calls in flight and returns
+        the results in the order of the items. If a call fails the calls
+        already started are waited for and the first exception is raised
+        """
+        if limit is None:
+            limit = self._limit
+        items = list(items)
+        if limit <= 1 or len(items) <= 1 or getattr(self._local, "nested", False):
+            return [fn(item) for item in items]
+
+        results = [None] * len(items)
+        error = None
+        pending = {}
+        next_index = 0
+        while next_index < len(items) or len(pending) > 0:
+            while error is None and next_index < len(items) and len(pending) < limit:
+                pending[self._executor.submit(self._call, fn, items[next_index])] = next_index
+                next_index += 1
+            if len(pending) == 0:
+                break
+            (done, not_done) = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+        if error is not None:
+            raise error
+        return results
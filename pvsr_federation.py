@@ -0,0 +1,109 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Federation of several PVSR servers behind one proxy. Every backend has its
+own SOAP client stack and the objects following the state of its server,
+a measurements section can be bound to several backends. A specification
+of such a section runs on all of them concurrently and the grids are merged.
+A failed backend fails the specification unless the section allows partial
+results.
+
+"""
+
+import logging
+import threading
+import pvsr_result_grid
+
+DEFAULT_BACKEND = "default"
+
+class Backend(object):
+    """
+    One PVSR server. The runtime objects are filled in when the runtime starts
+    """
+    def __init__(self, name, url, pvsr, soap_pool):
+        self.name = name
+        self.url = url
+        self.pvsr = pvsr
+        self.soap_pool = soap_pool
+        self.watermark = None
+        self.reaper = None
+        self.lease_pool = None
+        self.series_cache = None
+
+def run_all(fn, items):
+    """
+    Calls fn for every item concurrently, the first one in the calling thread.
+    Returns (result, exception) of every item in the order of the items.
+    The calls get their own threads: nested in a FanOut call their own
+    provisioning and fetching would run sequentially
+    """
+    outcomes = [None] * len(items)
+    def call(index):
+        try:
+            outcomes[index] = (fn(items[index]), None)
+        except Exception as e:
+            outcomes[index] = (None, e)
+    
+    threads = []
+    for index in range(1, len(items)):
+        thread = threading.Thread(target=call, args=(index,), name="pvsr-federation")
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    call(0)
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def successful(names, outcomes, what, partial=False):
+    """
+    The results of the successful calls. The failed backends are logged, the
+    first exception is raised unless partial results are allowed, then they
+    are left out. If every backend failed the first exception is raised anyway
+    """
+    results = []
+    error = None
+    for name, (result, e) in zip(names, outcomes):
+        if e is not None:
+            logging.error("%s failed on backend %s: %s", what, name, e)
+            if error is None:
+                error = e
+        else:
+            results.append(result)
+    if error is not None and (not partial or len(results) == 0):
+        raise error
+    if error is not None:
+        logging.warning("%s: partial result of %s of %s backends", what, len(results), len(outcomes))
+    return results
+
+def merge(grids):
+    """
+    Merges the grids of the backends into the window of the first one, they
+    are read in the same window. Where the backends overlap the value of the
+    earlier backend is kept
+    """
+    grid = pvsr_result_grid.ResultGrid(grids[0].first_time, grids[0].last_time, grids[0].period)
+    for other in reversed(grids):
+        grid.update(other)
+    return grid
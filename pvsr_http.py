@@ -0,0 +1,329 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+HTTP server of the proxy. It serves the mPlane endpoints of
+mplane.httpsrv and the additional endpoints of the proxy:
+    /stream    POST a query specification, the result is returned
+               chunk by chunk, one JSON result per line. If it fails after
+               the first chunk, the last line is an mPlane exception
+    /metrics   GET the metrics in the Prometheus text format
+    /result    POST a specification, it is run and its result is returned
+               in the mPlane JSON or, if the Accept header asks for it, in
+               the columnar encoding of pvsr_encoding without building the
+               mPlane Result
+    /result/<token>
+               GET a result of /result again by its token. It supports
+               If-None-Match, a client polling an unchanged result gets a 304
+The responses are compressed with gzip or deflate above a size threshold.
+
+"""
+
+import functools
+import logging
+import zlib
+import pvsr_admission
+import pvsr_encoding
+import pvsr_result_store
+import mplane.httpsrv
+import mplane.model
+import tornado.httpserver
+import tornado.iostream
+import tornado.ioloop
+import tornado.web
+
+STREAM_PATH_ELEM = "stream"
+METRICS_PATH_ELEM = "metrics"
+RESULT_PATH_ELEM = "result"
+JSON_CONTENT_TYPE = "application/x-mplane+json"
+
+def parse_specification(body):
+    """
+    The specification in the body of a request, HTTP 400 if it is not one
+    """
+    try:
+        spec = mplane.model.parse_json(body.decode("utf-8"))
+    except Exception as e:
+        raise tornado.web.HTTPError(400, "Cannot parse the specification: {0}".format(e))
+    if not isinstance(spec, mplane.model.Specification):
+        raise tornado.web.HTTPError(400, "Only specifications are accepted")
+    return spec
+
+def find_service(scheduler, spec, method):
+    """
+    The service fulfilling the specification which has the method, None if there is none
+    """
+    for service in scheduler.services:
+        if hasattr(service, method) and spec.fulfills(service.capability()):
+            return service
+    return None
+
+def write_rejected(handler, e):
+    """
+    Answers a specification rejected by the admission control with 503 and Retry-After.
+    An HTTPError would not do, the headers are cleared when it is sent
+    """
+    handler.clear()
+    handler.set_status(503)
+    handler.set_header("Retry-After", str(e.retry_after))
+    handler.finish(str(e))
+
+class StreamHandler(tornado.web.RequestHandler):
+    def initialize(self, scheduler):
+        self.scheduler = scheduler
+        self._closed = False
+
+    def on_connection_close(self):
+        self._closed = True
+
+    async def post(self):
+        spec = parse_specification(self.request.body)
+        service = find_service(self.scheduler, spec, "iter_results")
+        if service is None:
+            raise tornado.web.HTTPError(404, "No service registered for specification")
+
+        try:
+            chunks = service.iter_results(spec, lambda: self._closed)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, "Invalid specification: {0}".format(e))
+        ioloop = tornado.ioloop.IOLoop.current()
+        self.set_header("Content-Type", JSON_CONTENT_TYPE)
+        flushed = False
+        try:
+            while not self._closed:
+                res = await ioloop.run_in_executor(None, next, chunks, None)
+                if res is None:
+                    break
+                self.write(mplane.model.unparse_json(res))
+                self.write("\n")
+                await self.flush()
+                flushed = True
+        except tornado.iostream.StreamClosedError:
+            logging.info("Stream of specification %s closed by the client", spec.get_token())
+        except Exception as e:
+            if not flushed:
+                #nothing is sent yet, the client gets a proper error status
+                if isinstance(e, pvsr_admission.AdmissionRejected):
+                    write_rejected(self, e)
+                    return
+                if isinstance(e, ValueError):
+                    raise tornado.web.HTTPError(400, "Invalid specification: {0}".format(e))
+                raise e
+            logging.error("Error during streaming specification %s: %s", spec.get_token(), e)
+            #the status is already sent, the client tells a truncated stream by the exception line
+            try:
+                self.write(mplane.model.unparse_json(mplane.model.Exception(token=spec.get_token(), errmsg=str(e))))
+                self.write("\n")
+                await self.flush()
+            except tornado.iostream.StreamClosedError:
+                pass
+        finally:
+            await ioloop.run_in_executor(None, chunks.close)
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def initialize(self, metrics):
+        self.metrics = metrics
+
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(self.metrics.render())
+
+def accepted_values(accept):
+    """
+    The values of an Accept or Accept-Encoding header with a positive quality, best first
+    """
+    values = []
+    for order, value in enumerate(accept.split(",")):
+        params = value.split(";")
+        quality = 1.0
+        for param in params[1:]:
+            (k, sep, v) = param.partition("=")
+            if k.strip() == "q":
+                try:
+                    quality = float(v)
+                except ValueError:
+                    quality = 0.0
+        if len(params[0].strip()) > 0 and quality > 0:
+            values.append((-quality, order, params[0].strip().lower()))
+    return [value for (quality, order, value) in sorted(values)]
+
+class CompressedContentEncoding(tornado.web.OutputTransform):
+    """
+    Compresses the responses of the compressible content types with gzip or
+    deflate, as the Accept-Encoding header of the request prefers. A response
+    written at once is only compressed from min_length bytes
+    """
+    CONTENT_TYPES = frozenset([JSON_CONTENT_TYPE, pvsr_encoding.CONTENT_TYPE, "application/json", "text/plain"])
+    WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+    def __init__(self, request, min_length=1024):
+        self._min_length = min_length
+        self._encoding = None
+        self._compressor = None
+        for encoding in accepted_values(request.headers.get("Accept-Encoding", "")):
+            if encoding in CompressedContentEncoding.WBITS:
+                self._encoding = encoding
+                break
+
+    def transform_first_chunk(self, status_code, headers, chunk, finishing):
+        if "Vary" in headers:
+            headers["Vary"] += ", Accept-Encoding"
+        else:
+            headers["Vary"] = "Accept-Encoding"
+        content_type = headers.get("Content-Type", "").split(";")[0].strip()
+        if (self._encoding is not None and content_type in CompressedContentEncoding.CONTENT_TYPES
+                and status_code not in (204, 304) and "Content-Encoding" not in headers
+                and (not finishing or len(chunk) >= self._min_length)):
+            headers["Content-Encoding"] = self._encoding
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, CompressedContentEncoding.WBITS[self._encoding])
+            chunk = self.transform_chunk(chunk, finishing)
+            if "Content-Length" in headers:
+                if finishing:
+                    headers["Content-Length"] = str(len(chunk))
+                else:
+                    del headers["Content-Length"]
+        return (status_code, headers, chunk)
+
+    def transform_chunk(self, chunk, finishing):
+        if self._compressor is None:
+            return chunk
+        #the chunks of a stream are flushed, so the client can decompress them as they arrive
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_FINISH if finishing else zlib.Z_SYNC_FLUSH)
+
+def negotiate(accept):
+    """
+    The content type of a result for the Accept header of the request,
+    the columnar encoding if it is preferred to the mPlane JSON
+    """
+    for media_type in accepted_values(accept):
+        if media_type == pvsr_encoding.CONTENT_TYPE:
+            return pvsr_encoding.CONTENT_TYPE
+        if media_type in (JSON_CONTENT_TYPE, "application/json", "*/*"):
+            break
+    return JSON_CONTENT_TYPE
+
+def encode_result(service, spec, targets, content_type):
+    """
+    The body of the result in the content type. The columnar encoding is built
+    from the grids, the mPlane Result is only built for the JSON
+    """
+    if content_type == pvsr_encoding.CONTENT_TYPE:
+        return pvsr_encoding.encode(service.capability().get_label(), spec.get_token(), targets, service.index_name())
+    return mplane.model.unparse_json(service.build_result(spec, targets)).encode("utf-8")
+
+class ResultHandler(tornado.web.RequestHandler):
+    """
+    POST a specification, it is run and its result is returned at once
+    in the encoding negotiated with the Accept header. The ETag of the
+    response is the one a GET of the stored result is validated with
+    """
+    def initialize(self, scheduler, result_store):
+        self.scheduler = scheduler
+        self.result_store = result_store
+        self._closed = False
+        self._etag = None
+
+    def on_connection_close(self):
+        self._closed = True
+
+    async def post(self):
+        spec = parse_specification(self.request.body)
+        service = find_service(self.scheduler, spec, "run_targets")
+        if service is None:
+            raise tornado.web.HTTPError(404, "No service registered for specification")
+        
+        content_type = negotiate(self.request.headers.get("Accept", ""))
+        self.set_header("Content-Type", content_type)
+        self.set_header("Vary", "Accept")
+        
+        ioloop = tornado.ioloop.IOLoop.current()
+        try:
+            targets = await ioloop.run_in_executor(None, service.run_targets, spec, lambda: self._closed)
+        except pvsr_admission.AdmissionRejected as e:
+            write_rejected(self, e)
+            return
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, "Invalid specification: {0}".format(e))
+        
+        #the version polls the watermarks of the backends and the encoding of a
+        #large result takes a while, neither blocks the IOLoop
+        version = await ioloop.run_in_executor(None, service.data_version, targets)
+        self._etag = pvsr_result_store.etag(spec.get_token(), content_type, version)
+        self.set_etag_header()
+        body = await ioloop.run_in_executor(None, encode_result, service, spec, targets, content_type)
+        if self.result_store is not None:
+            self.result_store.put(spec.get_token(), content_type, self._etag, body)
+        self.write(body)
+
+    def compute_etag(self):
+        return self._etag
+
+class StoredResultHandler(tornado.web.RequestHandler):
+    """
+    GET a result run through the /result endpoint again by its token
+    """
+    def initialize(self, result_store):
+        self.result_store = result_store
+        self._etag = None
+
+    def get(self, token):
+        content_type = negotiate(self.request.headers.get("Accept", ""))
+        stored = self.result_store.get(token, content_type)
+        if stored is None:
+            raise tornado.web.HTTPError(404, "No result for token {0}".format(token))
+        (self._etag, body) = stored
+        
+        self.set_header("Content-Type", content_type)
+        self.set_header("Vary", "Accept")
+        self.set_etag_header()
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        self.write(body)
+
+    def compute_etag(self):
+        return self._etag
+
+def runloop(scheduler, address=mplane.httpsrv.DEFAULT_LISTEN_IP4, port=mplane.httpsrv.DEFAULT_LISTEN_PORT, metrics=None, result_store=None, compress_min_length=None):
+    """
+    Variant of mplane.httpsrv.runloop serving the proxy specific endpoints as well.
+    The responses are compressed from compress_min_length bytes unless it is None
+    """
+    handlers = [
+            (r"/", mplane.httpsrv.MessagePostHandler, {'scheduler': scheduler}),
+            (r"/"+mplane.httpsrv.CAPABILITY_PATH_ELEM, mplane.httpsrv.DiscoveryHandler, {'scheduler': scheduler}),
+            (r"/"+mplane.httpsrv.CAPABILITY_PATH_ELEM+"/", mplane.httpsrv.DiscoveryHandler, {'scheduler': scheduler}),
+            (r"/"+STREAM_PATH_ELEM, StreamHandler, {'scheduler': scheduler}),
+        ]
+    if metrics is not None:
+        handlers.append((r"/"+METRICS_PATH_ELEM, MetricsHandler, {'metrics': metrics}))
+    handlers.append((r"/"+RESULT_PATH_ELEM, ResultHandler, {'scheduler': scheduler, 'result_store': result_store}))
+    if result_store is not None:
+        handlers.append((r"/"+RESULT_PATH_ELEM+r"/([^/]+)", StoredResultHandler, {'result_store': result_store}))
+    application = tornado.web.Application(handlers)
+    if compress_min_length is not None:
+        application.add_transform(functools.partial(CompressedContentEncoding, min_length=compress_min_length))
+    http_server = tornado.httpserver.HTTPServer(application)
+    http_server.listen(port, address)
+    logging.info("HTTP server is listening on %s:%s", address, port)
+    tornado.ioloop.IOLoop.current().start()
@@ -0,0 +1,155 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Reference counted lease pool of PVSR measurements. Measurements created by
+the proxy are not deleted when the specification ends, they are kept for an
+idle grace period so that later specifications with matching parameters can
+reuse them without waiting for the PVSR configuration check cycle again.
+An idle measurement handed to the reaper stays in the pool in reaping
+state until it is deleted, a specification claiming it in the meantime
+cancels the deletion or, if it is too late, does not use it.
+
+"""
+
+import logging
+import threading
+import time
+
+class _Lease(object):
+    def __init__(self, meas):
+        self.meas = meas
+        self.refs = 0
+        self.owned = False
+        self.ready_at = 0
+        self.idle_since = None
+        self.reaping = False
+
+class MeasurementLeasePool(object):
+    def __init__(self, reaper, idle_grace, conf_check_cycle):
+        self._reaper = reaper
+        self._idle_grace = idle_grace
+        self._conf_check_cycle = conf_check_cycle
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._thread = threading.Thread(target=self._run, name="pvsr-lease-gc")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def register(self, meas):
+        """
+        A measurement created by the proxy, it is deleted once it is idle for the grace period
+        """
+        with self._lock:
+            lease = self._lease(meas)
+            lease.owned = True
+            lease.ready_at = max(lease.ready_at, time.time() + self._conf_check_cycle)
+
+    def acquire(self, meas):
+        """
+        A measurement found in PVSR and used by a specification
+        """
+        with self._lock:
+            self._lease(meas)
+
+    def claim(self, meas):
+        """
+        Called before a specification reuses a measurement found in PVSR. Cancels
+        its pending deletion, the pool owns it again. Returns False if it is being
+        deleted, the specification must treat it as absent
+        """
+        with self._lock:
+            lease = self._leases.get(meas.Id)
+            if lease is not None and not lease.reaping:
+                return True
+            if not self._reaper.is_reaping(meas.Id):
+                return True
+            if not self._reaper.cancel(meas.Id):
+                return False
+            if lease is None:
+                #queued by a previous run, it is deleted once it is idle again
+                lease = _Lease(meas)
+                lease.owned = True
+                self._leases[meas.Id] = lease
+            lease.reaping = False
+            lease.idle_since = time.time()
+            return True
+
+    def _lease(self, meas):
+        if meas.Id not in self._leases:
+            self._leases[meas.Id] = _Lease(meas)
+        lease = self._leases[meas.Id]
+        lease.refs += 1
+        lease.idle_since = None
+        return lease
+
+    def release(self, meas):
+        with self._lock:
+            lease = self._leases.get(meas.Id)
+            if lease is None:
+                return
+            lease.refs -= 1
+            if lease.refs > 0:
+                return
+            if lease.owned:
+                lease.idle_since = time.time()
+            else:
+                del self._leases[meas.Id]
+
+    def held(self, meas):
+        """
+        True if a running specification uses the measurement
+        """
+        with self._lock:
+            lease = self._leases.get(meas.Id)
+            return lease is not None and lease.refs > 0
+
+    def ready_at(self, meas):
+        """
+        The time PVSR starts collecting the measurement, 0 if it is not known to be recent
+        """
+        with self._lock:
+            lease = self._leases.get(meas.Id)
+            return lease.ready_at if lease is not None else 0
+
+    def _collect(self):
+        now = time.time()
+        with self._lock:
+            for lease in self._leases.values():
+                if not lease.reaping and lease.idle_since is not None and lease.idle_since + self._idle_grace <= now:
+                    created = lease.meas
+                    logging.info("Idle measurement: type: %s, index: %s, name: %s", created.Type, created.Index, created.DescriptionToShow)
+                    #queued holding the lock, a claim sees it either idle or queued
+                    lease.reaping = True
+                    self._reaper.reap(created, self._reaped)
+
+    def _reaped(self, meas_id):
+        with self._lock:
+            lease = self._leases.get(meas_id)
+            if lease is not None and lease.reaping:
+                del self._leases[meas_id]
+
+    def _run(self):
+        while True:
+            time.sleep(max(1, min(self._idle_grace, 30)))
+            self._collect()
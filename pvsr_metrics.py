@@ -0,0 +1,212 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+In-process metrics of the proxy: counters, gauges and latency histograms
+with labels, rendered in the Prometheus text exposition format. Recording
+a value costs a dictionary lookup and a bisect under a lock. Statistics
+kept by other components are added as collectors, called only when the
+metrics are rendered.
+
+"""
+
+import bisect
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+class _Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _Timer(object):
+    def __init__(self, metrics, name, labels):
+        self._metrics = metrics
+        self._name = name
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.observe(self._name, self._labels, time.monotonic() - self._started)
+        return False
+
+class _InFlight(object):
+    def __init__(self, metrics, prefix, labels):
+        self._metrics = metrics
+        self._prefix = prefix
+        self._labels = labels
+
+    def __enter__(self):
+        self._metrics.add(self._prefix + "_in_flight", self._labels, 1)
+        self._started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.observe(self._prefix + "_seconds", self._labels, time.monotonic() - self._started)
+        self._metrics.add(self._prefix + "_in_flight", self._labels, -1)
+        status = "ok" if exc_type is None or exc_type is GeneratorExit else "error"
+        self._metrics.inc(self._prefix + "_total", self._labels + (("status", status),))
+        return False
+
+class Metrics(object):
+    """
+    Labels are passed as a tuple of (name, value) pairs
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def describe(self, name, help):
+        self._help[name] = help
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add(self, name, labels=(), value=1):
+        """
+        Changes a gauge, value can be negative
+        """
+        key = (name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self._buckets)
+            histogram.observe(value)
+
+    def timer(self, name, labels=()):
+        """
+        Context manager observing the elapsed seconds
+        """
+        return _Timer(self, name, labels)
+
+    def in_flight(self, prefix, labels=()):
+        """
+        Context manager maintaining the prefix_in_flight gauge, the prefix_total
+        counter per status and the prefix_seconds histogram
+        """
+        return _InFlight(self, prefix, labels)
+
+    def add_collector(self, collector):
+        """
+        collector() returns a list of (name, type, labels, value), type is counter or gauge
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """
+        All metrics in the Prometheus text format
+        """
+        with self._lock:
+            samples = [(name, "counter", labels, value) for (name, labels), value in self._counters.items()]
+            samples += [(name, "gauge", labels, value) for (name, labels), value in self._gauges.items()]
+            histograms = [(name, labels, list(h.counts), h.sum, h.count) for (name, labels), h in self._histograms.items()]
+        for collector in self._collectors:
+            samples += collector()
+        
+        families = {}
+        for (name, type, labels, value) in samples:
+            families.setdefault((name, type), []).append((name, labels, value))
+        for (name, labels, counts, sum, count) in histograms:
+            lines = families.setdefault((name, "histogram"), [])
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets, counts):
+                cumulative += bucket_count
+                lines.append((name + "_bucket", labels + (("le", _format_value(bound)),), cumulative))
+            lines.append((name + "_bucket", labels + (("le", "+Inf"),), count))
+            lines.append((name + "_sum", labels, sum))
+            lines.append((name + "_count", labels, count))
+        
+        out = []
+        for (name, type) in sorted(families.keys()):
+            if name in self._help:
+                out.append("# HELP {0} {1}".format(name, self._help[name]))
+            out.append("# TYPE {0} {1}".format(name, type))
+            for (sample_name, labels, value) in families[(name, type)]:
+                out.append("{0}{1} {2}".format(sample_name, _format_labels(labels), _format_value(value)))
+        return "\n".join(out) + "\n"
+
+def _format_labels(labels):
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join('{0}="{1}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels) + "}"
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class InstrumentedPvsrClient(object):
+    """
+    Times every PVSR SOAP call per method and counts the created and deleted measurements
+    """
+    local_calls = frozenset(["create_pvsr_object"])
+
+    def __init__(self, pvsr, metrics, labels=()):
+        self._pvsr = pvsr
+        self._metrics = metrics
+        self._labels = labels
+
+    def __getattr__(self, name):
+        attr = getattr(self._pvsr, name)
+        if name.startswith("_") or name in InstrumentedPvsrClient.local_calls or not callable(attr):
+            return attr
+        labels = (("method", name),) + self._labels
+        def call(*args, **kwargs):
+            started = time.monotonic()
+            try:
+                res = attr(*args, **kwargs)
+            except Exception:
+                self._metrics.inc("pvsr_soap_errors_total", labels)
+                raise
+            finally:
+                self._metrics.observe("pvsr_soap_call_seconds", labels, time.monotonic() - started)
+            if name == "addMeasurement":
+                self._metrics.inc("pvsr_measurements_created_total", self._labels)
+            elif name == "delMeasurement":
+                self._metrics.inc("pvsr_measurements_deleted_total", self._labels)
+            return res
+        return call
@@ -36,6 +36,25 @@ import logging.config
 import os.path
 import pvsr_soap_client
 import pvsr_proxy_service
+import pvsr_watermark
+import pvsr_async
+import pvsr_fanout
+import pvsr_cache
+import pvsr_series_cache
+import pvsr_http
+import pvsr_lease
+import pvsr_reaper
+import pvsr_warm
+import pvsr_soap_pool
+import pvsr_type_snapshot
+import pvsr_metrics
+import pvsr_admission
+import pvsr_singleflight
+import pvsr_result_grid
+import pvsr_workers
+import pvsr_federation
+import pvsr_result_store
+import pvsr_scheduler
 
 import re
 import mplane.httpsrv
@@ -44,8 +63,11 @@ import mplane.model
 import tornado.web
 import tornado.ioloop
 import json
-
-import pdb
+import threading
+import concurrent.futures
+import time
+import copy
+import signal
 
 def die(msg):
     """
@@ -60,7 +82,7 @@ def read_config_json():
     is pvsr_proxy_probe.cfg, this can be overwritten with the first command
     line parameter
     """
-    global config
+    global config, config_file_name, loaded_config
     
     try:
         if len(sys.argv) >= 2:
@@ -71,6 +93,8 @@ def read_config_json():
         config_file = open(config_file_name,'r')
         config = json.load(config_file)
         config_file.close()
+        #the parse functions fill in the defaults, a reload is compared to the file as it was read
+        loaded_config = copy.deepcopy(config)
     except FileNotFoundError:
         die("Configuration file {0} cannot be found".format(config_file_name))
     except ValueError as e:
@@ -105,37 +129,107 @@ def parse_logging_section():
 
 def parse_soap_section():
     """
-    PVSR SOAP connection parameters
+    PVSR SOAP connection parameters. The "soap" section is the default
+    backend, further PVSR servers can be named in the "backends" section
+    with the same parameters. A measurements section runs on the backends
+    listed in its "backends" parameter, on the default backend by default.
+    If one of them fails the specification fails, unless "partial_results"
+    of the section is true
     """
     logging.info("parse_soap_section")
     
     if "soap" not in config:
         die("Missing section 'soap' in the configuration file")
     
-    if "user" not in config["soap"]:
-        die("Missing parameter 'user' in section 'soap' in the configuration file")
+    global pvsr, soap_pool, metrics, backends
+    
+    if "cache" not in config:
+        config["cache"]={}
+    for kind,ttl in (("equipment",3600),("site",3600),("measurements",60)):
+        if kind+"_ttl" not in config["cache"]:
+            config["cache"][kind+"_ttl"]=ttl
+        logging.info("Caching PVSR {0} lookups for {1} seconds".format(kind,config["cache"][kind+"_ttl"]))
+    if "max_entries" not in config["cache"]:
+        config["cache"]["max_entries"]=10000
+    
+    metrics=pvsr_metrics.Metrics()
+    
+    backends={}
+    backends[pvsr_federation.DEFAULT_BACKEND]=create_backend(pvsr_federation.DEFAULT_BACKEND,config["soap"],"section 'soap'")
+    if "backends" in config:
+        for name in sorted(config["backends"].keys()):
+            if name==pvsr_federation.DEFAULT_BACKEND:
+                die("The backend name {0} is reserved for the 'soap' section".format(name))
+            backends[name]=create_backend(name,config["backends"][name],"backend {0}".format(name))
+    
+    #the measurement types are loaded from the default backend
+    pvsr=backends[pvsr_federation.DEFAULT_BACKEND].pvsr
+    soap_pool=backends[pvsr_federation.DEFAULT_BACKEND].soap_pool
+    
+    for name in sorted(config["measurements"].keys()):
+        try:
+            section_backends(config["measurements"][name])
+        except ValueError as e:
+            die(e)
+
+def create_backend(name, soap, section):
+    """
+    The SOAP client stack of one PVSR server
+    """
+    if "user" not in soap:
+        die("Missing parameter 'user' in {0} in the configuration file".format(section))
         
-    if "password" not in config["soap"]:
-        die("Missing parameter 'password' in section 'soap' in the configuration file")
+    if "password" not in soap:
+        die("Missing parameter 'password' in {0} in the configuration file".format(section))
         
-    if "url" in config["soap"]:
-        pvsr_url=config["soap"]["url"]
-    else:
-        pvsr_url="http://localhost:8082/"
-    logging.info("Using PVSR at {0}".format(pvsr_url))
+    if "url" not in soap:
+        soap["url"]="http://localhost:8082/"
+    pvsr_url=soap["url"]
+    logging.info("Using PVSR at {0} as backend {1}".format(pvsr_url,name))
         
-    if "wsdl_url" in config["soap"]:
-        wsdl_url=config["soap"]["wsdl_url"]
+    if "wsdl_url" in soap:
+        wsdl_url=soap["wsdl_url"]
     else:
         wsdl_url=("file:///"+re.sub(r'^(.*[\\/])[^\\/]+$',r'\1'+"PVSR.wsdl",os.path.abspath(__file__))).replace('\\','/')
     logging.info("Using WSDL at {0}".format(wsdl_url))
-    
-    global pvsr
 
+    for k,v in (("min_sessions",1),("max_sessions",8),("keep_alive",60),("idle_timeout",300),("checkout_timeout",30),("call_timeout",120)):
+        if k not in soap:
+            soap[k]=v
+    logging.info("Using {0} to {1} PVSR SOAP sessions".format(soap["min_sessions"],soap["max_sessions"]))
+    
+    def create_soap_client():
+        return pvsr_soap_client.PvsrSoapClient(pvsr_url,soap["user"],soap["password"],wsdl_url)
+    
     try:
-        pvsr=pvsr_soap_client.PvsrSoapClient(pvsr_url,config["soap"]["user"],config["soap"]["password"],wsdl_url)
+        soap_pool=pvsr_soap_pool.PvsrClientPool(
+            create_soap_client
+            ,soap["min_sessions"]
+            ,soap["max_sessions"]
+            ,soap["keep_alive"]
+            ,soap["idle_timeout"]
+            ,soap["checkout_timeout"]
+            ,soap["call_timeout"]
+        )
     except Exception as e:
         die(e)
+    
+    pvsr=pvsr_cache.CachingPvsrClient(
+        pvsr_metrics.InstrumentedPvsrClient(soap_pool,metrics,(("backend",name),))
+        ,dict((kind,config["cache"][kind+"_ttl"]) for kind in pvsr_cache.CachingPvsrClient.kinds)
+        ,config["cache"]["max_entries"]
+    )
+    return pvsr_federation.Backend(name,pvsr_url,pvsr,soap_pool)
+
+def section_backends(meas):
+    """
+    The backends of a measurements section, the first one runs the service
+    """
+    names=meas.get("backends",[pvsr_federation.DEFAULT_BACKEND])
+    for name in names:
+        if name not in backends:
+            raise ValueError("Unknown backend {0} in measurements section {1}".format(name,meas["name"]))
+    return [backends[name] for name in names]
 
 def parse_measurements_section():
     """
@@ -155,42 +249,123 @@ def parse_measurements_section():
     
     for name in sorted(config["measurements"].keys()):
         meas=config["measurements"][name]
-        
-        if "equipment" in meas:
-            logging.info("Using equipment {0}".format(meas["equipment"]))
-        else:
-            die("Missing parameter 'equipment' in measurements section {0}".format(name))
-        
-        if "types" not in meas:
-            die("Missing section 'types' in measurements section {0}".format(name))
-        if len(meas["types"])==0:
-            die("Empty section 'types' in measurements section {0}".format(name))
-        
-        meas["collector_type"]=None
-        meas["name"]=name
-        
-        if "verb_measure" not in meas:
-            meas["verb_measure"]=True
-        
-        if "verb_query" not in meas:
-            meas["verb_query"]=True
-            
-        if meas["verb_query"]==False and meas["verb_measure"]==False:
-            die("Neither verb_measure nor verb_query is True in measurements section {0}".format(name))
-        
+        try:
+            parse_measurement(name,meas)
+        except ValueError as e:
+            die(e)
         for k in meas["types"].keys():
-            if "first" not in meas["types"][k] and "second" not in meas["types"][k]:
-                die("Measurement section is missing either first or second, section {0} type {1}".format(name,k))
-            if len(k)>1 and k[0:1]=='#':
-                new_collector_type=k[1:2]
-            else:
-                new_collector_type="S"
-            if meas["collector_type"] is None:
-                meas["collector_type"]=new_collector_type
-            elif meas["collector_type"] != new_collector_type:
-                die("Only one collector type is allowed in one measurements section, section {0}".format(name))
             pvsr_meas_types[k] = None
 
+def parse_measurement(name, meas):
+    """
+    Validates one measurements section and fills in its defaults
+    """
+    if "equipment" in meas:
+        logging.info("Using equipment {0}".format(meas["equipment"]))
+    else:
+        raise ValueError("Missing parameter 'equipment' in measurements section {0}".format(name))
+    
+    if "types" not in meas:
+        raise ValueError("Missing section 'types' in measurements section {0}".format(name))
+    if len(meas["types"])==0:
+        raise ValueError("Empty section 'types' in measurements section {0}".format(name))
+    
+    meas["collector_type"]=None
+    meas["name"]=name
+    
+    if "verb_measure" not in meas:
+        meas["verb_measure"]=True
+    
+    if "verb_query" not in meas:
+        meas["verb_query"]=True
+        
+    if meas["verb_query"]==False and meas["verb_measure"]==False:
+        raise ValueError("Neither verb_measure nor verb_query is True in measurements section {0}".format(name))
+    
+    if "bulk_index_mplane_name" in meas:
+        if "index_mplane_name" not in meas:
+            raise ValueError("bulk_index_mplane_name needs index_mplane_name in measurements section {0}".format(name))
+        if not meas["verb_query"]:
+            raise ValueError("bulk_index_mplane_name needs verb_query in measurements section {0}".format(name))
+    
+    if "backends" in meas:
+        if not isinstance(meas["backends"],list) or len(meas["backends"])==0:
+            raise ValueError("backends must be a non-empty list of backend names in measurements section {0}".format(name))
+        if len(set(meas["backends"]))!=len(meas["backends"]):
+            raise ValueError("Duplicate backend in measurements section {0}".format(name))
+    #a failed backend fails the specification unless partial results are allowed
+    if "partial_results" not in meas:
+        meas["partial_results"]=False
+    
+    if "base_period" in meas and meas["base_period"] not in pvsr_proxy_service.PvsrService.valid_periods:
+        raise ValueError("Invalid base_period {0}, valid values are {1}, measurements section {2}".format(meas["base_period"],sorted(pvsr_proxy_service.PvsrService.valid_periods),name))
+    
+    if "max_running" in meas and meas["max_running"]<1:
+        raise ValueError("max_running must be positive in measurements section {0}".format(name))
+    
+    if "warm" in meas:
+        if not meas["verb_measure"]:
+            raise ValueError("warm measurements need verb_measure in measurements section {0}".format(name))
+        if not isinstance(meas["warm"],list):
+            raise ValueError("warm must be a list of parameter values in measurements section {0}".format(name))
+        #without an index every entry is the same measurement
+        if "index_mplane_name" not in meas and len(meas["warm"])>1:
+            raise ValueError("warm can only have one entry without index_mplane_name in measurements section {0}".format(name))
+        if "warm_period" in meas and not any(meas["warm_period"]%p==0 for p in pvsr_proxy_service.PvsrService.valid_periods):
+            raise ValueError("Invalid warm_period {0}, it must be a multiple of one of {1}, measurements section {2}".format(meas["warm_period"],sorted(pvsr_proxy_service.PvsrService.valid_periods),name))
+    
+    for k in meas["types"].keys():
+        if "first" not in meas["types"][k] and "second" not in meas["types"][k]:
+            raise ValueError("Measurement section is missing either first or second, section {0} type {1}".format(name,k))
+        for aggregate in ("first_aggregate","second_aggregate"):
+            if aggregate in meas["types"][k] and meas["types"][k][aggregate] not in pvsr_result_grid.AGGREGATES:
+                raise ValueError("Invalid {0} {1}, valid values are {2}, section {3} type {4}".format(aggregate,meas["types"][k][aggregate],", ".join(pvsr_result_grid.AGGREGATES),name,k))
+        if len(k)>1 and k[0:1]=='#':
+            new_collector_type=k[1:2]
+        else:
+            new_collector_type="S"
+        if meas["collector_type"] is None:
+            meas["collector_type"]=new_collector_type
+        elif meas["collector_type"] != new_collector_type:
+            raise ValueError("Only one collector type is allowed in one measurements section, section {0}".format(name))
+
+def http_defaults():
+    """
+    HTTP server parameters, the responses are compressed from
+    compress_min_length bytes, null disables the compression
+    """
+    if "compress_min_length" not in config:
+        config["compress_min_length"]=1024
+    if config["compress_min_length"] is None:
+        logging.info("HTTP responses are not compressed")
+    else:
+        logging.info("Compressing the HTTP responses from {0} bytes".format(config["compress_min_length"]))
+
+def parse_workers_section():
+    """
+    Multi-process mode, the measurements sections are sharded among
+    "workers" worker processes. A section runs in the worker given in
+    "worker_assignment" or in the one selected by the hash of its name.
+    The workers run the specifications in threads, the asyncio execution
+    mode needs the IOLoop of the HTTP server which only the front process has.
+    Every worker gets its share of the global admission limits
+    """
+    if "workers" not in config:
+        config["workers"]=0
+    if "worker_assignment" not in config:
+        config["worker_assignment"]={}
+    
+    for name in config["worker_assignment"].keys():
+        if name not in config["measurements"]:
+            die("Unknown measurements section {0} in worker_assignment".format(name))
+        if not isinstance(config["worker_assignment"][name],int) or not 0<=config["worker_assignment"][name]<config["workers"]:
+            die("Invalid worker {0} for measurements section {1}, valid values are 0..{2}".format(config["worker_assignment"][name],name,config["workers"]-1))
+    
+    if config["workers"]>0:
+        if config.get("execution_mode","thread")!="thread":
+            die("execution_mode {0} is not supported with workers, only thread is".format(config["execution_mode"]))
+        logging.info("Running the measurements sections in {0} worker processes".format(config["workers"]))
+
 def pvsr_defaults():
     """
     Optional default parameters
@@ -212,67 +387,548 @@ def pvsr_defaults():
         config["pvsr_default_conf_check_cycle"]=300
     logging.info("Assuming {0} PVSR configuration check cycle".format(config["pvsr_default_conf_check_cycle"]))
     
+    if "measurement_journal" not in config:
+        config["measurement_journal"]=__file__.replace('.py','.journal')
+    if config["delete_created_measurements"]:
+        if config["measurement_journal"]:
+            logging.info("Recording the created measurements in {0}".format(config["measurement_journal"]))
+        else:
+            logging.info("The created measurements are not recorded, they are left in PVSR after a crash")
+    
+    if "reaper_batch_size" not in config:
+        config["reaper_batch_size"]=20
+    if "reaper_interval" not in config:
+        config["reaper_interval"]=5
+    
+    if "warm_refresh_interval" not in config:
+        config["warm_refresh_interval"]=3600
+    
+    if "measurement_idle_grace" not in config:
+        config["measurement_idle_grace"]=600
+    if config["delete_created_measurements"] and config["measurement_idle_grace"]>0:
+        logging.info("Newly created measurements are kept for reuse for {0} seconds after their last use".format(config["measurement_idle_grace"]))
+    
+    if "watermark_poll_interval" not in config:
+        config["watermark_poll_interval"]=10
+    logging.info("Polling the PVSR last loaded data timestamp every {0} seconds".format(config["watermark_poll_interval"]))
+    
+    if "execution_mode" not in config:
+        config["execution_mode"]="thread"
+    if config["execution_mode"] not in ("thread","asyncio"):
+        die("Invalid execution_mode {0}, valid values are thread and asyncio".format(config["execution_mode"]))
+    logging.info("Running specifications in {0} mode".format(config["execution_mode"]))
+    
+    if "soap_executor_workers" not in config:
+        config["soap_executor_workers"]=32
+    if "blocking_executor_workers" not in config:
+        config["blocking_executor_workers"]=16
+    if config["execution_mode"]=="asyncio":
+        logging.info("Using at most {0} threads for SOAP calls".format(config["soap_executor_workers"]))
+        logging.info("Using at most {0} threads for bulk and federated specifications and building results".format(config["blocking_executor_workers"]))
+    
+    if "fetch_workers" not in config:
+        config["fetch_workers"]=16
+    if "fetch_per_spec" not in config:
+        config["fetch_per_spec"]=4
+    logging.info("Fetching at most {0} measurements per specification and {1} in total concurrently".format(config["fetch_per_spec"],config["fetch_workers"]))
+    
+    if "series_cache_max_samples" not in config:
+        config["series_cache_max_samples"]=1000000
+    logging.info("Caching at most {0} measured values for queries".format(config["series_cache_max_samples"]))
+    
+    if "query_chunk" not in config:
+        config["query_chunk"]=86400
+    logging.info("Streaming query results in {0} seconds chunks".format(config["query_chunk"]))
+    
+    if "result_store_max_bytes" not in config:
+        config["result_store_max_bytes"]=64*1024*1024
+    if "result_store_ttl" not in config:
+        config["result_store_ttl"]=600
+    if config["result_store_max_bytes"]>0:
+        logging.info("Keeping at most {0} bytes of encoded results for {1} seconds for retrieval".format(config["result_store_max_bytes"],config["result_store_ttl"]))
+    
+    if "reload_check_interval" not in config:
+        config["reload_check_interval"]=10
+    if config["reload_check_interval"]>0:
+        logging.info("Checking the configuration file for changes every {0} seconds".format(config["reload_check_interval"]))
+    
+    if "coalesce_specs" not in config:
+        config["coalesce_specs"]=True
+    if config["coalesce_specs"]:
+        logging.info("Identical concurrent specifications share one run")
+    
+    if "admission" not in config:
+        config["admission"]={}
+    for k,v in (("max_running",64),("max_queued",256),("queue_timeout",60),("max_running_per_equipment",16)):
+        if k not in config["admission"]:
+            config["admission"][k]=v
+    logging.info("Running at most {0} specifications, {1} per equipment, queuing at most {2}".format(config["admission"]["max_running"],config["admission"]["max_running_per_equipment"],config["admission"]["max_queued"]))
+    
+def load_meas_types(types=None):
+    """
+    Loading the measurement types (all by default) from PVSR concurrently
+    """
+    def load(type):
+        logging.debug("get {0}".format(type))
+        meas_type=pvsr.create_pvsr_object("MeasurementType")
+        meas_type.Type=type
+        res=pvsr.listMeasurementTypes(meas_type)
+        if len(res)!=1:
+            raise ValueError("Unknown measurement type {0}".format(type))
+        return res[0]
+    
+    if types is None:
+        types=sorted(pvsr_meas_types.keys())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=config["soap"]["max_sessions"]) as executor:
+        return dict(zip(types,executor.map(load,types)))
+
+def revalidate_meas_types():
+    """
+    Reloads the measurement types from PVSR in the background and updates the snapshot
+    """
+    try:
+        meas_types=load_meas_types()
+    except Exception as e:
+        logging.error("Cannot revalidate the measurement types: {0}".format(e))
+        return
+    for type,meas_type in meas_types.items():
+        if pvsr_type_snapshot.to_plain(meas_type)!=pvsr_type_snapshot.to_plain(pvsr_meas_types[type]):
+            logging.warning("Measurement type {0} changed in PVSR since the snapshot was taken".format(type))
+        pvsr_meas_types[type]=meas_type
+    try:
+        pvsr_type_snapshot.save(config["type_snapshot"],config["soap"]["url"],pvsr_meas_types)
+    except OSError as e:
+        logging.error("Cannot save the measurement type snapshot {0}: {1}".format(config["type_snapshot"],e))
+    logging.info("measurement types revalidated")
+
 def preload_soap_data():
     """
-    Loading measurement type configuration from PVSR
+    Loading measurement type configuration from PVSR. If the local snapshot
+    contains all types, it is used immediately and revalidated in the background
     """
+    if "type_snapshot" not in config:
+        config["type_snapshot"]=__file__.replace('.py','.types.json')
+    
+    if config["type_snapshot"]:
+        snapshot=pvsr_type_snapshot.load(config["type_snapshot"],config["soap"]["url"])
+        if snapshot is not None and all(type in snapshot for type in pvsr_meas_types):
+            logging.info("measurement types loaded from {0}".format(config["type_snapshot"]))
+            for type in pvsr_meas_types:
+                pvsr_meas_types[type]=snapshot[type]
+            thread=threading.Thread(target=revalidate_meas_types,name="pvsr-type-revalidation")
+            thread.daemon=True
+            thread.start()
+            return
+    
     logging.info("query measurement types")
     try:
-        for type in pvsr_meas_types:
-            logging.debug("get {0}".format(type))
-            meas_type=pvsr.create_pvsr_object("MeasurementType")
-            meas_type.Type=type
-            res=pvsr.listMeasurementTypes(meas_type)
-            if len(res)==1:
-                pvsr_meas_types[type]=res[0]
-            else:
-                die("Unknown measurement type {0}".format(type))
+        pvsr_meas_types.update(load_meas_types())
+    except ValueError as e:
+        die(e)
     except Exception as e:
         die("Cannot establish initial PVSR connection: {0}".format(e))
     
-if __name__ == "__main__":
-    read_config_json()
-   
-    parse_logging_section()
+    if config["type_snapshot"]:
+        try:
+            pvsr_type_snapshot.save(config["type_snapshot"],config["soap"]["url"],pvsr_meas_types)
+        except OSError as e:
+            logging.error("Cannot save the measurement type snapshot {0}: {1}".format(config["type_snapshot"],e))
     
-    parse_measurements_section()
+def start_reaper(backend):
+    """
+    Starts deleting the created measurements of a backend in the background
+    and reaps the measurements left over by a previous run. Every backend
+    other than the default one has its own journal with the backend name appended
+    """
+    journal_file = config["measurement_journal"]
+    if journal_file and backend.name!=pvsr_federation.DEFAULT_BACKEND:
+        journal_file = "{0}.{1}".format(journal_file, backend.name)
     
-    parse_soap_section()
+    if journal_file:
+        journal = pvsr_reaper.MeasurementJournal(journal_file, 1)
+        try:
+            leftover = journal.recover()
+        except OSError as e:
+            die("Cannot open the measurement journal {0}: {1}".format(journal_file, e))
+    else:
+        journal = None
+        leftover = []
     
-    pvsr_defaults()
+    reaper = pvsr_reaper.MeasurementReaper(backend.pvsr, journal, config["reaper_batch_size"], config["reaper_interval"])
     
-    preload_soap_data()
+    if len(leftover) > 0:
+        logging.warning("Deleting {0} measurements of backend {1} left over by the previous run".format(len(leftover), backend.name))
+    for meas_id in leftover:
+        reaper.reap_id(meas_id, "left over")
+    return reaper
+
+def create_service(meas, verb, bulk=False):
+    """
+    Creates the mPlane service of a measurements section for one verb. It runs
+    on the first backend of the section, the services of the other backends
+    are its peers. Only this service coalesces the specifications, the phases
+    calling PVSR are admitted on every backend
+    """
+    section = section_backends(meas)
+    peers = [create_backend_service(meas, verb, bulk, backend, admission, None, None) for backend in section[1:]]
+    return create_backend_service(meas, verb, bulk, section[0], admission, single_flight, peers)
+
+def create_backend_service(meas, verb, bulk, backend, admission, single_flight, peers):
+    return pvsr_proxy_service.PvsrService(
+        meas
+        ,verb
+        ,backend.pvsr
+        ,config["default_site"]
+        ,config["delete_created_measurements"]
+        ,config["pvsr_default_conf_check_cycle"]
+        ,pvsr_meas_types
+        ,backend.watermark
+        ,engine
+        ,fanout
+        ,backend.series_cache
+        ,config["query_chunk"]
+        ,backend.lease_pool
+        ,backend.reaper
+        ,warm
+        ,metrics
+        ,admission
+        ,single_flight
+        ,bulk
+        ,backend.name
+        ,peers
+    )
+
+def start_runtime():
+    """
+    Creates the objects shared by the services and the objects of every backend
+    """
+    global engine, fanout, warm, admission, single_flight, result_store
+    
+    for backend in backends.values():
+        backend.watermark = pvsr_watermark.WatermarkPoller(backend.pvsr, config["watermark_poll_interval"])
+        
+        if config["delete_created_measurements"]:
+            backend.reaper = start_reaper(backend)
+        
+        if config["delete_created_measurements"] and config["measurement_idle_grace"]>0:
+            backend.lease_pool = pvsr_lease.MeasurementLeasePool(backend.reaper, config["measurement_idle_grace"], config["pvsr_default_conf_check_cycle"])
+        
+        #the measurement ids of the backends overlap, every backend has its own cache
+        if config["series_cache_max_samples"]>0:
+            backend.series_cache = pvsr_series_cache.SeriesCache(config["series_cache_max_samples"])
+    
+    if config["execution_mode"]=="asyncio":
+        #pvsr_http.runloop starts this IOLoop
+        engine = pvsr_async.AsyncEngine(tornado.ioloop.IOLoop.current(), config["soap_executor_workers"], config["blocking_executor_workers"])
+    else:
+        engine = None
+    
+    fanout = pvsr_fanout.FanOut(config["fetch_workers"], config["fetch_per_spec"])
+    
+    warm = pvsr_warm.WarmMeasurements(config["warm_refresh_interval"])
+    
+    if config["result_store_max_bytes"]>0:
+        result_store = pvsr_result_store.ResultStore(config["result_store_max_bytes"], config["result_store_ttl"])
+    else:
+        result_store = None
+    
+    if config["coalesce_specs"]:
+        single_flight = pvsr_singleflight.SingleFlight()
+    else:
+        single_flight = None
+    
+    admission = pvsr_admission.AdmissionController(
+        config["admission"]["max_running"]
+        ,config["admission"]["max_queued"]
+        ,equipment_limits()
+        ,config["admission"]["queue_timeout"]
+    )
+    
+    for name,help in (
+            ("pvsr_soap_call_seconds","PVSR SOAP call latency per method"),
+            ("pvsr_soap_errors_total","Failed PVSR SOAP calls per method"),
+            ("pvsr_spec_phase_seconds","Time spent in the phases of the specifications"),
+            ("pvsr_specs_seconds","Duration of the specifications"),
+            ("pvsr_specs_in_flight","Specifications running"),
+            ("pvsr_specs_total","Finished specifications"),
+            ("pvsr_watermark_waits_total","Waits for the PVSR data to be loaded"),
+            ("pvsr_measurements_created_total","Measurements created in PVSR"),
+            ("pvsr_measurements_deleted_total","Measurements deleted from PVSR"),
+        ):
+        metrics.describe(name,help)
+    metrics.add_collector(runtime_metrics)
+
+def equipment_limits():
+    """
+    The concurrency limit of every equipment, the limit of an equipment
+    shared by several sections is the lowest one
+    """
+    limits = {}
+    for meas in config["measurements"].values():
+        limit = meas.get("max_running",config["admission"]["max_running_per_equipment"])
+        limits[meas["equipment"]] = min(limit,limits.get(meas["equipment"],limit))
+    return limits
+
+def runtime_metrics():
+    """
+    Statistics of the shared objects, collected when the metrics are rendered
+    """
+    samples=[]
+    now=int(time.time())
+    for name,backend in sorted(backends.items()):
+        labels=(("backend",name),)
+        for kind,(hits,misses) in sorted(backend.pvsr.stats().items()):
+            samples.append(("pvsr_cache_hits_total","counter",labels+(("kind",kind),),hits))
+            samples.append(("pvsr_cache_misses_total","counter",labels+(("kind",kind),),misses))
+        
+        (sessions,idle)=backend.soap_pool.stats()
+        samples.append(("pvsr_soap_sessions","gauge",labels,sessions))
+        samples.append(("pvsr_soap_idle_sessions","gauge",labels,idle))
+        
+        for period,(loaded_until,waiters) in sorted(backend.watermark.stats().items()):
+            samples.append(("pvsr_watermark_waiters","gauge",labels+(("period",period),),waiters))
+            if loaded_until is not None:
+                samples.append(("pvsr_watermark_lag_seconds","gauge",labels+(("period",period),),now-loaded_until))
+    
+    (running,queued,rejected)=admission.stats()
+    samples.append(("pvsr_admission_running","gauge",(),running))
+    samples.append(("pvsr_admission_queued","gauge",(),queued))
+    samples.append(("pvsr_admission_rejected_total","counter",(),rejected))
+    
+    (warm_hits,reused,cold)=warm.stats()
+    samples.append(("pvsr_provisions_total","counter",(("outcome","warm"),),warm_hits))
+    samples.append(("pvsr_provisions_total","counter",(("outcome","reused"),),reused))
+    samples.append(("pvsr_provisions_total","counter",(("outcome","created"),),cold))
+    return samples
+
+def create_section_services(meas):
+    """
+    Creates the mPlane services of a measurements section
+    """
+    services=[]
+    if meas["verb_query"]:
+        services.append(create_service(meas, mplane.model.VERB_QUERY))
+        if "bulk_index_mplane_name" in meas:
+            services.append(create_service(meas, mplane.model.VERB_QUERY, True))
+    if meas["verb_measure"]:
+        services.append(create_service(meas, mplane.model.VERB_MEASURE))
+    return services
+
+def add_section_services(name, meas, services):
+    for service in services:
+        scheduler.add_service(service)
+    track_section_services(name, meas, services)
+
+def track_section_services(name, meas, services):
+    """
+    Records the services of a section and hands the warm ones to the warm pool
+    """
+    for service in services:
+        if "warm" in meas and service.capability().verb()==mplane.model.VERB_MEASURE:
+            for member in service.members():
+                warm.add_service(member)
+    section_services[name]=services
+
+def untrack_services(services):
+    for service in services:
+        for member in service.members():
+            warm.remove_service(member)
+
+def replace_services(added, removed):
+    """
+    Adds and removes services of the scheduler in one step. It runs on the
+    IOLoop thread, where the scheduler looks the services up, so a specification
+    finds either the old or the new services. The specifications already
+    running on the removed services are not interrupted, they finish on them
+    """
+    scheduler.replace_services(added, removed)
+
+def create_scheduler():
+    """
+    Creates the scheduler with the services of all measurements sections
+    """
+    global scheduler, section_services
     
     mplane.model.initialize_registry()
-    scheduler = mplane.scheduler.Scheduler()
+    if engine is not None:
+        #the specifications run as tasks of the event loop, not in a thread per job
+        scheduler = pvsr_async.AsyncScheduler(engine)
+    else:
+        scheduler = pvsr_scheduler.ReloadableScheduler()
+    section_services = {}
 
     for name in sorted(config["measurements"].keys()):
         meas=config["measurements"][name]
-        if meas["verb_query"]:
-            scheduler.add_service(
-                pvsr_proxy_service.PvsrService(
-                    meas
-                    ,mplane.model.VERB_QUERY
-                    ,pvsr
-                    ,config["default_site"]
-                    ,config["delete_created_measurements"]
-                    ,config["pvsr_default_conf_check_cycle"]
-                    ,pvsr_meas_types
-                )
-            )
-        if meas["verb_measure"]:
-            scheduler.add_service(
-                pvsr_proxy_service.PvsrService(
-                    meas
-                    ,mplane.model.VERB_MEASURE
-                    ,pvsr
-                    ,config["default_site"]
-                    ,config["delete_created_measurements"]
-                    ,config["pvsr_default_conf_check_cycle"]
-                    ,pvsr_meas_types
-                )
-            )
+        try:
+            services=create_section_services(meas)
+        except ValueError as e:
+            die(e)
+        add_section_services(name, meas, services)
+    
+    warm.start()
+    
+    return scheduler
+
+def create_worker_scheduler():
+    """
+    Creates the scheduler of the front process in multi-process mode,
+    its services forward the specifications to the worker processes
+    """
+    global scheduler
+    
+    mplane.model.initialize_registry()
+    scheduler = mplane.scheduler.Scheduler()
+    
+    shards = pvsr_workers.assign_shards(sorted(config["measurements"].keys()), config["workers"], config["worker_assignment"])
+    for index in sorted(shards.keys()):
+        worker = pvsr_workers.WorkerProcess(index, config_file_name, shards[index])
+        try:
+            services = worker.start()
+        except (ValueError, EOFError) as e:
+            die(e)
+        for service in services:
+            scheduler.add_service(service)
+    
+    return scheduler
+
+def reload_config():
+    """
+    Applies the changes of the measurements section of the configuration file.
+    Only the new measurement types are loaded and only the services of the
+    added, changed and removed sections are replaced. Other changes need a restart
+    """
+    with reload_lock:
+        try:
+            with open(config_file_name,'r') as config_file:
+                new_config = json.load(config_file)
+        except (OSError, ValueError) as e:
+            logging.error("Cannot reload the configuration file {0}: {1}".format(config_file_name,e))
+            return
+        
+        for k in sorted(set(new_config.keys()) | set(loaded_config.keys())):
+            if k!="measurements" and new_config.get(k)!=loaded_config.get(k):
+                logging.warning("Changes of {0} are applied after a restart".format(k))
+        
+        old_sections = loaded_config.get("measurements",{})
+        new_sections = new_config.get("measurements",{})
+        if len(new_sections)==0:
+            logging.error("Empty section 'measurements' in the configuration file, not reloaded")
+            return
+        removed = sorted(name for name in old_sections if name not in new_sections)
+        added = sorted(name for name in new_sections if name not in old_sections)
+        changed = sorted(name for name in new_sections if name in old_sections and new_sections[name]!=old_sections[name])
+        if len(removed)+len(added)+len(changed)==0:
+            logging.info("The measurements section is unchanged")
+            return
+        
+        sections = {}
+        services = {}
+        try:
+            for name in added+changed:
+                meas = copy.deepcopy(new_sections[name])
+                parse_measurement(name, meas)
+                sections[name] = meas
+            new_types = sorted(set(k for meas in sections.values() for k in meas["types"] if pvsr_meas_types.get(k) is None))
+            if len(new_types)>0:
+                logging.info("query measurement types {0}".format(new_types))
+                pvsr_meas_types.update(load_meas_types(new_types))
+            for name,meas in sections.items():
+                services[name] = create_section_services(meas)
+        except Exception as e:
+            logging.error("The configuration is not reloaded: {0}".format(e))
+            return
+        
+        #the new services replace the old ones in one step, so the
+        #capabilities of the changed sections are served all the time
+        old_services = [service for name in removed+changed for service in section_services[name]]
+        new_services = [service for name in added+changed for service in services[name]]
+        for name in removed:
+            del section_services[name]
+            del config["measurements"][name]
+        for name in added+changed:
+            config["measurements"][name] = sections[name]
+            track_section_services(name, sections[name], services[name])
+        reload_ioloop.add_callback(replace_services, new_services, old_services)
+        untrack_services(old_services)
+        warm.start()
+        loaded_config["measurements"] = copy.deepcopy(new_sections)
+        admission.set_equipment_limits(equipment_limits())
+        
+        if len(new_types)>0 and config["type_snapshot"]:
+            try:
+                pvsr_type_snapshot.save(config["type_snapshot"],config["soap"]["url"],pvsr_meas_types)
+            except OSError as e:
+                logging.error("Cannot save the measurement type snapshot {0}: {1}".format(config["type_snapshot"],e))
+        
+        logging.info("Configuration reloaded, added: {0}, changed: {1}, removed: {2}".format(added,changed,removed))
+
+def start_reload_watch():
+    """
+    Reloads the configuration on SIGHUP and when the configuration file changes
+    """
+    global reload_lock, reload_ioloop
+    
+    reload_lock = threading.Lock()
+    #the scheduler is used on the IOLoop thread, the reloaded services are swapped there
+    reload_ioloop = tornado.ioloop.IOLoop.current()
+    
+    def reload_in_background():
+        thread = threading.Thread(target=reload_config,name="config-reload")
+        thread.daemon = True
+        thread.start()
+    
+    if hasattr(signal,"SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload_in_background())
+    
+    if config["reload_check_interval"]<=0:
+        return
+    
+    def watch():
+        mtime = os.stat(config_file_name).st_mtime
+        while True:
+            time.sleep(config["reload_check_interval"])
+            try:
+                new_mtime = os.stat(config_file_name).st_mtime
+            except OSError:
+                continue
+            if new_mtime != mtime:
+                mtime = new_mtime
+                reload_config()
+    
+    thread = threading.Thread(target=watch,name="config-watch")
+    thread.daemon = True
+    thread.start()
+
+if __name__ == "__main__":
+    read_config_json()
+   
+    parse_logging_section()
+    
+    parse_measurements_section()
+    
+    parse_workers_section()
+    
+    http_defaults()
+    
+    if config["workers"]>0:
+        #the workers read the SOAP section and run the services themselves
+        scheduler = create_worker_scheduler()
+        metrics = None
+        result_store = None
+        logging.warning("The /{0}, /{1} and /{2} endpoints are not served with workers, only the mPlane ones are".format(pvsr_http.STREAM_PATH_ELEM,pvsr_http.METRICS_PATH_ELEM,pvsr_http.RESULT_PATH_ELEM))
+    else:
+        parse_soap_section()
+        
+        pvsr_defaults()
+        
+        preload_soap_data()
+        
+        start_runtime()
+        
+        scheduler = create_scheduler()
+        
+        start_reload_watch()
 
     logging.info("starting service")
 
-    mplane.httpsrv.runloop(scheduler)
+    pvsr_http.runloop(scheduler, metrics=metrics, result_store=result_store, compress_min_length=config["compress_min_length"])
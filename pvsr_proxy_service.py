@@ -28,66 +28,113 @@ mPlane service module
 
 import mplane.model
 import mplane.scheduler
-import pdb
 import logging
 import time
 import datetime
+import contextlib
+import pvsr_result_grid
+import pvsr_admission
+import pvsr_federation
+import pvsr_singleflight
+
+_NO_OP = contextlib.nullcontext()
+
+def _pvsr_time(unix_time):
+    """
+    The datetime of a UNIX time sent to PVSR. It is aware, in the local time zone,
+    so the repeated hour at the end of daylight saving time is not ambiguous
+    """
+    return datetime.datetime.fromtimestamp(unix_time, datetime.timezone.utc).astimezone()
+
+def _unix_time(t, previous=None):
+    """
+    The UNIX time of a datetime returned by PVSR. A naive one is local time: in the
+    repeated hour at the end of daylight saving time it is taken as the second
+    occurrence (fold=1) if the first one is not later than the previous sample
+    """
+    unix_time = int(t.timestamp())
+    if t.tzinfo is None and previous is not None and unix_time <= previous:
+        later = int(t.replace(fold=1).timestamp())
+        if later > previous:
+            return later
+    return unix_time
 
 class PvsrService(mplane.scheduler.Service):
     valid_periods=frozenset([15,30,60,300,600,900,1800,3600])
-    def __init__(self, meas, verb,pvsr, default_site,delete_created_measurements,pvsr_default_conf_check_cycle,pvsr_meas_types):
+    def __init__(self, meas, verb,pvsr, default_site,delete_created_measurements,pvsr_default_conf_check_cycle,pvsr_meas_types,watermark,engine=None,fanout=None,series_cache=None,query_chunk=86400,lease_pool=None,reaper=None,warm=None,metrics=None,admission=None,single_flight=None,bulk=False,backend=pvsr_federation.DEFAULT_BACKEND,peers=None):
         """
         Creating the Capability based on the configuration
         """
         
-        logging.info("adding capability: {0}".format(meas["name"]))
+        logging.info("adding capability: %s",meas["name"])
         
         self._verb=verb
-        if verb==mplane.model.VERB_QUERY:
+        self._bulk=bulk
+        if bulk:
+            if verb!=mplane.model.VERB_QUERY:
+                raise ValueError("Only the query verb has a bulk variant")
+            cap = mplane.model.Capability(label=meas["name"]+"-bulk-query", when = "past ... now / 15s", verb=mplane.model.VERB_QUERY)
+        elif verb==mplane.model.VERB_QUERY:
             cap = mplane.model.Capability(label=meas["name"]+"-query", when = "past ... now / 15s", verb=mplane.model.VERB_QUERY)
         elif verb==mplane.model.VERB_MEASURE:
             cap = mplane.model.Capability(label=meas["name"]+"-measure", when = "now ... future / 15s", verb=mplane.model.VERB_MEASURE)
         else:
             raise ValueError("Verb is not supported: {0}".format(verb))
         cap.add_result_column("time")
+        if bulk:
+            #long format, one row per index value and time
+            cap.add_result_column(meas["index_mplane_name"])
         
         self._mplane2uda={}
         self._uda_name2uda = {}
+        self._aggregates = {}
         
         self._pvsr_default_conf_check_cycle=pvsr_default_conf_check_cycle
         
         try:
             for k in sorted(meas["types"].keys()):
                 if "first" in meas["types"][k]:
-                    logging.debug("    result colum: {0}".format(meas["types"][k]["first"]))
+                    logging.debug("    result colum: %s",meas["types"][k]["first"])
                     cap.add_result_column(meas["types"][k]["first"])
+                    self._aggregates[meas["types"][k]["first"]]=meas["types"][k].get("first_aggregate","mean")
                 if "second" in meas["types"][k]:
-                    logging.debug("    result colum: {0}".format(meas["types"][k]["second"]))
+                    logging.debug("    result colum: %s",meas["types"][k]["second"])
                     cap.add_result_column(meas["types"][k]["second"])
+                    self._aggregates[meas["types"][k]["second"]]=meas["types"][k].get("second_aggregate","mean")
     
                 if "PropertyType" in pvsr_meas_types[k]:
                     for i in range(len(pvsr_meas_types[k]["PropertyType"])):
                         self._uda_name2uda[pvsr_meas_types[k]["PropertyType"][i]["Name"]]=pvsr_meas_types[k]["PropertyType"][i]
                     
-            if "index_mplane_name" in meas:
-                logging.debug("    parameter: {0}".format(meas["index_mplane_name"]))
+            if bulk:
+                logging.debug("    parameter: %s",meas["bulk_index_mplane_name"])
+                #the comma separated index values need a string element
+                try:
+                    primitive=mplane.model.element(meas["bulk_index_mplane_name"]).primitive_name()
+                except KeyError:
+                    raise ValueError("bulk_index_mplane_name {0} is not in the mPlane registry, measurements section {1}".format(meas["bulk_index_mplane_name"],meas["name"]))
+                if primitive!="string":
+                    raise ValueError("bulk_index_mplane_name {0} is not a string element, measurements section {1}".format(meas["bulk_index_mplane_name"],meas["name"]))
+                cap.add_parameter(meas["bulk_index_mplane_name"])
+            elif "index_mplane_name" in meas:
+                logging.debug("    parameter: %s",meas["index_mplane_name"])
                 cap.add_parameter(meas["index_mplane_name"])
                 
             if "mplane_constants" in meas:
                 for k,v in sorted(meas["mplane_constants"].items()):
-                    logging.debug("    parameter: {0} with value {1}".format(k,v))
+                    logging.debug("    parameter: %s with value %s",k,v)
                     cap.add_parameter(k,v)
             
             if "uda_name2mplane_name" in meas:
                 for k,v in sorted(meas["uda_name2mplane_name"].items()):
                     if k in self._uda_name2uda:
-                        logging.debug("    parameter: {0}".format(v))
+                        logging.debug("    parameter: %s",v)
                         cap.add_parameter(v)
                         self._mplane2uda[v]=k
                     else:
-                        logging.error("    unknown UDA: {0}".format(v))
+                        logging.error("    unknown UDA: %s",v)
         except Exception as e:
-            logging.critical("Error during capability creation: {0}".format(e))
+            logging.critical("Error during capability creation: %s",e)
             raise e
 
         super(PvsrService, self).__init__(cap)
@@ -97,19 +144,469 @@ class PvsrService(mplane.scheduler.Service):
         self._default_site = default_site
         self._delete_created_measurements = delete_created_measurements
         self._pvsr_meas_types = pvsr_meas_types
+        self._watermark = watermark
+        self._engine = engine
+        self._fanout = fanout
+        self._series_cache = series_cache
+        self._query_chunk = query_chunk
+        self._lease_pool = lease_pool
+        self._reaper = reaper
+        self._warm = warm
+        self._metrics = metrics
+        self._admission = admission
+        self._single_flight = single_flight
+        self._backend = backend
+        #the services of the other backends of the section
+        self._peers = peers if peers is not None else []
 
     def run(self, spec, check_interrupt):
-        logging.info("run specification {0}".format(spec))
+        logging.info("run specification %s",spec)
+        
+        (period,duration) = self._check_when(spec)
+
+        with self._in_flight():
+            targets=self._run_targets(spec,check_interrupt,period,duration)
+            with self._phase("build"):
+                res=self.build_result(spec,targets)
+        
+        logging.info("specification done %s",spec)
+
+        return res
+
+    async def run_async(self, spec, check_interrupt):
+        """
+        Coroutine variant of run for the asyncio execution mode, the jobs of
+        pvsr_async.AsyncScheduler await it on the event loop. Bulk and federated
+        specifications fan out to threads, they still run in one of the bounded
+        blocking executor of the engine
+        """
+        if self._bulk or len(self._peers)>0:
+            return await self._engine.run_blocking(self.run,spec,check_interrupt)
+        
+        logging.info("run specification %s",spec)
+        
+        (period,duration) = self._check_when(spec)
+
+        with self._in_flight():
+            grid=await self._follow_async(spec,check_interrupt,period,duration)
+            if grid is None:
+                flight=self._start_flight(spec,period)
+                try:
+                    grid=await self._run_async(spec,check_interrupt,period,duration,flight)
+                except Exception as e:
+                    self._finish_flight(flight,None,e)
+                    raise e
+                self._finish_flight(flight,grid,None,check_interrupt)
+            with self._phase("build"):
+                res=await self._engine.run_blocking(self.build_result,spec,[(None,grid)])
+        
+        logging.info("specification done %s",spec)
+
+        return res
+
+    def run_targets(self, spec, check_interrupt):
+        """
+        Variant of run for the other encodings of the result. It returns the
+        ResultGrids as [(index value, grid)] without building the mPlane Result,
+        the index value is None unless the service is a bulk one
+        """
+        logging.info("run specification %s",spec)
+        
+        (period,duration) = self._check_when(spec)
+
+        with self._in_flight():
+            targets=self._run_targets(spec,check_interrupt,period,duration)
+        
+        logging.info("specification done %s",spec)
+
+        return targets
+
+    def build_result(self, spec, targets):
+        """
+        Assembles the mPlane Result from the grids of run_targets
+        """
+        if self._bulk:
+            return self._build_bulk_result(spec,targets)
+        return self._build_result(spec,targets[0][1])
+
+    def index_name(self):
+        """
+        The result column of the index values of a bulk service, None otherwise
+        """
+        if self._bulk:
+            return self._meas["index_mplane_name"]
+        return None
+
+    def data_version(self, targets):
+        """
+        (first time, last time, period, last loaded data timestamps up to the last time)
+        of the grids of run_targets, the values of the result only change with them.
+        The watermark of every backend of the section is polled now, the one of a
+        backend which cannot be polled is None
+        """
+        grid=targets[0][1]
+        native_period=self._native_period(grid.period)
+        loaded_until=[]
+        for member in self.members():
+            t=member._watermark.poll(native_period)
+            loaded_until.append(min(t,grid.last_time) if t is not None else None)
+        return (grid.first_time,grid.last_time,grid.period,tuple(loaded_until))
+
+    def _run_targets(self, spec, check_interrupt, period, duration):
+        if self._bulk:
+            if len(self._peers)>0:
+                return self._run_bulk_federated(spec,check_interrupt,period)
+            return self._run_bulk(spec,check_interrupt,period)
+
+        grid=self._follow(spec,check_interrupt,period,duration)
+        if grid is None:
+            flight=self._start_flight(spec,period)
+            try:
+                if len(self._peers)>0:
+                    grid=self._run_federated(spec,check_interrupt,period,duration,flight)
+                else:
+                    grid=self._run_member(spec,check_interrupt,period,duration,flight)
+            except Exception as e:
+                self._finish_flight(flight,None,e)
+                raise e
+            self._finish_flight(flight,grid,None,check_interrupt)
+        return [(None,grid)]
+
+    def members(self):
+        """
+        The services of all backends of the section, this one first
+        """
+        return [self]+self._peers
+
+    def _run_member(self, spec, check_interrupt, period, duration, flight):
+        """
+        Runs the specification on the backend of this service
+        """
+        if self._engine is not None:
+            return self._engine.run(self._run_async(spec,check_interrupt,period,duration,flight))
+        return self._run_grid(spec,check_interrupt,period,duration,flight)
+
+    def _run_federated(self, spec, check_interrupt, period, duration, flight):
+        """
+        Runs the specification on every backend of the section concurrently and
+        merges the grids. The measurements are configured on every backend first,
+        then all of them are read in one window, the latest one of the backends.
+        A failed backend fails the specification unless partial results are allowed
+        """
+        members=self.members()
+        what="Specification {0}".format(spec)
+        def provision(member):
+            with member._phase("provision"), member._admitted(True):
+                return (member,member._config_measurements(spec,period))
+        provisioned=pvsr_federation.run_all(provision,members)
+        try:
+            live=pvsr_federation.successful([member._backend for member in members],provisioned,what,self._meas["partial_results"])
+            windows=[member._time_window(spec,measurements,period,duration) for (member,measurements) in live]
+            window=(max([w[0] for w in windows]),max([w[1] for w in windows]))
+            if flight is not None and flight.window is None:
+                flight.set_window(window[0],window[1])
+            def fill(target):
+                (member,measurements)=target
+                return member._fill_results(spec,measurements,period,duration,check_interrupt,None,window)
+            outcomes=pvsr_federation.run_all(fill,live)
+            grids=pvsr_federation.successful([member._backend for (member,measurements) in live],outcomes,what,self._meas["partial_results"])
+        finally:
+            for (member,(outcome,e)) in zip(members,provisioned):
+                if outcome is not None:
+                    with member._phase("delete"), member._admitted():
+                        member._delete_measurements(outcome[1])
+        return pvsr_federation.merge(grids)
+
+    def _run_bulk_federated(self, spec, check_interrupt, period):
+        """
+        Runs a bulk query on every backend of the section concurrently,
+        the grids of an index value are merged
+        """
+        members=self.members()
+        outcomes=pvsr_federation.run_all(lambda member: member._run_bulk(spec,check_interrupt,period),members)
+        index2grids={}
+        index_values=[]
+        for targets in pvsr_federation.successful([member._backend for member in members],outcomes,"Specification {0}".format(spec),self._meas["partial_results"]):
+            for (index_value,grid) in targets:
+                if index_value not in index2grids:
+                    index2grids[index_value]=[]
+                    index_values.append(index_value)
+                index2grids[index_value].append(grid)
+        return [(index_value,pvsr_federation.merge(index2grids[index_value])) for index_value in index_values]
+
+    def _run_grid(self, spec, check_interrupt, period, duration, flight):
+        """
+        Configures the measurements, gets the values into a ResultGrid and deletes the measurements
+        """
+        measurements=None
+        grid=None
+
+        try:
+            with self._phase("provision"), self._admitted(True):
+                measurements=self._config_measurements(spec,period)
+            grid=self._fill_results(spec,measurements,period,duration,check_interrupt,flight)
+        except Exception as e:
+            logging.error("Error during specification %s: %s",spec,e)
+            raise e
+        finally:
+            with self._phase("delete"), self._admitted():
+                self._delete_measurements(measurements)
+        
+        return grid
+
+    async def _run_async(self, spec, check_interrupt, period, duration, flight):
+        """
+        Coroutine variant of _run_grid
+        """
+        measurements=None
+        grid=None
+
+        try:
+            with self._phase("provision"):
+                measurements=await self._config_measurements_async(spec,period)
+            grid=await self._fill_results_async(spec,measurements,period,duration,check_interrupt,flight)
+        except Exception as e:
+            logging.error("Error during specification %s: %s",spec,e)
+            raise e
+        finally:
+            with self._phase("delete"):
+                await self._delete_measurements_async(measurements)
+
+        return grid
+
+    def _run_bulk(self, spec, check_interrupt, period):
+        """
+        Runs a bulk query for every index value with one equipment lookup and one
+        measurement listing, returns [(index value, grid)]. The index values
+        which cannot be configured are left out of the result
+        """
+        index_mplane_name=self._meas["index_mplane_name"]
+        common={}
+        for k in spec.parameter_names():
+            if k!=self._meas["bulk_index_mplane_name"]:
+                common[k]=self._parameter_value(spec.get_parameter_value(k))
+        index_values=self._bulk_index_values(spec)
+        native_period=self._native_period(period)
+        
+        with self._admitted(True):
+            with self._phase("equipment"):
+                eq=self._get_equipment()
+            with self._phase("list_measurements"):
+                candidates={}
+                for c in self._list_equipment_measurements(eq):
+                    candidates.setdefault(c.Index,[]).append(c)
+        
+        def provision(index_value):
+            mplane_param2value=dict(common)
+            mplane_param2value[index_mplane_name]=index_value
+            try:
+                return self._provision(mplane_param2value,native_period,True,eq,candidates.get(index_value,[]))
+            except Exception as e:
+                logging.error("Cannot configure the measurements of %s %s: %s",index_mplane_name,index_value,e)
+                return None
+        
+        provisioned=[]
+        try:
+            with self._phase("provision"), self._admitted():
+                provisioned=self._map(provision,index_values)
+            targets=[(index_value,measurements) for (index_value,measurements) in zip(index_values,provisioned) if measurements is not None]
+            if len(targets)==0:
+                raise ValueError("The measurements of none of the {0} values can be configured".format(index_mplane_name))
+            
+            (first_time,last_time) = self._query_window(spec)
+            periods=sorted(set(p for (index_value,measurements) in targets for p in self._fetch_periods(measurements,period)))
+            with self._phase("watermark"):
+                loaded=all([self._watermark.wait(p,last_time,last_time+period+300,check_interrupt) for p in periods])
+            self._count_watermark_wait(loaded,last_time)
+            
+            #the fetches of one index value run inline in the worker of the index value
+            with self._phase("fetch"), self._admitted():
+                grids=self._map(lambda target: self._fetch_results(target[1],period,first_time,last_time),targets)
+            return [(index_value,grid) for ((index_value,measurements),grid) in zip(targets,grids)]
+        finally:
+            with self._phase("delete"), self._admitted():
+                for measurements in provisioned:
+                    self._delete_measurements(measurements)
+
+    def _bulk_index_values(self, spec):
+        """
+        The distinct index values of the comma separated bulk parameter
+        """
+        index_values=[]
+        seen=set()
+        for v in str(spec.get_parameter_value(self._meas["bulk_index_mplane_name"])).split(","):
+            v=v.strip()
+            if len(v)>0 and v not in seen:
+                seen.add(v)
+                index_values.append(v)
+        if len(index_values)==0:
+            raise ValueError("Missing {0} value".format(self._meas["bulk_index_mplane_name"]))
+        return index_values
+
+    def _map(self, fn, items):
+        if self._fanout is None:
+            return [fn(item) for item in items]
+        return self._fanout.map(fn,items)
+
+    def _flight_key(self, spec, period):
+        """
+        Identical specifications have the same capability, period and parameter values
+        """
+        params=tuple(sorted((k,str(self._parameter_value(spec.get_parameter_value(k)))) for k in spec.parameter_names()))
+        return (self.capability().get_label(),period,params)
+
+    def _attach(self, spec, period, duration):
+        """
+        Finds a running identical specification whose window covers the window
+        of this one, returns (flight, window) or (None, None)
+        """
+        if self._single_flight is None:
+            return (None,None)
+        key=self._flight_key(spec,period)
+        if self._verb==mplane.model.VERB_QUERY:
+            window=self._query_window(spec)
+            return self._single_flight.attach(key,lambda flight: window,period)
+        
+        #the data of a running measure specification cannot start before its window,
+        #a new one would not get data earlier either
+        now=int(time.time())
+        first_time=now-now%period
+        def window_of(flight):
+            if flight.window is None:
+                return None
+            start=max(first_time,flight.window[0])
+            return (start,start+duration)
+        return self._single_flight.attach(key,window_of,period)
+
+    def _follow(self, spec, check_interrupt, period, duration):
+        """
+        Waits for the grid of a running identical specification, None if there is
+        none to attach to. If that one is interrupted before its data is loaded,
+        another one is looked for, the specification runs on its own if there is none
+        """
+        while True:
+            (flight,window) = self._attach(spec,period,duration)
+            if flight is None:
+                return None
+            logging.info("specification %s attached to a running identical specification",spec)
+            try:
+                return flight.wait(window[0],window[1],self._watermark_interrupt(check_interrupt))
+            except pvsr_singleflight.Interrupted as e:
+                self._single_flight.leave(flight)
+                raise e
+            except pvsr_singleflight.Abandoned:
+                logging.info("the specification %s was attached to was interrupted",spec)
+
+    async def _follow_async(self, spec, check_interrupt, period, duration):
+        """
+        Coroutine variant of _follow, the wait does not hold a thread
+        """
+        while True:
+            (flight,window) = self._attach(spec,period,duration)
+            if flight is None:
+                return None
+            logging.info("specification %s attached to a running identical specification",spec)
+            try:
+                return await self._engine.wait_flight(flight,window[0],window[1],self._watermark_interrupt(check_interrupt))
+            except pvsr_singleflight.Interrupted as e:
+                self._single_flight.leave(flight)
+                raise e
+            except pvsr_singleflight.Abandoned:
+                logging.info("the specification %s was attached to was interrupted",spec)
+
+    def _start_flight(self, spec, period):
+        if self._single_flight is None:
+            return None
+        if self._verb==mplane.model.VERB_QUERY:
+            return self._single_flight.start(self._flight_key(spec,period),self._query_window(spec))
+        #the window of a measure specification is known after the measurements are configured
+        return self._single_flight.start(self._flight_key(spec,period))
+
+    def _finish_flight(self, flight, grid, error, check_interrupt=None):
+        """
+        Hands the grid or the error to the attached specifications. The grid of an
+        interrupted specification may lack the data it stopped waiting for, it is
+        not handed over, the attached specifications run on their own
+        """
+        if flight is None:
+            return
+        check_interrupt=self._watermark_interrupt(check_interrupt)
+        if error is None and check_interrupt is not None and check_interrupt():
+            if flight.followers>0:
+                logging.info("%s identical specifications run on their own, the one they were attached to was interrupted",flight.followers)
+            grid=None
+            error=pvsr_singleflight.Abandoned()
+        elif flight.followers>0:
+            logging.info("%s identical specifications got the result of one run",flight.followers+1)
+        self._single_flight.finish(flight,grid,error)
+
+    def iter_results(self, spec, check_interrupt=None):
+        """
+        Streaming variant of run for the query verb. Returns an iterator yielding
+        one partial Result per query_chunk seconds, so the memory used does not
+        grow with the duration. An invalid specification raises ValueError here,
+        before the iterator is returned
+        """
+        if self._verb!=mplane.model.VERB_QUERY or self._bulk:
+            raise ValueError("Only query specifications can be streamed")
+        if len(self._peers)>0:
+            raise ValueError("Sections of several backends cannot be streamed")
+        
+        (period,duration) = self._check_when(spec)
+        
+        return self._iter_results(spec,check_interrupt,period,duration)
+
+    def _iter_results(self, spec, check_interrupt, period, duration):
+        logging.info("stream specification %s",spec)
         
         measurements=None
-        res=None
+        with self._in_flight():
+            try:
+                with self._phase("provision"), self._admitted(True):
+                    measurements=self._config_measurements(spec,period)
+                (first_time,last_time) = self._time_window(spec,measurements,period,duration)
+                with self._phase("watermark"):
+                    loaded=all([self._watermark.wait(p,last_time,last_time+period+300,check_interrupt) for p in self._fetch_periods(measurements,period)])
+                self._count_watermark_wait(loaded,last_time)
+                for (chunk_first,chunk_last) in self._chunks(period,first_time,last_time):
+                    if check_interrupt is not None and check_interrupt():
+                        logging.info("streaming interrupted %s",spec)
+                        return
+                    with self._phase("fetch"), self._admitted():
+                        grid=self._fetch_results(measurements,period,chunk_first,chunk_last)
+                    with self._phase("build"):
+                        res=self._build_result(spec,grid)
+                    yield res
+            except Exception as e:
+                logging.error("Error during specification %s: %s",spec,e)
+                raise e
+            finally:
+                with self._phase("delete"), self._admitted():
+                    self._delete_measurements(measurements)
+        
+        logging.info("specification done %s",spec)
 
+    def _chunks(self,period,first_time,last_time):
+        """
+        Splits the window into windows of at most query_chunk seconds, aligned to the period
+        """
+        chunk = max(1,self._query_chunk//period)*period
+        chunk_first = first_time
+        while chunk_first < last_time:
+            chunk_last = min(chunk_first+chunk,last_time)
+            yield (chunk_first,chunk_last)
+            chunk_first = chunk_last
+
+    def _check_when(self, spec):
+        """
+        Validates the temporal scope of the specification, returns the period and the duration in seconds
+        """
         period = spec.when().period()
         if period is None:
             raise ValueError("Missing period value")
         period = int(period.total_seconds())
-        if period not in PvsrService.valid_periods:
-            raise ValueError("Valid periods are: {0}".format(PvsrService.valid_periods))
+        if self._native_period(period) is None:
+            raise ValueError("The period must be a whole multiple of one of: {0}".format(sorted(PvsrService.valid_periods)))
         
         duration = spec.when().duration()
         if duration is None:
@@ -121,94 +618,228 @@ class PvsrService(mplane.scheduler.Service):
         if duration % period > 0:
             raise ValueError("The duration must be whole multiple of periods")
 
-        try:
-            measurements=self._config_measurements(spec,period)
-            res=self._fill_results(spec,measurements,period,duration)
-        except Exception as e:
-            logging.error("Error during specification {0}: {1}".format(spec,e))
-            raise e
-        finally:
-            self._delete_measurements(measurements)
-        
-        logging.info("specification done {0}".format(spec))
+        return (period,duration)
 
-        return res
+    def _native_period(self, period):
+        """
+        The PVSR period new measurements are created with for the period, None if
+        the period is not a whole multiple of a PVSR period. It is the base_period
+        of the section if the period is a multiple of it, so the specifications of
+        different periods share one measurement, otherwise the longest PVSR period
+        the period is a multiple of. Existing measurements of any period dividing
+        the requested one are used as they are, their values are resampled
+        """
+        native = [p for p in PvsrService.valid_periods if period % p == 0]
+        if len(native) == 0:
+            return None
+        if "base_period" in self._meas and period % self._meas["base_period"] == 0:
+            return self._meas["base_period"]
+        return max(native)
+
+    def _fetch_periods(self, measurements, period):
+        """
+        The distinct periods of the measurements, the data of each one is waited for
+        """
+        periods = set(meas.IntervalInSec for i in (0,1,2) for meas in measurements[i])
+        if len(periods) == 0:
+            periods.add(self._native_period(period))
+        return sorted(periods)
 
-    def _fill_results(self,spec,measurements,period,duration):
+    def _admitted(self, reject=False):
         """
-        Creates the mPlane Result
+        Holds an admission slot during a phase calling PVSR, a no-op without admission
+        control. Waiting for the data to be loaded does not hold a slot. Only the first
+        phase of a specification is rejected (reject) when PVSR is overloaded, the later
+        ones wait for their slot, a started specification does not lose its work
         """
-        logging.info("Fill measurements for spec {0}".format(spec))
+        if self._admission is None:
+            return _NO_OP
+        if self._verb==mplane.model.VERB_QUERY:
+            priority=pvsr_admission.PRIORITY_QUERY
+        else:
+            priority=pvsr_admission.PRIORITY_MEASURE
+        return self._admission.admit(self._meas["equipment"],priority,reject)
+
+    def _admitted_call(self, reject, fn, *args):
+        """
+        Calls fn holding an admission slot, for the coroutine variants running fn in the executor
+        """
+        with self._admitted(reject):
+            return fn(*args)
+
+    def _in_flight(self):
+        """
+        Counts and times the specification, a no-op without metrics
+        """
+        if self._metrics is None:
+            return _NO_OP
+        return self._metrics.in_flight("pvsr_specs",(("verb",self._verb),))
+
+    def _phase(self, phase):
+        """
+        Times a phase of the specification, a no-op without metrics
+        """
+        if self._metrics is None:
+            return _NO_OP
+        return self._metrics.timer("pvsr_spec_phase_seconds",(("verb",self._verb),("phase",phase)))
+
+    def _count_watermark_wait(self, loaded, last_time):
+        if not loaded:
+            logging.warning("Data is not loaded until %s, using what is available",datetime.datetime.fromtimestamp(last_time))
+        if self._metrics is not None:
+            self._metrics.inc("pvsr_watermark_waits_total",(("verb",self._verb),("outcome","loaded" if loaded else "timeout")))
+
+    def _fill_results(self,spec,measurements,period,duration,check_interrupt=None,flight=None,window=None):
+        """
+        Gets the measured values into a ResultGrid, in the window (first time, last time)
+        if it is given, e.g. the one shared by the backends of a federated specification
+        """
+        logging.info("Fill measurements for spec %s",spec)
+        
+        if window is not None:
+            (first_time,last_time) = window
+        else:
+            (first_time,last_time) = self._time_window(spec,measurements,period,duration)
+        if flight is not None and flight.window is None:
+            flight.set_window(first_time,last_time)
+        
+        logging.info("Wait for data until %s",datetime.datetime.fromtimestamp(last_time))
+        with self._phase("watermark"):
+            loaded=all([self._watermark.wait(p,last_time,last_time+period+300,self._watermark_interrupt(check_interrupt)) for p in self._fetch_periods(measurements,period)])
+        self._count_watermark_wait(loaded,last_time)
         
+        with self._phase("fetch"), self._admitted():
+            return self._fetch_results(measurements,period,first_time,last_time)
+
+    async def _fill_results_async(self,spec,measurements,period,duration,check_interrupt,flight=None):
+        """
+        Coroutine variant of _fill_results
+        """
+        logging.info("Fill measurements for spec %s",spec)
+        
+        (first_time,last_time) = self._time_window(spec,measurements,period,duration)
+        if flight is not None and flight.window is None:
+            flight.set_window(first_time,last_time)
+        
+        logging.info("Wait for data until %s",datetime.datetime.fromtimestamp(last_time))
+        with self._phase("watermark"):
+            loaded=True
+            for p in self._fetch_periods(measurements,period):
+                loaded=await self._engine.wait_watermark(self._watermark,p,last_time,last_time+period+300,self._watermark_interrupt(check_interrupt)) and loaded
+        self._count_watermark_wait(loaded,last_time)
+        
+        with self._phase("fetch"):
+            return await self._engine.call(self._admitted_call,False,self._fetch_results,measurements,period,first_time,last_time)
+
+    def _watermark_interrupt(self, check_interrupt):
+        """
+        The interrupt check of the watermark wait
+        """
+        if self._verb==mplane.model.VERB_QUERY:
+            return check_interrupt
+        #the scheduler interrupts measure jobs at the end of the requested window,
+        #but the data of a measurement only arrives later, after the conf check cycle
+        return None
+
+    def _time_window(self,spec,measurements,period,duration):
+        """
+        The first and the last time (UNIX time) to query
+        """
         if self._verb==mplane.model.VERB_QUERY:
             """
             Query according to the time specified in the specification
             """
-            (first_time,last_time) = spec.when().datetimes()
-            first_time=int(first_time.replace(tzinfo=datetime.timezone.utc).timestamp())
-            last_time=int(last_time.replace(tzinfo=datetime.timezone.utc).timestamp())
-            sleep_time = 0
+            (first_time,last_time) = self._query_window(spec)
         else:
             """
             Query from NOW
             """
             first_time = int(time.time())
-            if (len(measurements[1])>0 or len(measurements[2])>0) and period<=self._pvsr_default_conf_check_cycle:
+            if (len(measurements[1])>0 or len(measurements[2])>0) and self._native_period(period)<=self._pvsr_default_conf_check_cycle:
                 #there are newly created or modified measurements
                 first_time = first_time + self._pvsr_default_conf_check_cycle
+            elif self._lease_pool is not None:
+                #reused measurements created recently by another specification
+                for meas in measurements[0]:
+                    first_time = max(first_time, int(self._lease_pool.ready_at(meas)))
             if first_time % period > 0:
                 first_time = first_time - (first_time % period)
             last_time = first_time + int(duration / period) * period
-            sleep_time = duration
 
-        logging.debug("From: {0}, To: {1}".format(datetime.datetime.fromtimestamp(first_time),datetime.datetime.fromtimestamp(last_time)))
+        logging.debug("From: %s, To: %s",datetime.datetime.fromtimestamp(first_time),datetime.datetime.fromtimestamp(last_time))
         
-        meas_data = {}
+        return (first_time,last_time)
 
-        while True:
-            logging.info("Wait {0} seconds".format(sleep_time))
-            time.sleep(sleep_time)
-            sleep_time = 30
-            
-            loaded_until=self._pvsr.getLastLoadedDataTimestamp(period)
-            if int(loaded_until.timestamp())>=last_time or time.time()>last_time+period+300:
-                for i in (0,1,2):
-                    for j in range(len(measurements[i])):
-                        self._fill_meas_result(measurements[i][j],first_time,last_time,meas_data)
-                break
-            else:
-                logging.debug("last loaded is still {0}".format(loaded_until))
+    def _query_window(self,spec):
+        """
+        The window of a query specification (UNIX time)
+        """
+        (first_time,last_time) = spec.when().datetimes()
+        first_time=int(first_time.replace(tzinfo=datetime.timezone.utc).timestamp())
+        last_time=int(last_time.replace(tzinfo=datetime.timezone.utc).timestamp())
+        return (first_time,last_time)
+
+    def _fetch_results(self,measurements,period,first_time,last_time):
+        """
+        Gets the values of all measurements into a ResultGrid. The values of every
+        measurement are fetched with its own period and resampled to the period
+        """
+        all_meas = []
+        for i in (0,1,2):
+            for j in range(len(measurements[i])):
+                all_meas.append(measurements[i][j])
+
+        #every measurement is fetched into its own grid, merged in the original order
+        def fetch(meas):
+            meas_grid = self._fill_meas_result(meas,pvsr_result_grid.ResultGrid(first_time,last_time,meas.IntervalInSec))
+            if meas.IntervalInSec != period:
+                meas_grid = meas_grid.resample(period,self._aggregates)
+            return meas_grid
         
+        grid = pvsr_result_grid.ResultGrid(first_time,last_time,period)
+        for partial_grid in self._map(fetch,all_meas):
+            grid.update(partial_grid)
+        return grid
+
+    def _build_result(self,spec,grid):
+        """
+        Assembles the mPlane Result from the measured values
+        """
         res = mplane.model.Result(specification=spec)
-        res.set_when(mplane.model.When(a = datetime.datetime.utcfromtimestamp(first_time+period), b = datetime.datetime.utcfromtimestamp(last_time)))
-        
-        tmp_time=first_time+period
-        row_index=0
-        while tmp_time<=last_time:
-            tmp_time2 = datetime.datetime.fromtimestamp(tmp_time)
-            tmp_time3 = datetime.datetime.utcfromtimestamp(tmp_time)
-            res.set_result_value("time", tmp_time3, row_index)
-            if tmp_time2 in meas_data:
-                for mplane_name in meas_data[tmp_time2]:
-                    value = str(meas_data[tmp_time2][mplane_name])
-                    res.set_result_value(mplane_name, value, row_index)
-            row_index+=1
-            tmp_time+=period
-        
-        return res
+        res.set_when(mplane.model.When(a = datetime.datetime.utcfromtimestamp(grid.first_time+grid.period), b = datetime.datetime.utcfromtimestamp(grid.last_time)))
+        return grid.to_result(res)
 
+    def _build_bulk_result(self,spec,targets):
+        """
+        Assembles the long format mPlane Result of a bulk query, the rows
+        of every index value follow each other
+        """
+        grid = targets[0][1]
+        res = mplane.model.Result(specification=spec)
+        res.set_when(mplane.model.When(a = datetime.datetime.utcfromtimestamp(grid.first_time+grid.period), b = datetime.datetime.utcfromtimestamp(grid.last_time)))
+        row_offset = 0
+        for (index_value,grid) in targets:
+            grid.to_result(res,row_offset)
+            for row_index in range(grid.rows):
+                res.set_result_value(self._meas["index_mplane_name"],index_value,row_offset+row_index)
+            row_offset += grid.rows
+        return res
 
-    def _fill_meas_result(self,meas,from_time,to_time,meas_data):
+    def _fill_meas_result(self,meas,grid):
         """
-        Get measurement result from PVSR via SOAP
+        Get measurement result from PVSR via SOAP into the grid
         """
-        input=self._pvsr.create_pvsr_object("GetMeasuredValuesInput")
-        input.ObjType = "Measurement"
-        input.ObjId = meas.Id
-        input.From = datetime.datetime.fromtimestamp(from_time)
-        input.To = datetime.datetime.fromtimestamp(to_time)
-        logging.info("Get values, eq: {0}, type: {1}, index: {2}, name: {3}, {4} -> {5}".format(self._meas["equipment"],meas.Type,meas.Index,meas.DescriptionToShow,input.From,input.To))
-        meas_res=self._pvsr.getMeasuredValues(input)
+        from_time = grid.first_time
+        to_time = grid.last_time
+        if self._series_cache is not None and self._verb==mplane.model.VERB_QUERY:
+            key = (meas.Id,meas.IntervalInSec)
+            (samples,missing) = self._series_cache.lookup(key,from_time,to_time)
+            for (a,b) in missing:
+                fetched = self._get_measured_values(meas,a,b)
+                self._series_cache.put(key,a,b,fetched,self._watermark.loaded_until(meas.IntervalInSec))
+                samples.extend(fetched)
+        else:
+            samples = self._get_measured_values(meas,from_time,to_time)
         
         index2mplane_name={}
         multiply = None
@@ -217,19 +848,36 @@ class PvsrService(mplane.scheduler.Service):
         if "second" in self._meas["types"][meas.Type]:
             index2mplane_name[1]=self._meas["types"][meas.Type]["second"]
         if "multiply" in self._meas["types"][meas.Type]:
-            multiply=int(self._meas["types"][meas.Type]["multiply"])
+            multiply=float(self._meas["types"][meas.Type]["multiply"])
+            if multiply.is_integer():
+                multiply=int(multiply)
 
+        times = [t for (t,V) in samples]
+        for index,mplane_name in index2mplane_name.items():
+            grid.set_column(mplane_name,times,[V[index] if index < len(V) else None for (t,V) in samples])
+            if multiply is not None:
+                grid.scale_column(mplane_name,multiply)
+        return grid
+
+    def _get_measured_values(self,meas,from_time,to_time):
+        """
+        Get the raw values of a measurement from PVSR via SOAP as a list of (UNIX time, V)
+        """
+        input=self._pvsr.create_pvsr_object("GetMeasuredValuesInput")
+        input.ObjType = "Measurement"
+        input.ObjId = meas.Id
+        input.From = _pvsr_time(from_time)
+        input.To = _pvsr_time(to_time)
+        logging.info("Get values, eq: %s, type: %s, index: %s, name: %s, %s -> %s",self._meas["equipment"],meas.Type,meas.Index,meas.DescriptionToShow,input.From,input.To)
+        meas_res=self._pvsr.getMeasuredValues(input)
+        
+        samples = []
         if hasattr(meas_res,"D"):
+            previous = None
             for d in meas_res.D:
-                if d.T not in meas_data:
-                    meas_data[d.T]={}
-                for index,mplane_name in index2mplane_name.items():
-                    if index < len(d.V):
-                        if multiply is not None:
-                            d.V[index]*=multiply
-                        meas_data[d.T][mplane_name]=d.V[index]
-                    else:
-                        meas_data[d.T][mplane_name]=None
+                previous = _unix_time(d.T,previous)
+                samples.append((previous,list(d.V)))
+        return samples
 
     def _get_equipment(self):
         """
@@ -241,15 +889,15 @@ class PvsrService(mplane.scheduler.Service):
         if eq is None:
             site = self._pvsr.getSiteByName(self._default_site)
             if site is None:
-                logging.info("Creating new default site {0}".format(self._default_site))
+                logging.info("Creating new default site %s",self._default_site)
                 site = self._pvsr.create_pvsr_object("Site")
                 site.ParentId = 1
                 site.Name = self._default_site
                 site=self._pvsr.addSite(site)
             else:
-                logging.debug("Default site ID is {0}".format(site.Id))
+                logging.debug("Default site ID is %s",site.Id)
             
-            logging.info("Creating new equipment: {0}".format(self._meas["equipment"]))
+            logging.info("Creating new equipment: %s",self._meas["equipment"])
             if self._meas["collector_type"] == 'J':
                 eq = self._pvsr.create_pvsr_object("JagaEquipment")
                 eq.ASCII_0000_EQ_COLL_KEY = self._meas["equipment"] + "key"
@@ -265,32 +913,70 @@ class PvsrService(mplane.scheduler.Service):
             eq.CollectData = "Yes"
             
             eq = self._pvsr.addEquipment(eq)
-            logging.info("Added equipment {0}, id: {1}".format(self._meas["equipment"],eq.Id))
+            logging.info("Added equipment %s, id: %s",self._meas["equipment"],eq.Id)
         else:
-            logging.debug("Found equipment: {0}, id: {1}".format(self._meas["equipment"],eq.Id))
+            logging.debug("Found equipment: %s, id: %s",self._meas["equipment"],eq.Id)
         return eq
         
-    def _add_or_update_measurement(self,eq,meas_type,mplane_param2value,period):
+    def _list_candidate_measurements(self,eq,mplane_param2value):
+        """
+        Lists all measurements of the equipment which can belong to the specification
+        with a single SOAP call, the types are matched locally
+        """
+        meas = self._pvsr.create_pvsr_object("Measurement")
+        meas.ParentId = eq.Id
+        if "index_mplane_name" in self._meas:
+            if self._meas["index_mplane_name"] not in mplane_param2value:
+                raise ValueError("Missing {0} value".format(self._meas["index_mplane_name"]))
+            meas.Index = mplane_param2value[self._meas["index_mplane_name"]]
+        return self._pvsr.listMeasurements(meas)
+
+    def _list_equipment_measurements(self,eq):
+        """
+        Lists all measurements of the equipment with a single SOAP call
+        """
+        meas = self._pvsr.create_pvsr_object("Measurement")
+        meas.ParentId = eq.Id
+        return self._pvsr.listMeasurements(meas)
+
+    def _match_measurements(self,candidates,meas):
+        """
+        The candidates matching the Type and either the Index or the DescriptionToShow of meas
+        """
+        measA = []
+        for c in candidates:
+            if c.Type != meas.Type:
+                continue
+            if "index_mplane_name" in self._meas:
+                if c.Index == meas.Index:
+                    measA.append(c)
+            elif c.DescriptionToShow == meas.DescriptionToShow:
+                measA.append(c)
+        if len(measA) == 0 and "index_mplane_name" not in self._meas:
+            meas.Index = self._meas["name"]
+            for c in candidates:
+                if c.Type == meas.Type and c.Index == meas.Index:
+                    measA.append(c)
+        return measA
+
+    def _add_or_update_measurement(self,eq,meas_type,mplane_param2value,period,candidates,for_spec=True):
         """
         Add or update the measurement in PVSR.
         Add only works with verb "measure".
-        Update only updates the UDAs if "check_udas": false is not specified
+        Update only updates the UDAs if "check_udas": false is not specified.
+        A warm measurement used by a running specification is not modified
         """
         meas = self._pvsr.create_pvsr_object("Measurement")
         meas.ParentId = eq.Id
         meas.Type = meas_type
         if "index_mplane_name" in self._meas:
-            if self._meas["index_mplane_name"] not in mplane_param2value:
-                raise ValueError("Missing {0} value".format(self._meas["index_mplane_name"]))
             meas.Index = mplane_param2value[self._meas["index_mplane_name"]]
         else:
             meas.DescriptionToShow = self._meas["name"] + " " + self._pvsr_meas_types[meas_type]["Name"]
         
-        measA = self._pvsr.listMeasurements(meas)
-        if len(measA) == 0:
-            if "index_mplane_name" not in self._meas:
-                meas.Index = self._meas["name"]
-                measA = self._pvsr.listMeasurements(meas)
+        measA = self._match_measurements(candidates,meas)
+        #a measurement being deleted is as if it did not exist
+        measA = [m for m in measA if self._claim(m)]
         
         add2 = None
         
@@ -324,7 +1010,7 @@ class PvsrService(mplane.scheduler.Service):
                 elif self._uda_name2uda[uda].Required == "Yes":
                     raise ValueError("Missing required parameter: {0}".format(mplane_param))
             
-            logging.info("Creating measurement, eq: {0}, type: {1}, index: {2}, name: {3}".format(eq.Name,meas.Type,meas.Index,meas.DescriptionToShow))
+            logging.info("Creating measurement, eq: %s, type: %s, index: %s, name: %s",eq.Name,meas.Type,meas.Index,meas.DescriptionToShow)
             
             meas.Switched = "No"
             meas.RetainRawData = 365
@@ -335,7 +1021,7 @@ class PvsrService(mplane.scheduler.Service):
         else:
             #update
             meas = measA[0]
-            logging.info("Measurement already exists: eq: {0}, type: {1}, index: {2}, name: {3}".format(eq.Name,meas.Type,meas.Index,meas.DescriptionToShow))
+            logging.info("Measurement already exists: eq: %s, type: %s, index: %s, name: %s",eq.Name,meas.Type,meas.Index,meas.DescriptionToShow)
             
             need_mod = False
             meas_param_name2value = {}
@@ -350,9 +1036,9 @@ class PvsrService(mplane.scheduler.Service):
                     if mplane_param in mplane_param2value and mplane_param2value[mplane_param] != "":
                         if uda not in meas_param_name2value or meas_param_name2value[uda] != mplane_param2value[mplane_param]:
                             if uda not in meas_param_name2value:
-                                logging.warn("Parameter mismatch: {0}: NULL != {1}".format(uda,mplane_param2value[mplane_param]))
+                                logging.warn("Parameter mismatch: %s: NULL != %s",uda,mplane_param2value[mplane_param])
                             else:
-                                logging.warn("Parameter mismatch: {0}: {1} != {2}".format(uda,meas_param_name2value[uda],mplane_param2value[mplane_param]))
+                                logging.warn("Parameter mismatch: %s: %s != %s",uda,meas_param_name2value[uda],mplane_param2value[mplane_param])
                                 index2remove=None
                                 for i in range(len(meas.Parameter)):
                                     if meas.Parameter[i].Name == uda:
@@ -372,20 +1058,25 @@ class PvsrService(mplane.scheduler.Service):
                                     index2remove = i
                                     break
                             if index2remove is not None:
-                                logging.warn("Parameter mismatch: {0}: {1} != NULL".format(uda,meas_param_name2value[uda]))
+                                logging.warn("Parameter mismatch: %s: %s != NULL",uda,meas_param_name2value[uda])
                                 need_mod = True
                                 del meas.Parameter[index2remove]
             
-            if meas.IntervalInSec != period:
+            #a measurement of a shorter period is resampled, it serves the coarser specifications as well
+            if period % meas.IntervalInSec != 0:
+                logging.warn("Parameter mismatch: IntervalInSec: %s != %s",meas.IntervalInSec,period)
                 need_mod = True
                 meas.IntervalInSec = period
-                logging.warn("Parameter mismatch: IntervalInSec: {0} != {1}".format(meas.IntervalInSec,period))
+            
+            if need_mod and not for_spec and self._lease_pool is not None and self._lease_pool.held(meas):
+                logging.info("Warm measurement is in use, not modified: eq: %s, type: %s, index: %s, name: %s",eq.Name,meas.Type,meas.Index,meas.DescriptionToShow)
+                need_mod = False
             
             if need_mod:
                 if self._verb==mplane.model.VERB_QUERY:
                     raise ValueError("The measurement parameters do not match: Name={0}".format(meas.DescriptionToShow))
                 
-                logging.warn("Modifying measurement: eq: {0}, type: {1}, index: {2}, name: {3}".format(eq.Name,meas.Type,meas.Index,meas.DescriptionToShow))
+                logging.warn("Modifying measurement: eq: %s, type: %s, index: %s, name: %s",eq.Name,meas.Type,meas.Index,meas.DescriptionToShow)
                 meas = self._pvsr.modMeasurement(meas)
                 add2 = 2
             else:
@@ -397,48 +1088,175 @@ class PvsrService(mplane.scheduler.Service):
         """
         Add or update all measurements based on the "types" configuration
         """
-        logging.info("Config measurement for spec {0}".format(spec))
+        logging.info("Config measurement for spec %s",spec)
         
-        eq = self._get_equipment()
+        mplane_param2value={}
+        for k in spec.parameter_names():
+            mplane_param2value[k] = self._parameter_value(spec.get_parameter_value(k))
+        
+        return self._provision(mplane_param2value,self._native_period(period),True)
+
+    def _parameter_value(self, v):
+        """
+        The string value of an mPlane parameter used in PVSR
+        """
+        if isinstance(v,float):
+            return "{:.0f}".format(v)
+        else:
+            return str(v)
+
+    def _provision(self, mplane_param2value, period, for_spec, eq=None, candidates=None):
+        """
+        Add or update all measurements for the parameter values. The measurements
+        used by a specification (for_spec) are handed to the lease pool and the reaper,
+        the warm measurements are not. The equipment and the candidate measurements
+        are looked up unless they are passed
+        """
+        if eq is None:
+            with self._phase("equipment"):
+                eq = self._get_equipment()
 
         measurements=[[],[],[]]
         
-        mplane_param2value={}
-        for k in spec.parameter_names():
-            v = spec.get_parameter_value(k)
-            if isinstance(v,float):
-                v = "{:.0f}".format(v)
+        if candidates is None:
+            with self._phase("list_measurements"):
+                candidates = self._list_candidate_measurements(eq,mplane_param2value)
+        
+        def add_or_update(meas_type):
+            try:
+                with self._phase("add_or_update_measurement"):
+                    return (self._add_or_update_measurement(eq,meas_type,mplane_param2value,period,candidates,for_spec),None)
+            except Exception as e:
+                return (None,e)
+        
+        meas_types = sorted(self._meas["types"].keys())
+        if self._fanout is None:
+            outcomes = [add_or_update(meas_type) for meas_type in meas_types]
+        else:
+            outcomes = self._fanout.map(add_or_update,meas_types)
+        
+        error = None
+        for (outcome,e) in outcomes:
+            if e is not None:
+                if error is None:
+                    error = e
             else:
-                v = str(v)
-            mplane_param2value[k] = v
+                (meas,add2) = outcome
+                measurements[add2].append(meas)
+                if for_spec:
+                    self._track(meas,add2)
         
-        for meas_type in sorted(self._meas["types"].keys()):
-            (meas,add2)=self._add_or_update_measurement(eq,meas_type,mplane_param2value,period)
-            measurements[add2].append(meas)
+        if error is not None:
+            if for_spec:
+                #roll back the measurements created for this specification
+                self._delete_measurements(measurements)
+            raise error
+        
+        if for_spec and self._warm is not None and self._verb==mplane.model.VERB_MEASURE:
+            self._warm.record(measurements)
         
         return measurements
 
+    def _claim(self, meas):
+        """
+        False if the measurement found in PVSR is being deleted. The lease pool
+        cancels the deletion of an idle measurement if it is not too late,
+        without a lease pool a measurement queued for deletion is not reused
+        """
+        if self._lease_pool is not None:
+            return self._lease_pool.claim(meas)
+        if self._reaper is not None:
+            return not self._reaper.is_reaping(meas.Id)
+        return True
+
+    def _track(self, meas, add2):
+        """
+        Records a measurement used by a specification
+        """
+        if add2 == 1 and self._reaper is not None and self._delete_created_measurements:
+            self._reaper.track(meas)
+        if self._lease_pool is not None:
+            if add2 == 1:
+                self._lease_pool.register(meas)
+            else:
+                self._lease_pool.acquire(meas)
+
+    def provision_warm(self):
+        """
+        Provisions the measurements listed in the "warm" configuration of the section
+        and returns them. They are kept in PVSR, so matching measure specifications can start immediately.
+        They are created with the period the specifications of warm_period create them with
+        """
+        if "warm_period" in self._meas:
+            period = self._native_period(self._meas["warm_period"])
+        else:
+            period = self._native_period(60)
+        
+        provisioned = []
+        for params in self._meas["warm"]:
+            mplane_param2value = {}
+            if "mplane_constants" in self._meas:
+                for k,v in self._meas["mplane_constants"].items():
+                    mplane_param2value[k] = self._parameter_value(v)
+            for k,v in params.items():
+                mplane_param2value[k] = self._parameter_value(v)
+            logging.info("Provision warm measurements of %s: %s",self._meas["name"],mplane_param2value)
+            try:
+                measurements = self._provision(mplane_param2value,period,False)
+            except Exception as e:
+                logging.error("Cannot provision warm measurements of %s %s: %s",self._meas["name"],mplane_param2value,e)
+                continue
+            for i in (0,1,2):
+                provisioned.extend(measurements[i])
+        return provisioned
+
+    async def _config_measurements_async(self, spec, period):
+        """
+        Coroutine variant of _config_measurements
+        """
+        return await self._engine.call(self._admitted_call,True,self._config_measurements,spec,period)
+
     def _delete_measurements(self,measurements):
         """
-        Deletes measurement if it was created by the application and delete_created_measurements is not false
+        Deletes measurement if it was created by the application and delete_created_measurements is not false.
+        With a lease pool the measurements are only released, the pool deletes them when they become idle
         """
-        if not self._delete_created_measurements:
-            return
         if measurements is None:
             return
         if len(measurements) != 3:
             return
+        if self._lease_pool is not None:
+            for i in (0,1,2):
+                for meas in measurements[i]:
+                    self._lease_pool.release(meas)
+            return
+        if not self._delete_created_measurements:
+            return
         if len(measurements[1]) == 0:
             return
         
-        for i in range(len(measurements[1])):
-            meas = measurements[1][i]
-            logging.info("Delete measurement: eq: {0}, type: {1}, index: {2}, name: {3}".format(self._meas["equipment"],meas.Type,meas.Index,meas.DescriptionToShow))
+        if self._reaper is not None:
+            for created in measurements[1]:
+                self._reaper.reap(created)
+            return
+        
+        def delete(created):
+            logging.info("Delete measurement: eq: %s, type: %s, index: %s, name: %s",self._meas["equipment"],created.Type,created.Index,created.DescriptionToShow)
             try:
                 meas = self._pvsr.create_pvsr_object("Measurement")
-                meas.Id = measurements[1][i].Id
+                meas.Id = created.Id
                 self._pvsr.delMeasurement(meas)
             except Exception as e:
-                logging.error("Cannot delete measurement {0}: {1}".format(measurements[1][i],e))
-            
- 
\ No newline at end of file
+                logging.error("Cannot delete measurement %s: %s",created,e)
+        
+        if self._fanout is None:
+            for created in measurements[1]:
+                delete(created)
+        else:
+            self._fanout.map(delete,measurements[1])
+
+    async def _delete_measurements_async(self,measurements):
+        """
+        Coroutine variant of _delete_measurements
+        """
+        await self._engine.call(self._admitted_call,False,self._delete_measurements,measurements)
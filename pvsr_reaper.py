@@ -0,0 +1,228 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Deletion of the measurements created by the proxy off the request path.
+Every created measurement is recorded in an append-only journal, the
+reaper thread deletes the measurements in batches and records the
+deletions. At startup the measurements left over by a previous run are
+read back from the journal and reaped. A queued measurement can be taken
+back until its batch is deleted, a specification reusing it cancels its deletion.
+
+Journal format, one record per line:
+    +<measurement id>    created
+    -<measurement id>    deleted
+
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+
+class MeasurementJournal(object):
+    def __init__(self, path, sync_interval):
+        self._path = path
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._dirty = False
+
+    def recover(self):
+        """
+        Returns the Ids of the measurements created but not deleted according
+        to the journal and compacts the journal to these records
+        """
+        live = collections.OrderedDict()
+        if os.path.isfile(self._path):
+            with open(self._path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if len(line) < 2 or line[0] not in "+-":
+                        continue
+                    try:
+                        meas_id = int(line[1:])
+                    except ValueError:
+                        #a record torn by a crash
+                        continue
+                    if line[0] == "+":
+                        live[meas_id] = True
+                    else:
+                        live.pop(meas_id, None)
+
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for meas_id in live:
+                f.write("+{0}\n".format(meas_id))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path)
+
+        self._file = open(self._path, "a")
+        thread = threading.Thread(target=self._run, name="pvsr-journal")
+        thread.daemon = True
+        thread.start()
+        return list(live.keys())
+
+    def created(self, meas_id):
+        self._append("+{0}\n".format(meas_id))
+
+    def deleted(self, meas_id):
+        self._append("-{0}\n".format(meas_id))
+
+    def _append(self, record):
+        with self._lock:
+            self._file.write(record)
+            self._dirty = True
+
+    def sync(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _run(self):
+        while True:
+            time.sleep(self._sync_interval)
+            try:
+                self.sync()
+            except Exception as e:
+                logging.error("Cannot sync the measurement journal %s: %s", self._path, e)
+
+class MeasurementReaper(object):
+    max_attempts = 3
+    #the ids of the deleted measurements remembered, a specification may have listed them just before
+    recently_deleted = 10000
+
+    def __init__(self, pvsr, journal, batch_size, interval):
+        self._pvsr = pvsr
+        self._journal = journal
+        self._batch_size = batch_size
+        self._interval = interval
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._deleting = set()
+        self._deleted = collections.OrderedDict()
+        self._thread = threading.Thread(target=self._run, name="pvsr-reaper")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def track(self, meas):
+        """
+        Records a measurement created by the proxy
+        """
+        if self._journal is not None:
+            self._journal.created(meas.Id)
+
+    def reap(self, meas, done=None):
+        """
+        Queues a measurement created by the proxy for deletion.
+        done is called with the id from the reaper thread when it is not queued any more
+        """
+        self.reap_id(meas.Id, "type: {0}, index: {1}, name: {2}".format(meas.Type, meas.Index, meas.DescriptionToShow), done)
+
+    def reap_id(self, meas_id, description=None, done=None):
+        with self._cond:
+            self._queue.append((meas_id, description, 0, done))
+            if len(self._queue) >= self._batch_size:
+                self._cond.notify()
+
+    def is_reaping(self, meas_id):
+        """
+        True if the measurement is queued for deletion, being deleted or deleted recently.
+        A specification must not use it unless cancel takes it back
+        """
+        with self._cond:
+            return meas_id in self._deleting or meas_id in self._deleted or any(entry[0] == meas_id for entry in self._queue)
+
+    def cancel(self, meas_id):
+        """
+        Takes a queued measurement back, it is not deleted. Returns False if it
+        is not queued, e.g. it is being deleted already
+        """
+        with self._cond:
+            queued = [entry for entry in self._queue if entry[0] == meas_id]
+            if len(queued) == 0:
+                return False
+            self._queue = collections.deque(entry for entry in self._queue if entry[0] != meas_id)
+        logging.info("Deletion of measurement %s is cancelled, it is used again", meas_id)
+        return True
+
+    def _next_batch(self):
+        with self._cond:
+            if len(self._queue) < self._batch_size:
+                self._cond.wait(self._interval)
+            batch = []
+            while len(self._queue) > 0 and len(batch) < self._batch_size:
+                entry = self._queue.popleft()
+                self._deleting.add(entry[0])
+                batch.append(entry)
+            return batch
+
+    def _finish(self, meas_id, deleted):
+        with self._cond:
+            self._deleting.discard(meas_id)
+            if deleted:
+                self._deleted[meas_id] = True
+                while len(self._deleted) > MeasurementReaper.recently_deleted:
+                    self._deleted.popitem(last=False)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            failed = []
+            for (meas_id, description, attempts, done) in batch:
+                logging.info("Delete measurement: id: %s, %s", meas_id, description)
+                try:
+                    meas = self._pvsr.create_pvsr_object("Measurement")
+                    meas.Id = meas_id
+                    self._pvsr.delMeasurement(meas)
+                except Exception as e:
+                    if attempts + 1 < MeasurementReaper.max_attempts:
+                        logging.warning("Cannot delete measurement %s, retrying later: %s", meas_id, e)
+                        failed.append((meas_id, description, attempts + 1, done))
+                        continue
+                    #it stays in the journal, the next startup retries it
+                    logging.error("Cannot delete measurement %s: %s", meas_id, e)
+                    self._finish(meas_id, False)
+                    if done is not None:
+                        done(meas_id)
+                    continue
+                if self._journal is not None:
+                    self._journal.deleted(meas_id)
+                self._finish(meas_id, True)
+                if done is not None:
+                    done(meas_id)
+            if len(failed) > 0:
+                with self._cond:
+                    for entry in failed:
+                        self._deleting.discard(entry[0])
+                    self._queue.extend(failed)
+            if self._journal is not None and len(batch) > 0:
+                try:
+                    self._journal.sync()
+                except Exception as e:
+                    logging.error("Cannot sync the measurement journal: %s", e)
@@ -0,0 +1,179 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Columnar result grid. Every result column is one preallocated numeric array
+indexed by (t - first_time) // period - 1 with a validity mask for the
+missing samples. The rows are identified by UNIX time, never by local time.
+A grid can be resampled to a period which is a whole multiple of its own.
+
+"""
+
+import datetime
+import numpy
+
+AGGREGATES = ("mean", "min", "max", "last")
+
+class ResultGrid(object):
+    def __init__(self, first_time, last_time, period):
+        """
+        The rows are first_time+period, first_time+2*period, ... last_time
+        """
+        self.first_time = first_time
+        self.last_time = last_time
+        self.period = period
+        self.rows = max(0, (last_time - first_time) // period)
+        self.values = {}
+        self.valid = {}
+
+    def column_names(self):
+        return list(self.values.keys())
+
+    def times(self):
+        """
+        The UNIX time of every row
+        """
+        return self.first_time + self.period * numpy.arange(1, self.rows + 1, dtype=numpy.int64)
+
+    def row_indexes(self, times):
+        """
+        Row index of every time in the array, -1 if it does not fall on a row
+        """
+        times = numpy.asarray(times, dtype=numpy.int64)
+        offset = times - self.first_time
+        index = offset // self.period - 1
+        index[(offset % self.period != 0) | (index < 0) | (index >= self.rows)] = -1
+        return index
+
+    def set_column(self, name, times, values):
+        """
+        Sets the values of a column at the given UNIX times. None values are
+        treated as missing samples, samples between rows are ignored
+        """
+        index = self.row_indexes(times)
+        present = numpy.array([v is not None for v in values], dtype=bool) & (index >= 0)
+        data = numpy.array([v if v is not None else 0 for v in values])
+        if data.dtype.kind not in "iuf":
+            data = data.astype(numpy.float64)
+        if name not in self.values:
+            self.values[name] = numpy.zeros(self.rows, dtype=data.dtype)
+            self.valid[name] = numpy.zeros(self.rows, dtype=bool)
+        elif numpy.result_type(self.values[name].dtype, data.dtype) != self.values[name].dtype:
+            self.values[name] = self.values[name].astype(numpy.result_type(self.values[name].dtype, data.dtype))
+        self.values[name][index[present]] = data[present]
+        self.valid[name][index[present]] = True
+
+    def slice(self, first_time, last_time):
+        """
+        Grid of a window inside this one, first_time must fall on a row boundary
+        """
+        if first_time == self.first_time and last_time == self.last_time:
+            return self
+        grid = ResultGrid(first_time, last_time, self.period)
+        start = (first_time - self.first_time) // self.period
+        for name in self.values:
+            grid.values[name] = self.values[name][start:start + grid.rows].copy()
+            grid.valid[name] = self.valid[name][start:start + grid.rows].copy()
+        return grid
+
+    def scale_column(self, name, factor):
+        """
+        Multiplies the values of a column, integer columns become float for non-integer factors
+        """
+        if name in self.values:
+            self.values[name] = self.values[name] * factor
+
+    def resample(self, period, aggregates):
+        """
+        Grid of the same window with a longer period. A row aggregates the rows
+        of this grid in (t - period, t], only the valid values are used.
+        aggregates: {column name: one of AGGREGATES}, mean by default
+        """
+        if period % self.period != 0 or (self.last_time - self.first_time) % period != 0:
+            raise ValueError("Cannot resample period {0} to {1}".format(self.period, period))
+        grid = ResultGrid(self.first_time, self.last_time, period)
+        ratio = period // self.period
+        for name in self.values:
+            values = self.values[name][:grid.rows * ratio].reshape(grid.rows, ratio)
+            valid = self.valid[name][:grid.rows * ratio].reshape(grid.rows, ratio)
+            count = valid.sum(axis=1)
+            aggregate = aggregates.get(name, "mean")
+            if aggregate == "mean":
+                result = numpy.where(valid, values, 0).sum(axis=1) / numpy.maximum(count, 1)
+            elif aggregate == "min":
+                result = numpy.where(valid, values, _highest(values.dtype)).min(axis=1)
+            elif aggregate == "max":
+                result = numpy.where(valid, values, _lowest(values.dtype)).max(axis=1)
+            elif aggregate == "last":
+                last = ratio - 1 - numpy.argmax(valid[:, ::-1], axis=1)
+                result = values[numpy.arange(grid.rows), last]
+            else:
+                raise ValueError("Unknown aggregate {0}".format(aggregate))
+            grid.values[name] = result
+            grid.valid[name] = count > 0
+        return grid
+
+    def update(self, other):
+        """
+        Copies the valid values of another grid with the same period into this one.
+        Only the rows inside both windows are copied, the rows must be aligned
+        """
+        first_time = max(self.first_time, other.first_time)
+        rows = max(0, (min(self.last_time, other.last_time) - first_time) // self.period)
+        start = (first_time - self.first_time) // self.period
+        other_start = (first_time - other.first_time) // self.period
+        for name in other.values:
+            present = other.valid[name][other_start:other_start + rows]
+            values = other.values[name][other_start:other_start + rows]
+            if name not in self.values:
+                self.values[name] = numpy.zeros(self.rows, dtype=values.dtype)
+                self.valid[name] = numpy.zeros(self.rows, dtype=bool)
+            dtype = numpy.result_type(self.values[name].dtype, values.dtype)
+            if dtype != self.values[name].dtype:
+                self.values[name] = self.values[name].astype(dtype)
+            self.values[name][start:start + rows][present] = values[present]
+            self.valid[name][start:start + rows] |= present
+
+    def to_result(self, res, row_offset=0):
+        """
+        Fills the rows of an mplane.model.Result starting at row_offset
+        """
+        base = datetime.datetime.utcfromtimestamp(self.first_time)
+        step = datetime.timedelta(seconds=self.period)
+        for row_index in range(self.rows):
+            res.set_result_value("time", base + step * (row_index + 1), row_offset + row_index)
+        for name in self.values:
+            values = self.values[name].tolist()
+            for row_index in numpy.flatnonzero(self.valid[name]).tolist():
+                res.set_result_value(name, str(values[row_index]), row_offset + row_index)
+        return res
+
+def _highest(dtype):
+    if dtype.kind == "f":
+        return numpy.inf
+    return numpy.iinfo(dtype).max
+
+def _lowest(dtype):
+    if dtype.kind == "f":
+        return -numpy.inf
+    return numpy.iinfo(dtype).min
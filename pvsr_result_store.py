@@ -0,0 +1,87 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+The encoded results of the specifications run through the /result endpoint,
+kept for a while so a client can retrieve them again by their token. The
+store is bounded by the size of the bodies, the oldest ones are dropped.
+
+"""
+
+import collections
+import hashlib
+import threading
+import time
+
+def etag(token, content_type, version):
+    """
+    The entity tag of a result in an encoding. version is the data_version of
+    the result, the values of a window only change while PVSR loads its data
+    """
+    return '"' + hashlib.sha1(repr((token, content_type, version)).encode("utf-8")).hexdigest() + '"'
+
+class _StoredBody(object):
+    def __init__(self, etag, body):
+        self.etag = etag
+        self.body = body
+        self.stored_at = time.monotonic()
+
+class ResultStore(object):
+    def __init__(self, max_bytes, ttl):
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        #{(token, content type): _StoredBody}, the least recently stored first
+        self._bodies = collections.OrderedDict()
+        self._bytes = 0
+
+    def put(self, token, content_type, etag, body):
+        """
+        Stores an encoded result, a body larger than the whole store is not stored
+        """
+        if len(body) > self._max_bytes:
+            return
+        with self._lock:
+            self._remove((token, content_type))
+            self._bodies[(token, content_type)] = _StoredBody(etag, body)
+            self._bytes += len(body)
+            while self._bytes > self._max_bytes:
+                self._remove(next(iter(self._bodies)))
+
+    def get(self, token, content_type):
+        """
+        (etag, body) of the result in the encoding, None if it is unknown or expired
+        """
+        with self._lock:
+            stored = self._bodies.get((token, content_type))
+            if stored is None:
+                return None
+            if time.monotonic() - stored.stored_at > self._ttl:
+                self._remove((token, content_type))
+                return None
+            return (stored.etag, stored.body)
+
+    def _remove(self, key):
+        stored = self._bodies.pop(key, None)
+        if stored is not None:
+            self._bytes -= len(stored.body)
@@ -0,0 +1,52 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+mplane.scheduler.Scheduler whose services can be replaced while it runs.
+The capabilities are looked up in the services, so a removed service
+is not discovered any more.
+
+"""
+
+import mplane.scheduler
+
+class ReloadableScheduler(mplane.scheduler.Scheduler):
+    def replace_services(self, added, removed):
+        """
+        Adds and removes services in one step. The specifications already
+        running on the removed services are not interrupted, they finish on them
+        """
+        self.services = [service for service in self.services if service not in removed] + list(added)
+
+    def _capabilities(self):
+        capabilities = {}
+        for service in self.services:
+            cap = service.capability()
+            capabilities[cap.get_token()] = cap
+        return capabilities
+
+    def capability_keys(self):
+        return self._capabilities().keys()
+
+    def capability_for_key(self, key):
+        return self._capabilities()[key]
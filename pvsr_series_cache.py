@@ -0,0 +1,113 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Range aware cache of measured values. For every (measurement Id, period)
+the already fetched time ranges are kept with their samples, so an
+overlapping query only has to fetch the missing sub-ranges from PVSR.
+Nothing newer than the last loaded data timestamp is cached.
+
+"""
+
+import bisect
+import collections
+import threading
+
+class _Range(object):
+    def __init__(self, key, from_time, to_time, samples):
+        self.key = key
+        self.from_time = from_time
+        self.to_time = to_time
+        #sorted list of (UNIX time, V)
+        self.samples = samples
+        self.times = [sample[0] for sample in samples]
+
+class SeriesCache(object):
+    def __init__(self, max_samples):
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        self._ranges = {}
+        self._lru = collections.OrderedDict()
+        self._samples = 0
+
+    def lookup(self, key, from_time, to_time):
+        """
+        Returns the cached samples between from_time and to_time as a list
+        of (UNIX time, V) and the list of (from, to) ranges still missing
+        """
+        samples = []
+        missing = []
+        start = from_time
+        with self._lock:
+            for r in self._ranges.get(key, ()):
+                if r.to_time < start or r.from_time > to_time:
+                    continue
+                if r.from_time > start:
+                    missing.append((start, r.from_time))
+                lo = bisect.bisect_left(r.times, max(start, r.from_time))
+                hi = bisect.bisect_right(r.times, min(to_time, r.to_time))
+                samples.extend(r.samples[lo:hi])
+                start = max(start, r.to_time)
+                self._lru.move_to_end(id(r))
+        if start < to_time:
+            missing.append((start, to_time))
+        return (samples, missing)
+
+    def put(self, key, from_time, to_time, samples, loaded_until):
+        """
+        Stores the samples fetched for from_time..to_time, only up to loaded_until
+        """
+        if loaded_until is None or self._max_samples <= 0:
+            return
+        to_time = min(to_time, loaded_until)
+        if to_time <= from_time:
+            return
+        samples = sorted((s for s in samples if from_time <= s[0] <= to_time), key=lambda s: s[0])
+        with self._lock:
+            ranges = self._ranges.get(key, [])
+            merged = _Range(key, from_time, to_time, samples)
+            kept = []
+            for r in ranges:
+                if r.to_time < merged.from_time or r.from_time > merged.to_time:
+                    kept.append(r)
+                    continue
+                #overlapping or touching ranges are merged, the newer samples win
+                by_time = dict((s[0], s) for s in r.samples)
+                by_time.update((s[0], s) for s in merged.samples)
+                merged = _Range(key, min(r.from_time, merged.from_time), max(r.to_time, merged.to_time), sorted(by_time.values(), key=lambda s: s[0]))
+                self._forget(r)
+            kept.append(merged)
+            kept.sort(key=lambda r: r.from_time)
+            self._ranges[key] = kept
+            self._lru[id(merged)] = merged
+            self._samples += len(merged.samples)
+            while self._samples > self._max_samples and len(self._lru) > 0:
+                (_, oldest) = self._lru.popitem(last=False)
+                self._samples -= len(oldest.samples)
+                self._ranges[oldest.key].remove(oldest)
+                if len(self._ranges[oldest.key]) == 0:
+                    del self._ranges[oldest.key]
+
+    def _forget(self, r):
+        del self._lru[id(r)]
+        self._samples -= len(r.samples)
@@ -0,0 +1,151 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Coalescing of identical concurrent specifications. The first specification
+of a key runs, the later ones whose time window is covered by its window
+attach to it and get the same grid, cut to their own window. If the first
+one is interrupted before its data is loaded, its grid is not handed over,
+the attached specifications run on their own.
+
+"""
+
+import threading
+
+class Interrupted(Exception):
+    """
+    The specification waiting for a flight was interrupted
+    """
+    def __init__(self):
+        Exception.__init__(self, "Interrupted while waiting for an identical specification")
+
+class Abandoned(Exception):
+    """
+    The specification running the flight was interrupted, the attached ones have to run on their own
+    """
+    def __init__(self):
+        Exception.__init__(self, "The identical specification was interrupted")
+
+class Flight(object):
+    def __init__(self, key, window):
+        self.key = key
+        self.window = window
+        self.followers = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._callbacks = []
+        self._grid = None
+        self._error = None
+
+    def set_window(self, first_time, last_time):
+        """
+        Publishes the window of a flight started without one,
+        specifications can only attach once the window is known
+        """
+        self.window = (first_time, last_time)
+
+    def covers(self, first_time, last_time, period):
+        if self.window is None:
+            return False
+        (flight_first, flight_last) = self.window
+        return flight_first <= first_time and last_time <= flight_last and (first_time - flight_first) % period == 0
+
+    def subscribe(self, callback):
+        """
+        callback() is called when the flight finishes, at once if it is finished
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def result(self, first_time, last_time):
+        """
+        The grid of a finished flight cut to the window, or its error raised
+        """
+        if self._error is not None:
+            raise self._error
+        return self._grid.slice(first_time, last_time)
+
+    def wait(self, first_time, last_time, check_interrupt=None):
+        """
+        Blocks until the flight finishes and returns its result. If check_interrupt
+        is given it is checked every second, Interrupted is raised when it returns True
+        """
+        while not self._done.wait(1):
+            if check_interrupt is not None and check_interrupt():
+                raise Interrupted()
+        return self.result(first_time, last_time)
+
+    def _finish(self, grid, error):
+        with self._lock:
+            self._grid = grid
+            self._error = error
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            callback()
+
+class SingleFlight(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def attach(self, key, window_of, period):
+        """
+        Returns (flight, window) of a running flight covering the window, or
+        (None, None). window_of(flight) gives the window to request from the
+        flight, it is called with the lock held
+        """
+        with self._lock:
+            for flight in self._flights.get(key, ()):
+                window = window_of(flight)
+                if window is not None and flight.covers(window[0], window[1], period):
+                    flight.followers += 1
+                    return (flight, window)
+        return (None, None)
+
+    def leave(self, flight):
+        """
+        An attached specification interrupted before the flight finished
+        """
+        with self._lock:
+            flight.followers -= 1
+
+    def start(self, key, window=None):
+        flight = Flight(key, window)
+        with self._lock:
+            self._flights.setdefault(key, []).append(flight)
+        return flight
+
+    def finish(self, flight, grid=None, error=None):
+        """
+        Hands the grid or the error to the attached specifications
+        """
+        with self._lock:
+            flights = self._flights[flight.key]
+            flights.remove(flight)
+            if len(flights) == 0:
+                del self._flights[flight.key]
+        flight._finish(grid, error)
@@ -0,0 +1,179 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Pool of PVSR SOAP client sessions. Every SOAP call checks out a session,
+so concurrent specifications do not queue behind each other on one
+connection. Sessions idle for keep_alive seconds are health checked
+before reuse, sessions idle for idle_timeout seconds are closed down to
+min_sessions. A caller waits at most checkout_timeout seconds for a free
+session, a SOAP request times out after call_timeout seconds.
+
+A session is only discarded after a transport error or a timeout, a
+SOAP fault is an answer of a working PVSR and the session is reused.
+
+"""
+
+import collections
+import http.client
+import logging
+import threading
+import time
+
+try:
+    from suds.transport import TransportError
+except ImportError:
+    #suds is only needed by the real sessions
+    TransportError = OSError
+
+#errors after which the session is not reused, timeouts are OSErrors too
+broken_session_errors = (OSError, http.client.HTTPException, TransportError)
+
+class PvsrClientPool(object):
+    #the period of the last loaded data timestamp asked by the health check
+    health_check_period = 300
+
+    def __init__(self, factory, min_sessions, max_sessions, keep_alive, idle_timeout, checkout_timeout, call_timeout):
+        self._factory = factory
+        self._min_sessions = min_sessions
+        self._max_sessions = max(1, max_sessions)
+        self._keep_alive = keep_alive
+        self._idle_timeout = idle_timeout
+        self._checkout_timeout = checkout_timeout
+        self._call_timeout = call_timeout
+        self._cond = threading.Condition()
+        self._idle = collections.deque()
+        self._sessions = 0
+
+        #the first session also creates the PVSR objects, that does not use the connection
+        self._template = self._new_session()
+        self._idle.append((self._template, time.time()))
+        for i in range(1, min_sessions):
+            self._idle.append((self._new_session(), time.time()))
+
+        thread = threading.Thread(target=self._run, name="pvsr-soap-pool")
+        thread.daemon = True
+        thread.start()
+
+    def create_pvsr_object(self, name):
+        return self._template.create_pvsr_object(name)
+
+    def stats(self):
+        """
+        (open sessions, idle sessions)
+        """
+        with self._cond:
+            return (self._sessions, len(self._idle))
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        def call(*args):
+            client = self._checkout()
+            try:
+                res = getattr(client, name)(*args)
+            except broken_session_errors:
+                #the session may be broken, do not reuse it
+                self._discard(client)
+                raise
+            except Exception:
+                #e.g. a suds.WebFault, the session is fine
+                self._checkin(client)
+                raise
+            self._checkin(client)
+            return res
+        return call
+
+    def _new_session(self):
+        with self._cond:
+            self._sessions += 1
+        return self._create_session()
+
+    def _create_session(self):
+        """
+        Creates a session in a slot already reserved in _sessions
+        """
+        try:
+            client = self._factory()
+            if hasattr(client, "set_options"):
+                client.set_options(timeout=self._call_timeout)
+        except Exception:
+            with self._cond:
+                self._sessions -= 1
+                self._cond.notify()
+            raise
+        return client
+
+    def _checkout(self):
+        deadline = time.time() + self._checkout_timeout
+        while True:
+            with self._cond:
+                while len(self._idle) == 0 and self._sessions >= self._max_sessions:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError("No free PVSR SOAP session in {0} seconds".format(self._checkout_timeout))
+                    self._cond.wait(remaining)
+                if len(self._idle) == 0:
+                    #the slot is reserved under the same lock as the check of max_sessions
+                    self._sessions += 1
+                    client = None
+                else:
+                    (client, last_used) = self._idle.pop()
+            if client is None:
+                return self._create_session()
+            if time.time() - last_used < self._keep_alive or self._healthy(client):
+                return client
+            self._discard(client)
+
+    def _healthy(self, client):
+        try:
+            #cheap call used as health check
+            client.getLastLoadedDataTimestamp(PvsrClientPool.health_check_period)
+            return True
+        except Exception as e:
+            logging.warning("PVSR SOAP session failed the health check: %s", e)
+            return False
+
+    def _checkin(self, client):
+        with self._cond:
+            self._idle.append((client, time.time()))
+            self._cond.notify()
+
+    def _discard(self, client):
+        with self._cond:
+            self._sessions -= 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            time.sleep(max(1, min(self._idle_timeout, 60)))
+            now = time.time()
+            with self._cond:
+                #the least recently used sessions are at the left end
+                while len(self._idle) > 0 and self._sessions > self._min_sessions and now - self._idle[0][1] >= self._idle_timeout:
+                    (client, last_used) = self._idle.popleft()
+                    if client is self._template:
+                        self._idle.append((client, last_used))
+                        break
+                    self._sessions -= 1
+            logging.debug("PVSR SOAP sessions: %s, idle: %s", self._sessions, len(self._idle))
@@ -0,0 +1,92 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Local snapshot of the PVSR measurement types, keyed by the PVSR URL.
+The types are stored as plain JSON and restored as PvsrObject instances,
+which support both the item and the attribute access of the SOAP objects.
+
+"""
+
+import json
+import os
+
+class PvsrObject(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+def to_plain(value):
+    """
+    Converts a SOAP object to JSON serializable values
+    """
+    if hasattr(value, "__keylist__"):
+        return dict((k, to_plain(getattr(value, k))) for k in value.__keylist__)
+    if isinstance(value, dict):
+        return dict((k, to_plain(v)) for k,v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return str(value)
+
+def from_plain(value):
+    if isinstance(value, dict):
+        return PvsrObject((k, from_plain(v)) for k,v in value.items())
+    if isinstance(value, list):
+        return [from_plain(v) for v in value]
+    return value
+
+def load(path, url):
+    """
+    The measurement types stored for the PVSR URL or None
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            snapshot = json.load(f)
+    except ValueError:
+        return None
+    if url not in snapshot:
+        return None
+    return dict((k, from_plain(v)) for k,v in snapshot[url].items())
+
+def save(path, url, meas_types):
+    """
+    Stores the measurement types of the PVSR URL, keeping the other URLs
+    """
+    snapshot = {}
+    if os.path.isfile(path):
+        try:
+            with open(path, "r") as f:
+                snapshot = json.load(f)
+        except ValueError:
+            snapshot = {}
+    snapshot[url] = dict((k, to_plain(v)) for k,v in meas_types.items())
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
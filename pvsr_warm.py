@@ -0,0 +1,109 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Warm measurements. The measurements listed in the "warm" configuration of
+the measurements sections are provisioned at startup and kept in PVSR,
+so matching measure specifications find an existing measurement and do
+not wait for the PVSR configuration check cycle. The periodic refresh
+does not modify the measurements running specifications hold a lease on.
+
+"""
+
+import logging
+import threading
+
+class WarmMeasurements(object):
+    def __init__(self, refresh_interval):
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._services = []
+        self._thread = None
+        self._refresh = threading.Event()
+        self._ids = frozenset()
+        self._warm_hits = 0
+        self._reused = 0
+        self._cold = 0
+
+    def add_service(self, service):
+        """
+        A measure service of a section with "warm" configuration. Services added
+        after start are provisioned right away
+        """
+        with self._lock:
+            self._services.append(service)
+            if self._thread is not None:
+                self._refresh.set()
+
+    def remove_service(self, service):
+        """
+        The warm measurements of a removed service are left in PVSR
+        """
+        with self._lock:
+            if service in self._services:
+                self._services.remove(service)
+
+    def start(self):
+        with self._lock:
+            if len(self._services) == 0 or self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="pvsr-warm")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._refresh.clear()
+            with self._lock:
+                services = list(self._services)
+            ids = set()
+            for service in services:
+                for meas in service.provision_warm():
+                    ids.add(meas.Id)
+            with self._lock:
+                self._ids = frozenset(ids)
+            logging.info("%s warm measurements are provisioned", len(ids))
+            self._refresh.wait(self._refresh_interval)
+
+    def record(self, measurements):
+        """
+        Counts a measure specification as a warm hit, a reuse of another existing
+        measurement or a cold provision
+        """
+        with self._lock:
+            if len(measurements[1]) > 0 or len(measurements[2]) > 0:
+                self._cold += 1
+            elif all(meas.Id in self._ids for meas in measurements[0]):
+                self._warm_hits += 1
+            else:
+                self._reused += 1
+            warm_hits = self._warm_hits
+            total = self._warm_hits + self._reused + self._cold
+        logging.debug("warm hit ratio: %s/%s", warm_hits, total)
+
+    def stats(self):
+        """
+        (warm hits, reused existing measurements, cold provisions)
+        """
+        with self._lock:
+            return (self._warm_hits, self._reused, self._cold)
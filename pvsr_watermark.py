@@ -0,0 +1,192 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Shared PVSR load watermark poller. One background thread calls
+getLastLoadedDataTimestamp once per distinct period for all waiting
+specifications instead of every specification polling on its own.
+
+"""
+
+import logging
+import threading
+import time
+
+class WatermarkWaiter(object):
+    """
+    A specification waiting until PVSR has loaded the data up to last_time
+    """
+    def __init__(self, period, last_time, deadline, callback=None):
+        self.period = period
+        self.last_time = last_time
+        self.deadline = deadline
+        self.loaded = False
+        self.event = threading.Event()
+        self._callback = callback
+
+    def _wake(self, loaded):
+        self.loaded = loaded
+        self.event.set()
+        if self._callback is not None:
+            self._callback(loaded)
+
+class WatermarkPoller(object):
+    def __init__(self, pvsr, poll_interval):
+        self._pvsr = pvsr
+        self._poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._waiters = {}
+        self._loaded_until = {}
+        self._next_poll = {}
+        self._thread = None
+
+    def loaded_until(self, period):
+        """
+        The last known watermark for the period (UNIX time) or None
+        """
+        with self._cond:
+            return self._loaded_until.get(period)
+
+    def poll(self, period):
+        """
+        Polls the watermark of the period now and returns it, None if the poll fails
+        """
+        return self._poll(period)
+
+    def stats(self):
+        """
+        {period: (last known watermark or None, number of waiters)}
+        """
+        with self._cond:
+            periods = set(self._loaded_until.keys()) | set(self._waiters.keys())
+            return dict((period, (self._loaded_until.get(period), len(self._waiters.get(period, ())))) for period in periods)
+
+    def subscribe(self, period, last_time, deadline, callback=None):
+        """
+        Registers a waiter. The waiter is woken when the watermark of the period
+        reaches last_time (loaded=True) or when the deadline passes (loaded=False).
+        The optional callback is called with the same flag from the poller thread
+        """
+        waiter = WatermarkWaiter(period, last_time, deadline, callback)
+        with self._cond:
+            loaded_until = self._loaded_until.get(period)
+            if loaded_until is not None and loaded_until >= last_time:
+                waiter._wake(True)
+                return waiter
+            if period not in self._waiters:
+                self._waiters[period] = set()
+            self._waiters[period].add(waiter)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pvsr-watermark")
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+        return waiter
+
+    def unsubscribe(self, waiter):
+        with self._cond:
+            if waiter.period in self._waiters:
+                self._waiters[waiter.period].discard(waiter)
+                if len(self._waiters[waiter.period]) == 0:
+                    del self._waiters[waiter.period]
+
+    def wait(self, period, last_time, deadline, check_interrupt=None):
+        """
+        Blocks until the data is loaded or the deadline passes.
+        Returns True only if the data is loaded. If check_interrupt is given
+        it is checked every second and the wait is abandoned when it returns True
+        """
+        waiter = self.subscribe(period, last_time, deadline)
+        try:
+            while not waiter.event.wait(1):
+                if check_interrupt is not None and check_interrupt():
+                    logging.info("Interrupted while waiting for period %s data until %s", period, last_time)
+                    return False
+            return waiter.loaded
+        finally:
+            self.unsubscribe(waiter)
+
+    def _due_periods(self, now):
+        """
+        Wakes the expired waiters and returns the periods to poll now
+        and the time of the next interesting event. Must hold the lock
+        """
+        due = []
+        wake_at = now + self._poll_interval
+        for period, waiters in self._waiters.items():
+            pending = False
+            for waiter in list(waiters):
+                if waiter.deadline <= now:
+                    logging.debug("watermark wait timed out, period: %s, last time: %s", period, waiter.last_time)
+                    waiter._wake(False)
+                    waiters.discard(waiter)
+                    continue
+                wake_at = min(wake_at, waiter.deadline)
+                if waiter.last_time <= now:
+                    #PVSR cannot have loaded data for a window that is still open
+                    pending = True
+                else:
+                    wake_at = min(wake_at, waiter.last_time)
+            if pending:
+                next_poll = self._next_poll.get(period, 0)
+                if next_poll <= now:
+                    due.append(period)
+                else:
+                    wake_at = min(wake_at, next_poll)
+        return (due, wake_at)
+
+    def _poll(self, period):
+        """
+        Gets the watermark of the period and wakes the waiters it reached,
+        returns the watermark or None if it cannot be got
+        """
+        try:
+            loaded_until = int(self._pvsr.getLastLoadedDataTimestamp(period).timestamp())
+        except Exception as e:
+            logging.error("Cannot get last loaded data timestamp for period %s: %s", period, e)
+            loaded_until = None
+
+        with self._cond:
+            self._next_poll[period] = time.time() + self._poll_interval
+            if loaded_until is None:
+                return None
+            if period not in self._loaded_until or self._loaded_until[period] < loaded_until:
+                self._loaded_until[period] = loaded_until
+            for waiter in list(self._waiters.get(period, ())):
+                if waiter.last_time <= loaded_until:
+                    waiter._wake(True)
+                    self._waiters[period].discard(waiter)
+            if period in self._waiters and len(self._waiters[period]) > 0:
+                logging.debug("last loaded is still %s for period %s", loaded_until, period)
+        return loaded_until
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.time()
+                (due, wake_at) = self._due_periods(now)
+                if len(due) == 0:
+                    self._cond.wait(max(wake_at - now, 0.01))
+                    continue
+            for period in due:
+                self._poll(period)
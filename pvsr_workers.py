@@ -0,0 +1,241 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Multi-process mode. The measurements sections are sharded among worker
+processes, every worker runs the services of its sections with its own
+PVSR SOAP client, caches and journal. The front process serves HTTP and
+its scheduler forwards the specifications to the workers through a pipe,
+every message is a JSON object:
+    front -> worker    {"id", "label", "spec"}  run a specification
+                       {"id", "interrupt"}       interrupt a specification
+    worker -> front    {"capabilities"}          the worker is ready
+                       {"id", "result"}          or {"id", "error", "type"}
+The "type" of an error is the name of the exception, an AdmissionRejected
+also carries its "retry_after" and is raised again in the front process.
+Every worker admits the specifications of its sections with its own
+AdmissionController, the global max_running and max_queued limits are
+divided among the workers.
+
+"""
+
+import json
+import logging
+import multiprocessing
+import sys
+import threading
+import zlib
+import mplane.model
+import mplane.scheduler
+import pvsr_admission
+
+def assign_shards(names, workers, assignment):
+    """
+    {worker index: [section names]}, a section goes to the worker given in
+    the assignment or to the one selected by the CRC32 of its name
+    """
+    shards = {}
+    for name in names:
+        if name in assignment:
+            index = assignment[name] % workers
+        else:
+            index = zlib.crc32(name.encode("utf-8")) % workers
+        shards.setdefault(index, []).append(name)
+    return shards
+
+class RemotePvsrService(mplane.scheduler.Service):
+    """
+    Service of the front process running the specifications in a worker
+    """
+    def __init__(self, cap, worker):
+        super(RemotePvsrService, self).__init__(cap)
+        self._worker = worker
+
+    def run(self, spec, check_interrupt):
+        return self._worker.call(self.capability().get_label(), spec, check_interrupt)
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.reply = None
+
+class WorkerProcess(object):
+    def __init__(self, index, config_file_name, sections):
+        self.index = index
+        self._config_file_name = config_file_name
+        self._sections = sections
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._next_id = 0
+        self._conn = None
+
+    def start(self):
+        """
+        Starts the worker and returns the RemotePvsrService of every capability it offers
+        """
+        #a forked child would inherit the threads and locks of the front process
+        context = multiprocessing.get_context("spawn")
+        (self._conn, child_conn) = context.Pipe()
+        self._process = context.Process(target=worker_main, args=(self.index, self._config_file_name, self._sections, child_conn), name="pvsr-worker-{0}".format(self.index))
+        self._process.daemon = True
+        self._process.start()
+        child_conn.close()
+        
+        ready = json.loads(self._conn.recv_bytes().decode("utf-8"))
+        if "error" in ready:
+            raise ValueError("Worker {0} cannot start: {1}".format(self.index, ready["error"]))
+        logging.info("Worker %s started with sections %s", self.index, self._sections)
+        
+        thread = threading.Thread(target=self._read, name="pvsr-worker-{0}-reader".format(self.index))
+        thread.daemon = True
+        thread.start()
+        return [RemotePvsrService(mplane.model.parse_json(cap), self) for cap in ready["capabilities"]]
+
+    def _send(self, msg):
+        data = json.dumps(msg).encode("utf-8")
+        with self._lock:
+            self._conn.send_bytes(data)
+
+    def call(self, label, spec, check_interrupt):
+        """
+        Runs a specification in the worker, blocks until the result arrives
+        """
+        call = _Call()
+        with self._lock:
+            self._next_id += 1
+            call_id = self._next_id
+            self._calls[call_id] = call
+        try:
+            self._send({"id": call_id, "label": label, "spec": mplane.model.unparse_json(spec)})
+            interrupted = False
+            while not call.done.wait(1):
+                if not interrupted and check_interrupt():
+                    self._send({"id": call_id, "interrupt": True})
+                    interrupted = True
+        finally:
+            with self._lock:
+                del self._calls[call_id]
+        if "error" in call.reply:
+            if call.reply.get("type") == "AdmissionRejected":
+                raise pvsr_admission.AdmissionRejected(call.reply["retry_after"])
+            raise ValueError(call.reply["error"])
+        return mplane.model.parse_json(call.reply["result"])
+
+    def _read(self):
+        try:
+            while True:
+                reply = json.loads(self._conn.recv_bytes().decode("utf-8"))
+                with self._lock:
+                    call = self._calls.get(reply["id"])
+                if call is not None:
+                    call.reply = reply
+                    call.done.set()
+        except (EOFError, OSError) as e:
+            logging.critical("Worker %s stopped: %s", self.index, e)
+        with self._lock:
+            calls = list(self._calls.values())
+        for call in calls:
+            call.reply = {"error": "Worker {0} stopped".format(self.index)}
+            call.done.set()
+
+def error_reply(call_id, e):
+    """
+    The reply of a failed specification
+    """
+    reply = {"id": call_id, "error": str(e), "type": type(e).__name__}
+    if isinstance(e, pvsr_admission.AdmissionRejected):
+        reply["retry_after"] = e.retry_after
+    return reply
+
+def share_admission_limits(admission, workers):
+    """
+    Divides the global limits of the admission section among the workers.
+    The per equipment limits are kept, an equipment shared by sections of
+    different workers gets its limit in each of them
+    """
+    admission["max_running"] = max(1, (admission["max_running"] + workers - 1) // workers)
+    admission["max_queued"] = (admission["max_queued"] + workers - 1) // workers
+
+def worker_main(index, config_file_name, sections, conn):
+    """
+    Entry point of a worker process, it runs the services of the sections
+    """
+    import pvsr_proxy_probe as probe
+    
+    send_lock = threading.Lock()
+    def send(msg):
+        data = json.dumps(msg).encode("utf-8")
+        with send_lock:
+            conn.send_bytes(data)
+    
+    try:
+        sys.argv = [sys.argv[0], config_file_name]
+        probe.read_config_json()
+        probe.parse_logging_section()
+        probe.config["measurements"] = dict((name, probe.config["measurements"][name]) for name in sections)
+        probe.parse_measurements_section()
+        probe.parse_soap_section()
+        probe.pvsr_defaults()
+        share_admission_limits(probe.config["admission"], probe.config["workers"])
+        #the files written by the workers are not shared
+        for (key, suffix) in (("measurement_journal", ".journal"), ("type_snapshot", ".types.json")):
+            path = probe.config.get(key, probe.__file__.replace(".py", suffix))
+            if path:
+                probe.config[key] = "{0}.{1}".format(path, index)
+        probe.preload_soap_data()
+        probe.start_runtime()
+        scheduler = probe.create_scheduler()
+    except BaseException as e:
+        send({"error": str(e)})
+        raise
+    
+    services = dict((service.capability().get_label(), service) for service in scheduler.services)
+    send({"capabilities": [mplane.model.unparse_json(service.capability()) for service in scheduler.services]})
+    
+    interrupts = {}
+    def run(call_id, service, spec):
+        try:
+            res = service.run(spec, interrupts[call_id].is_set)
+            send({"id": call_id, "result": mplane.model.unparse_json(res)})
+        except Exception as e:
+            send(error_reply(call_id, e))
+        finally:
+            del interrupts[call_id]
+    
+    while True:
+        try:
+            msg = json.loads(conn.recv_bytes().decode("utf-8"))
+        except (EOFError, OSError):
+            logging.info("Worker %s: the front process is gone", index)
+            return
+        if "interrupt" in msg:
+            if msg["id"] in interrupts:
+                interrupts[msg["id"]].set()
+            continue
+        if msg["label"] not in services:
+            send({"id": msg["id"], "error": "No service {0} in worker {1}".format(msg["label"], index)})
+            continue
+        interrupts[msg["id"]] = threading.Event()
+        thread = threading.Thread(target=run, args=(msg["id"], services[msg["label"]], mplane.model.parse_json(msg["spec"])), name="pvsr-worker-spec")
+        thread.daemon = True
+        thread.start()
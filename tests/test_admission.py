@@ -0,0 +1,134 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_admission.AdmissionController
+
+"""
+
+import threading
+import time
+import unittest
+import pvsr_admission
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+class AdmissionTest(unittest.TestCase):
+    def admit_in_thread(self, controller, equipment, priority, events, name, hold):
+        """
+        Admits in a thread which records name in events when it gets the slot
+        and holds it until hold is set
+        """
+        def run():
+            try:
+                with controller.admit(equipment, priority):
+                    events.append(name)
+                    hold.wait(5)
+            except pvsr_admission.AdmissionRejected:
+                events.append(name + " rejected")
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_reject_when_queue_is_full(self):
+        controller = pvsr_admission.AdmissionController(1, 0, {}, 10)
+        with controller.admit("eq", pvsr_admission.PRIORITY_QUERY):
+            with self.assertRaises(pvsr_admission.AdmissionRejected) as raised:
+                with controller.admit("eq", pvsr_admission.PRIORITY_QUERY):
+                    pass
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(controller.stats(), (0, 0, 1))
+
+    def test_queued_until_released(self):
+        controller = pvsr_admission.AdmissionController(1, 5, {}, 10)
+        events = []
+        hold = threading.Event()
+        with controller.admit("eq", pvsr_admission.PRIORITY_QUERY):
+            thread = self.admit_in_thread(controller, "eq", pvsr_admission.PRIORITY_QUERY, events, "queued", hold)
+            _wait_for(lambda: controller.stats()[1] == 1)
+            self.assertEqual(events, [])
+        _wait_for(lambda: events == ["queued"])
+        hold.set()
+        thread.join()
+        self.assertEqual(controller.stats(), (0, 0, 0))
+
+    def test_queue_timeout(self):
+        controller = pvsr_admission.AdmissionController(1, 5, {}, 0.1)
+        with controller.admit("eq", pvsr_admission.PRIORITY_QUERY):
+            with self.assertRaises(pvsr_admission.AdmissionRejected):
+                with controller.admit("eq", pvsr_admission.PRIORITY_QUERY):
+                    pass
+            self.assertEqual(controller.stats(), (1, 0, 1))
+
+    def test_equipment_limit(self):
+        controller = pvsr_admission.AdmissionController(10, 0, {"busy": 1}, 10)
+        with controller.admit("busy", pvsr_admission.PRIORITY_QUERY):
+            #another equipment is only limited globally
+            with controller.admit("other", pvsr_admission.PRIORITY_QUERY):
+                self.assertEqual(controller.stats()[0], 2)
+            with self.assertRaises(pvsr_admission.AdmissionRejected):
+                with controller.admit("busy", pvsr_admission.PRIORITY_QUERY):
+                    pass
+
+    def test_queries_before_measures(self):
+        controller = pvsr_admission.AdmissionController(1, 5, {}, 10)
+        events = []
+        hold = threading.Event()
+        hold.set()
+        threads = []
+        with controller.admit("eq", pvsr_admission.PRIORITY_QUERY):
+            threads.append(self.admit_in_thread(controller, "eq", pvsr_admission.PRIORITY_MEASURE, events, "measure", hold))
+            _wait_for(lambda: controller.stats()[1] == 1)
+            threads.append(self.admit_in_thread(controller, "eq", pvsr_admission.PRIORITY_QUERY, events, "query", hold))
+            _wait_for(lambda: controller.stats()[1] == 2)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(events, ["query", "measure"])
+
+    def test_later_phase_is_never_rejected(self):
+        controller = pvsr_admission.AdmissionController(1, 0, {}, 0.05)
+        with controller.admit("eq", pvsr_admission.PRIORITY_QUERY):
+            done = []
+            #e.g. the fetch of a specification which waited hours for its data
+            def later_phase():
+                with controller.admit("eq", pvsr_admission.PRIORITY_QUERY, False):
+                    done.append(True)
+            thread = threading.Thread(target=later_phase)
+            thread.daemon = True
+            thread.start()
+            _wait_for(lambda: controller.stats()[1] == 1)
+            #longer than the queue timeout
+            time.sleep(0.2)
+            self.assertEqual(done, [])
+        thread.join(5)
+        self.assertEqual(done, [True])
+        self.assertEqual(controller.stats(), (0, 0, 0))
+
+if __name__ == "__main__":
+    unittest.main()
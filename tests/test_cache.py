@@ -0,0 +1,143 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_cache.CachingPvsrClient
+
+"""
+
+import collections
+import unittest
+import pvsr_cache
+
+class _Object(object):
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+class _Pvsr(object):
+    """
+    PVSR client stand-in counting the calls
+    """
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.equipments = {}
+        self.measurements = []
+
+    def getEquipmentByName(self, name):
+        self.calls["getEquipmentByName"] += 1
+        return self.equipments.get(name)
+
+    def getSiteByName(self, name):
+        self.calls["getSiteByName"] += 1
+        return None
+
+    def addEquipment(self, eq):
+        self.calls["addEquipment"] += 1
+        self.equipments[eq.Name] = eq
+        return eq
+
+    def listMeasurements(self, meas):
+        self.calls["listMeasurements"] += 1
+        return [m for m in self.measurements if m.ParentId == meas.ParentId]
+
+    def addMeasurement(self, meas):
+        self.measurements.append(meas)
+        return meas
+
+    def modMeasurement(self, meas):
+        return meas
+
+    def delMeasurement(self, meas):
+        self.measurements = [m for m in self.measurements if m.Id != meas.Id]
+        return True
+
+    def getLastLoadedDataTimestamp(self, period):
+        self.calls["getLastLoadedDataTimestamp"] += 1
+        return period
+
+class CachingPvsrClientTest(unittest.TestCase):
+    def setUp(self):
+        self.pvsr = _Pvsr()
+        self.cache = pvsr_cache.CachingPvsrClient(self.pvsr, {"equipment": 3600, "site": 3600, "measurements": 60}, 100)
+
+    def test_cached_lookup(self):
+        self.pvsr.equipments["eq"] = _Object(Name="eq", Id=1)
+        first = self.cache.getEquipmentByName("eq")
+        second = self.cache.getEquipmentByName("eq")
+        self.assertEqual(second.Id, 1)
+        #the callers get copies, they may modify them
+        self.assertIsNot(first, second)
+        self.assertEqual(self.pvsr.calls["getEquipmentByName"], 1)
+        self.assertEqual(self.cache.stats()["equipment"], (1, 1))
+
+    def test_missing_is_not_cached(self):
+        self.assertIsNone(self.cache.getEquipmentByName("eq"))
+        self.assertIsNone(self.cache.getSiteByName("site"))
+        #e.g. created by another worker process
+        self.pvsr.equipments["eq"] = _Object(Name="eq", Id=1)
+        self.assertEqual(self.cache.getEquipmentByName("eq").Id, 1)
+        self.assertIsNone(self.cache.getSiteByName("site"))
+        self.assertEqual(self.pvsr.calls["getEquipmentByName"], 2)
+        self.assertEqual(self.pvsr.calls["getSiteByName"], 2)
+
+    def test_add_equipment_invalidates(self):
+        self.pvsr.equipments["eq"] = _Object(Name="eq", Id=1)
+        self.cache.getEquipmentByName("eq")
+        self.cache.addEquipment(_Object(Name="eq", Id=2))
+        self.assertEqual(self.cache.getEquipmentByName("eq").Id, 2)
+        self.assertEqual(self.pvsr.calls["getEquipmentByName"], 2)
+
+    def test_measurement_changes_invalidate_lists(self):
+        query = _Object(ParentId=1, Type=None, Index=None, DescriptionToShow=None)
+        self.assertEqual(self.cache.listMeasurements(query), [])
+        self.cache.addMeasurement(_Object(ParentId=1, Id=10))
+        self.assertEqual([m.Id for m in self.cache.listMeasurements(query)], [10])
+        self.assertEqual([m.Id for m in self.cache.listMeasurements(query)], [10])
+        self.assertEqual(self.pvsr.calls["listMeasurements"], 2)
+        #the measurement to delete only has its Id, the lists containing it are dropped
+        self.cache.delMeasurement(_Object(Id=10))
+        self.assertEqual(self.cache.listMeasurements(query), [])
+        self.assertEqual(self.pvsr.calls["listMeasurements"], 3)
+
+    def test_lru_bound(self):
+        cache = pvsr_cache.CachingPvsrClient(self.pvsr, {"equipment": 3600, "site": 3600, "measurements": 60}, 2)
+        for name in ("a", "b", "c"):
+            self.pvsr.equipments[name] = _Object(Name=name, Id=name)
+            cache.getEquipmentByName(name)
+        cache.getEquipmentByName("c")
+        cache.getEquipmentByName("a")
+        self.assertEqual(self.pvsr.calls["getEquipmentByName"], 4)
+
+    def test_zero_ttl_disables_the_kind(self):
+        cache = pvsr_cache.CachingPvsrClient(self.pvsr, {"equipment": 0, "site": 3600, "measurements": 60}, 100)
+        self.pvsr.equipments["eq"] = _Object(Name="eq", Id=1)
+        cache.getEquipmentByName("eq")
+        cache.getEquipmentByName("eq")
+        self.assertEqual(self.pvsr.calls["getEquipmentByName"], 2)
+
+    def test_other_calls_pass_through(self):
+        self.assertEqual(self.cache.getLastLoadedDataTimestamp(300), 300)
+        self.assertEqual(self.pvsr.calls["getLastLoadedDataTimestamp"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
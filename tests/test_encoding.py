@@ -0,0 +1,81 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_encoding
+
+"""
+
+import unittest
+import numpy
+import pvsr_encoding
+import pvsr_result_grid
+
+def _grid(values, rtt):
+    grid = pvsr_result_grid.ResultGrid(1000, 1240, 60)
+    grid.set_column("count", [1060, 1120, 1180, 1240], values)
+    grid.set_column("rtt", [1060, 1120, 1180, 1240], rtt)
+    return grid
+
+class EncodingTest(unittest.TestCase):
+    def test_round_trip(self):
+        grid = _grid([1, None, 300, 4], [0.5, 1.5, None, 2.5])
+        data = pvsr_encoding.encode("query-rtt", "abc", [(None, grid)])
+        (header, columns) = pvsr_encoding.decode(data)
+        self.assertEqual(header["label"], "query-rtt")
+        self.assertEqual(header["token"], "abc")
+        self.assertEqual((header["first_time"], header["period"], header["rows"]), (1000, 60, 4))
+        self.assertIsNone(header["index_name"])
+        self.assertIsNone(header["index_values"])
+        #300 does not fit into int8
+        self.assertEqual(header["columns"], [{"name": "count", "type": "<i2"}, {"name": "rtt", "type": "<f8"}])
+        (values, valid) = columns["count"]
+        self.assertEqual(valid.tolist(), [True, False, True, True])
+        self.assertEqual(values[valid].tolist(), [1, 300, 4])
+        (values, valid) = columns["rtt"]
+        self.assertEqual(valid.tolist(), [True, True, False, True])
+        self.assertEqual(values[valid].tolist(), [0.5, 1.5, 2.5])
+
+    def test_bulk_round_trip(self):
+        first = _grid([1, 2, 3, 4], [None, None, None, None])
+        second = pvsr_result_grid.ResultGrid(1000, 1240, 60)
+        second.set_column("count", [1120], [100000])
+        data = pvsr_encoding.encode("query-rtt", "abc", [("a", first), ("b", second)], "url")
+        (header, columns) = pvsr_encoding.decode(data)
+        self.assertEqual(header["index_name"], "url")
+        self.assertEqual(header["index_values"], ["a", "b"])
+        self.assertEqual(header["columns"][0], {"name": "count", "type": "<i4"})
+        (values, valid) = columns["count"]
+        self.assertEqual(valid.tolist(), [True] * 4 + [False, True, False, False])
+        self.assertEqual(values[valid].tolist(), [1, 2, 3, 4, 100000])
+        #the column missing from the second grid is invalid in its block
+        (values, valid) = columns["rtt"]
+        self.assertEqual(len(valid), 8)
+        self.assertFalse(valid.any())
+
+    def test_bad_magic(self):
+        with self.assertRaises(ValueError):
+            pvsr_encoding.decode(b"NOTPVSR!" + b"\0" * 8)
+
+if __name__ == "__main__":
+    unittest.main()
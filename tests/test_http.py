@@ -0,0 +1,133 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of the /result endpoints of pvsr_http
+
+"""
+
+import unittest
+import pvsr_encoding
+import pvsr_result_grid
+import pvsr_result_store
+
+try:
+    import mplane.model
+    import pvsr_http
+    import tornado.testing
+    import tornado.web
+except ImportError:
+    tornado = None
+
+class _Service(object):
+    """
+    Runs every specification into the same grid, data_version gives version
+    """
+    def __init__(self, cap):
+        self._cap = cap
+        self.version = (0, 3600, 300, (1800,))
+        self.runs = 0
+
+    def capability(self):
+        return self._cap
+
+    def index_name(self):
+        return None
+
+    def run_targets(self, spec, check_interrupt):
+        self.runs += 1
+        grid = pvsr_result_grid.ResultGrid(0, 3600, 300)
+        grid.set_column("delay.twoway.icmp.us.mean", [300, 600], [self.runs, self.runs])
+        return [(None, grid)]
+
+    def data_version(self, targets):
+        return self.version
+
+class _Scheduler(object):
+    def __init__(self, services):
+        self.services = services
+
+@unittest.skipIf(tornado is None, "tornado and mplane are needed")
+class ResultHandlerTest(tornado.testing.AsyncHTTPTestCase if tornado is not None else unittest.TestCase):
+    def get_app(self):
+        mplane.model.initialize_registry()
+        cap = mplane.model.Capability(label="ping-query", when="past ... now / 15s", verb=mplane.model.VERB_QUERY)
+        cap.add_parameter("source.ip4")
+        cap.add_result_column("time")
+        cap.add_result_column("delay.twoway.icmp.us.mean")
+        self.service = _Service(cap)
+        spec = mplane.model.Specification(capability=cap)
+        spec.set_parameter_value("source.ip4", "10.0.0.1")
+        spec.set_when("2023-11-01 00:00:00 ... 2023-11-01 01:00:00 / 5m")
+        self.token = spec.get_token()
+        self.body = mplane.model.unparse_json(spec)
+        self.result_store = pvsr_result_store.ResultStore(1024 * 1024, 600)
+        return tornado.web.Application([
+                (r"/result", pvsr_http.ResultHandler, {"scheduler": _Scheduler([self.service]), "result_store": self.result_store}),
+                (r"/result/([^/]+)", pvsr_http.StoredResultHandler, {"result_store": self.result_store}),
+            ])
+
+    def post(self, headers=None):
+        all_headers = {"Accept": pvsr_encoding.CONTENT_TYPE}
+        all_headers.update(headers or {})
+        return self.fetch("/result", method="POST", body=self.body, headers=all_headers)
+
+    def get(self, headers=None):
+        all_headers = {"Accept": pvsr_encoding.CONTENT_TYPE}
+        all_headers.update(headers or {})
+        return self.fetch("/result/" + self.token, headers=all_headers)
+
+    def test_post_is_not_conditional(self):
+        response = self.post()
+        self.assertEqual(response.code, 200)
+        etag = response.headers["Etag"]
+        (header, columns) = pvsr_encoding.decode(response.body)
+        self.assertEqual(header["token"], self.token)
+        #a POST always runs the specification
+        response = self.post({"If-None-Match": etag})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Etag"], etag)
+        self.assertEqual(self.service.runs, 2)
+
+    def test_get_stored_result(self):
+        etag = self.post().headers["Etag"]
+        response = self.get()
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Etag"], etag)
+        self.assertEqual(self.get({"If-None-Match": etag}).code, 304)
+        self.assertEqual(self.service.runs, 1)
+
+    def test_new_data_changes_etag(self):
+        etag = self.post().headers["Etag"]
+        self.service.version = (0, 3600, 300, (3600,))
+        new_etag = self.post().headers["Etag"]
+        self.assertNotEqual(new_etag, etag)
+        response = self.get({"If-None-Match": etag})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Etag"], new_etag)
+
+    def test_unknown_token(self):
+        self.assertEqual(self.fetch("/result/unknown").code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_lease.MeasurementLeasePool
+
+"""
+
+import time
+import unittest
+import pvsr_lease
+
+class _Measurement(object):
+    def __init__(self, meas_id):
+        self.Id = meas_id
+        self.Type = "T"
+        self.Index = None
+        self.DescriptionToShow = "m{0}".format(meas_id)
+
+class _Reaper(object):
+    """
+    MeasurementReaper stand-in, deleting moves a queued measurement to deleting
+    """
+    def __init__(self):
+        self.queued = {}
+        self.deleting = set()
+
+    def reap(self, meas, done=None):
+        self.queued[meas.Id] = done
+
+    def is_reaping(self, meas_id):
+        return meas_id in self.queued or meas_id in self.deleting
+
+    def cancel(self, meas_id):
+        return self.queued.pop(meas_id, False) is not False
+
+    def delete(self, meas_id):
+        self.deleting.add(meas_id)
+        return self.queued.pop(meas_id)
+
+class MeasurementLeasePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.reaper = _Reaper()
+        self.pool = pvsr_lease.MeasurementLeasePool(self.reaper, 600, 60)
+
+    def _expire(self, meas):
+        self.pool._leases[meas.Id].idle_since = time.time() - 601
+        self.pool._collect()
+
+    def test_refcount(self):
+        meas = _Measurement(1)
+        self.pool.acquire(meas)
+        self.pool.acquire(meas)
+        self.pool.release(meas)
+        self.assertTrue(self.pool.held(meas))
+        self.pool.release(meas)
+        self.assertFalse(self.pool.held(meas))
+        #a measurement not created by the proxy is forgotten, not deleted
+        self.assertNotIn(1, self.pool._leases)
+        self.pool.release(meas)
+
+    def test_created_measurement_is_reaped_when_idle(self):
+        meas = _Measurement(1)
+        before = time.time()
+        self.pool.register(meas)
+        self.assertGreaterEqual(self.pool.ready_at(meas), before + 60)
+        self.pool._collect()
+        self.assertEqual(self.reaper.queued, {})
+        self.pool.release(meas)
+        self.pool._collect()
+        self.assertEqual(self.reaper.queued, {})
+        self._expire(meas)
+        self.assertIn(1, self.reaper.queued)
+        self.reaper.delete(1)(1)
+        self.assertNotIn(1, self.pool._leases)
+        self.assertEqual(self.pool.ready_at(meas), 0)
+
+    def test_used_measurement_is_not_reaped(self):
+        meas = _Measurement(1)
+        self.pool.register(meas)
+        self.pool.acquire(meas)
+        self.pool.release(meas)
+        self.pool._collect()
+        self.assertEqual(self.reaper.queued, {})
+
+    def test_claim_cancels_the_deletion(self):
+        meas = _Measurement(1)
+        self.pool.register(meas)
+        self.pool.release(meas)
+        self._expire(meas)
+        self.assertTrue(self.pool.claim(meas))
+        self.assertEqual(self.reaper.queued, {})
+        self.assertFalse(self.pool._leases[1].reaping)
+        #it is reaped again once idle for the grace period
+        self._expire(meas)
+        self.assertIn(1, self.reaper.queued)
+
+    def test_claim_too_late(self):
+        meas = _Measurement(1)
+        self.pool.register(meas)
+        self.pool.release(meas)
+        self._expire(meas)
+        done = self.reaper.delete(1)
+        self.assertFalse(self.pool.claim(meas))
+        done(1)
+        self.assertNotIn(1, self.pool._leases)
+
+    def test_claim_measurement_of_a_previous_run(self):
+        meas = _Measurement(1)
+        self.reaper.queued[1] = None
+        self.assertTrue(self.pool.claim(meas))
+        self.assertEqual(self.reaper.queued, {})
+        self.assertTrue(self.pool._leases[1].owned)
+        self.assertFalse(self.pool.held(meas))
+
+    def test_claim_unknown_measurement(self):
+        self.assertTrue(self.pool.claim(_Measurement(1)))
+        self.assertNotIn(1, self.pool._leases)
+
+if __name__ == "__main__":
+    unittest.main()
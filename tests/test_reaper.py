@@ -0,0 +1,79 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_reaper.MeasurementJournal
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import pvsr_reaper
+
+class MeasurementJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "measurements.journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _recover(self):
+        journal = pvsr_reaper.MeasurementJournal(self.path, 3600)
+        ids = journal.recover()
+        self.addCleanup(journal._file.close)
+        return (journal, ids)
+
+    def test_missing_journal(self):
+        (journal, ids) = self._recover()
+        self.assertEqual(ids, [])
+        self.assertTrue(os.path.isfile(self.path))
+
+    def test_recover_and_compact(self):
+        with open(self.path, "w") as f:
+            #the last record was torn by a crash
+            f.write("+3\n+1\n-3\n\n+2\nx7\n+4\n-1\n+5")
+        (journal, ids) = self._recover()
+        self.assertEqual(ids, [2, 4, 5])
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "+2\n+4\n+5\n")
+
+    def test_torn_record(self):
+        with open(self.path, "w") as f:
+            f.write("+1\n+2\n-")
+        (journal, ids) = self._recover()
+        self.assertEqual(ids, [1, 2])
+
+    def test_records_survive_restart(self):
+        (journal, ids) = self._recover()
+        journal.created(1)
+        journal.created(2)
+        journal.deleted(1)
+        journal.sync()
+        (journal, ids) = self._recover()
+        self.assertEqual(ids, [2])
+
+if __name__ == "__main__":
+    unittest.main()
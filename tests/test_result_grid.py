@@ -0,0 +1,136 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_result_grid.ResultGrid
+
+"""
+
+import datetime
+import unittest
+import numpy
+import pvsr_result_grid
+
+class _Result(object):
+    """
+    Records the values an mplane.model.Result would get
+    """
+    def __init__(self):
+        self.cells = {}
+
+    def set_result_value(self, name, value, row_index):
+        self.cells[(name, row_index)] = value
+
+class ResultGridTest(unittest.TestCase):
+    def test_rows(self):
+        grid = pvsr_result_grid.ResultGrid(1000, 1600, 60)
+        self.assertEqual(grid.rows, 10)
+        self.assertEqual(grid.times().tolist(), list(range(1060, 1601, 60)))
+
+    def test_set_column(self):
+        grid = pvsr_result_grid.ResultGrid(1000, 1600, 60)
+        #1090 falls between two rows, 1000 and 1660 are outside of the window
+        grid.set_column("a", [1060, 1090, 1120, 1000, 1660, 1600], [1, 2, None, 4, 5, 6])
+        self.assertEqual(numpy.flatnonzero(grid.valid["a"]).tolist(), [0, 9])
+        self.assertEqual(grid.values["a"][[0, 9]].tolist(), [1, 6])
+
+    def test_set_column_widens_type(self):
+        grid = pvsr_result_grid.ResultGrid(1000, 1600, 60)
+        grid.set_column("a", [1060], [1])
+        grid.set_column("a", [1120], [1.5])
+        self.assertEqual(grid.values["a"].dtype.kind, "f")
+        self.assertEqual(grid.values["a"][[0, 1]].tolist(), [1.0, 1.5])
+
+    def test_update_overlap(self):
+        grid = pvsr_result_grid.ResultGrid(1000, 1600, 60)
+        grid.set_column("a", [1060, 1120], [1, 2])
+        other = pvsr_result_grid.ResultGrid(1480, 1900, 60)
+        other.set_column("a", other.times(), list(range(other.rows)))
+        other.set_column("b", [1540], [7])
+        grid.update(other)
+        #only the rows 1540 and 1600 are in both windows
+        self.assertEqual(numpy.flatnonzero(grid.valid["a"]).tolist(), [0, 1, 8, 9])
+        self.assertEqual(grid.values["a"][[0, 1, 8, 9]].tolist(), [1, 2, 0, 1])
+        self.assertEqual(numpy.flatnonzero(grid.valid["b"]).tolist(), [8])
+
+    def test_update_keeps_valid_values(self):
+        grid = pvsr_result_grid.ResultGrid(1000, 1600, 60)
+        grid.set_column("a", [1060], [1])
+        other = pvsr_result_grid.ResultGrid(1000, 1600, 60)
+        other.set_column("a", [1120], [2])
+        grid.update(other)
+        self.assertEqual(grid.values["a"][[0, 1]].tolist(), [1, 2])
+        self.assertEqual(int(grid.valid["a"].sum()), 2)
+
+    def test_slice(self):
+        grid = pvsr_result_grid.ResultGrid(1000, 1600, 60)
+        grid.set_column("a", grid.times(), list(range(grid.rows)))
+        part = grid.slice(1120, 1300)
+        self.assertEqual(part.rows, 3)
+        self.assertEqual(part.values["a"].tolist(), [2, 3, 4])
+        self.assertIs(grid.slice(1000, 1600), grid)
+
+    def test_to_result(self):
+        grid = pvsr_result_grid.ResultGrid(1000, 1180, 60)
+        grid.set_column("a", [1120], [5])
+        res = grid.to_result(_Result(), 10)
+        self.assertEqual(res.cells[("time", 10)], datetime.datetime.utcfromtimestamp(1060))
+        self.assertEqual(res.cells[("time", 12)], datetime.datetime.utcfromtimestamp(1180))
+        #only the valid cells are set
+        self.assertEqual([k for k in res.cells if k[0] == "a"], [("a", 11)])
+        self.assertEqual(res.cells[("a", 11)], "5")
+
+class ResampleTest(unittest.TestCase):
+    def setUp(self):
+        #two rows of 180 seconds, the second one with a missing sample
+        self.grid = pvsr_result_grid.ResultGrid(0, 360, 60)
+        self.grid.set_column("a", [60, 120, 180, 240, 360], [3, 1, 2, 10, 20])
+
+    def resample(self, aggregate):
+        return self.grid.resample(180, {"a": aggregate})
+
+    def test_mean(self):
+        grid = self.resample("mean")
+        self.assertEqual(grid.rows, 2)
+        self.assertEqual(grid.values["a"].tolist(), [2.0, 15.0])
+
+    def test_min_max(self):
+        self.assertEqual(self.resample("min").values["a"].tolist(), [1, 10])
+        self.assertEqual(self.resample("max").values["a"].tolist(), [3, 20])
+
+    def test_last(self):
+        self.assertEqual(self.resample("last").values["a"].tolist(), [2, 20])
+
+    def test_missing_row(self):
+        grid = pvsr_result_grid.ResultGrid(0, 360, 60)
+        grid.set_column("a", [60], [1])
+        grid = grid.resample(180, {})
+        self.assertEqual(grid.valid["a"].tolist(), [True, False])
+
+    def test_invalid_period(self):
+        self.assertRaises(ValueError, self.grid.resample, 90, {})
+        self.assertRaises(ValueError, self.grid.resample, 240, {})
+        self.assertRaises(ValueError, self.grid.resample, 180, {"a": "median"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_scheduler.ReloadableScheduler
+
+"""
+
+import unittest
+
+try:
+    import pvsr_scheduler
+except ImportError:
+    pvsr_scheduler = None
+
+class _Capability(object):
+    def __init__(self, token):
+        self._token = token
+
+    def get_token(self):
+        return self._token
+
+class _Service(object):
+    def __init__(self, token):
+        self._cap = _Capability(token)
+
+    def capability(self):
+        return self._cap
+
+@unittest.skipIf(pvsr_scheduler is None, "needs mplane")
+class ReloadableSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = pvsr_scheduler.ReloadableScheduler()
+        self.old = _Service("old")
+        self.kept = _Service("kept")
+        self.scheduler.services = [self.old, self.kept]
+
+    def test_replace_services(self):
+        new = _Service("new")
+        self.scheduler.replace_services([new], [self.old])
+        self.assertEqual(self.scheduler.services, [self.kept, new])
+        self.assertEqual(sorted(self.scheduler.capability_keys()), ["kept", "new"])
+        self.assertIs(self.scheduler.capability_for_key("new"), new.capability())
+        self.assertRaises(KeyError, self.scheduler.capability_for_key, "old")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_series_cache.SeriesCache
+
+"""
+
+import unittest
+import pvsr_series_cache
+
+def _samples(first_time, last_time, period=60):
+    return [(t, [t]) for t in range(first_time, last_time + 1, period)]
+
+class SeriesCacheTest(unittest.TestCase):
+    def test_miss(self):
+        cache = pvsr_series_cache.SeriesCache(1000)
+        self.assertEqual(cache.lookup("m", 0, 600), ([], [(0, 600)]))
+
+    def test_hit(self):
+        cache = pvsr_series_cache.SeriesCache(1000)
+        cache.put("m", 0, 600, _samples(0, 600), 10000)
+        (samples, missing) = cache.lookup("m", 120, 300)
+        self.assertEqual(samples, _samples(120, 300))
+        self.assertEqual(missing, [])
+
+    def test_missing_sub_ranges(self):
+        cache = pvsr_series_cache.SeriesCache(1000)
+        cache.put("m", 300, 600, _samples(300, 600), 10000)
+        cache.put("m", 900, 1200, _samples(900, 1200), 10000)
+        (samples, missing) = cache.lookup("m", 0, 1500)
+        self.assertEqual(samples, _samples(300, 600) + _samples(900, 1200))
+        self.assertEqual(missing, [(0, 300), (600, 900), (1200, 1500)])
+
+    def test_stitching(self):
+        cache = pvsr_series_cache.SeriesCache(1000)
+        cache.put("m", 0, 600, _samples(0, 600), 10000)
+        cache.put("m", 900, 1200, _samples(900, 1200), 10000)
+        #fills the gap, the three ranges become one
+        cache.put("m", 600, 900, _samples(600, 900), 10000)
+        (samples, missing) = cache.lookup("m", 0, 1200)
+        self.assertEqual(samples, _samples(0, 1200))
+        self.assertEqual(missing, [])
+
+    def test_newer_samples_win(self):
+        cache = pvsr_series_cache.SeriesCache(1000)
+        cache.put("m", 0, 600, _samples(0, 600), 10000)
+        cache.put("m", 300, 900, [(t, ["new"]) for (t, v) in _samples(300, 900)], 10000)
+        (samples, missing) = cache.lookup("m", 0, 900)
+        self.assertEqual(samples[0], (0, [0]))
+        self.assertEqual(samples[5], (300, ["new"]))
+        self.assertEqual(len(samples), 16)
+
+    def test_not_loaded_data_is_not_cached(self):
+        cache = pvsr_series_cache.SeriesCache(1000)
+        cache.put("m", 0, 600, _samples(0, 600), 300)
+        (samples, missing) = cache.lookup("m", 0, 600)
+        self.assertEqual(samples, _samples(0, 300))
+        self.assertEqual(missing, [(300, 600)])
+        cache.put("other", 0, 600, _samples(0, 600), None)
+        self.assertEqual(cache.lookup("other", 0, 600), ([], [(0, 600)]))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = pvsr_series_cache.SeriesCache(25)
+        cache.put("a", 0, 600, _samples(0, 600), 10000)
+        cache.put("b", 0, 600, _samples(0, 600), 10000)
+        #a is used, b is the least recently used one
+        cache.lookup("a", 0, 600)
+        cache.put("c", 0, 600, _samples(0, 600), 10000)
+        self.assertEqual(cache.lookup("a", 0, 600)[1], [])
+        self.assertEqual(cache.lookup("b", 0, 600)[1], [(0, 600)])
+        self.assertEqual(cache.lookup("c", 0, 600)[1], [])
+
+if __name__ == "__main__":
+    unittest.main()
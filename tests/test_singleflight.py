@@ -0,0 +1,107 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_singleflight.SingleFlight
+
+"""
+
+import threading
+import unittest
+import pvsr_result_grid
+import pvsr_singleflight
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.single_flight = pvsr_singleflight.SingleFlight()
+
+    def attach(self, key, window, period=60):
+        return self.single_flight.attach(key, lambda flight: window, period)
+
+    def test_attach_to_covering_flight(self):
+        flight = self.single_flight.start("k", (0, 600))
+        (attached, window) = self.attach("k", (120, 300))
+        self.assertIs(attached, flight)
+        self.assertEqual(window, (120, 300))
+        self.assertEqual(flight.followers, 1)
+
+    def test_no_attach(self):
+        self.single_flight.start("k", (0, 600))
+        #other key, window not covered, window not on a row boundary
+        self.assertEqual(self.attach("other", (0, 600)), (None, None))
+        self.assertEqual(self.attach("k", (300, 900)), (None, None))
+        self.assertEqual(self.attach("k", (30, 330)), (None, None))
+
+    def test_window_unknown(self):
+        flight = self.single_flight.start("k")
+        self.assertEqual(self.attach("k", (0, 600)), (None, None))
+        flight.set_window(0, 600)
+        self.assertIs(self.attach("k", (0, 600))[0], flight)
+
+    def test_followers_get_their_slice(self):
+        flight = self.single_flight.start("k", (0, 600))
+        (attached, window) = self.attach("k", (120, 300))
+        grids = []
+        thread = threading.Thread(target=lambda: grids.append(attached.wait(window[0], window[1])))
+        thread.start()
+        grid = pvsr_result_grid.ResultGrid(0, 600, 60)
+        grid.set_column("a", grid.times(), list(range(grid.rows)))
+        self.single_flight.finish(flight, grid)
+        thread.join(5)
+        self.assertEqual(grids[0].values["a"].tolist(), [2, 3, 4])
+        #a finished flight cannot be attached to
+        self.assertEqual(self.attach("k", (0, 600)), (None, None))
+
+    def test_error_is_raised_to_followers(self):
+        flight = self.single_flight.start("k", (0, 600))
+        (attached, window) = self.attach("k", (0, 600))
+        self.single_flight.finish(flight, None, ValueError("failed"))
+        self.assertRaises(ValueError, attached.wait, window[0], window[1])
+
+    def test_interrupted_follower(self):
+        flight = self.single_flight.start("k", (0, 600))
+        (attached, window) = self.attach("k", (0, 600))
+        self.assertRaises(pvsr_singleflight.Interrupted, attached.wait, window[0], window[1], lambda: True)
+        self.single_flight.leave(attached)
+        self.assertEqual(flight.followers, 0)
+
+    def test_abandoned_flight(self):
+        flight = self.single_flight.start("k", (0, 600))
+        (attached, window) = self.attach("k", (0, 600))
+        self.single_flight.finish(flight, None, pvsr_singleflight.Abandoned())
+        self.assertRaises(pvsr_singleflight.Abandoned, attached.wait, window[0], window[1])
+        #the followers run on their own, one of them starts a new flight
+        self.assertEqual(self.attach("k", (0, 600)), (None, None))
+
+    def test_subscribe(self):
+        flight = self.single_flight.start("k", (0, 600))
+        called = []
+        flight.subscribe(lambda: called.append("before"))
+        self.assertEqual(called, [])
+        self.single_flight.finish(flight, pvsr_result_grid.ResultGrid(0, 600, 60))
+        flight.subscribe(lambda: called.append("after"))
+        self.assertEqual(called, ["before", "after"])
+        self.assertEqual(flight.result(120, 300).rows, 3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_soap_pool.PvsrClientPool
+
+"""
+
+import unittest
+import pvsr_soap_pool
+
+class WebFault(Exception):
+    """
+    Stands for suds.WebFault, a SOAP fault sent by PVSR
+    """
+
+class _Session(object):
+    """
+    PVSR SOAP client stand-in
+    """
+    def __init__(self):
+        self.options = {}
+
+    def set_options(self, **options):
+        self.options.update(options)
+
+    def getLastLoadedDataTimestamp(self, period):
+        return 0
+
+    def ok(self):
+        return self
+
+    def fault(self):
+        raise WebFault("no such equipment")
+
+    def transport_error(self):
+        raise ConnectionResetError("connection reset")
+
+class PvsrClientPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+        self.pool = pvsr_soap_pool.PvsrClientPool(self._factory, 1, 2, 60, 300, 0.2, 120)
+
+    def _factory(self):
+        session = _Session()
+        self.created.append(session)
+        return session
+
+    def test_session_is_reused(self):
+        self.assertIs(self.pool.ok(), self.pool.ok())
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(self.pool.stats(), (1, 1))
+
+    def test_call_timeout_is_the_request_timeout(self):
+        self.assertEqual(self.created[0].options, {"timeout": 120})
+
+    def test_fault_checks_the_session_in(self):
+        self.assertRaises(WebFault, self.pool.fault)
+        self.assertEqual(self.pool.stats(), (1, 1))
+        self.assertIs(self.pool.ok(), self.created[0])
+
+    def test_transport_error_discards_the_session(self):
+        self.assertRaises(ConnectionResetError, self.pool.transport_error)
+        self.assertEqual(self.pool.stats(), (0, 0))
+        self.assertIsNot(self.pool.ok(), self.created[0])
+        self.assertEqual(self.pool.stats(), (1, 1))
+
+    def test_checkout_timeout(self):
+        first = self.pool._checkout()
+        second = self.pool._checkout()
+        with self.assertRaises(TimeoutError):
+            self.pool._checkout()
+        self.pool._checkin(first)
+        self.assertIs(self.pool._checkout(), first)
+        self.pool._discard(second)
+        self.assertEqual(self.pool.stats(), (1, 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_watermark.WatermarkPoller
+
+"""
+
+import datetime
+import time
+import unittest
+import pvsr_watermark
+
+class _Pvsr(object):
+    """
+    PVSR client stand-in with a settable watermark
+    """
+    def __init__(self, loaded_until):
+        self.loaded_until = loaded_until
+        self.polls = 0
+
+    def getLastLoadedDataTimestamp(self, period):
+        self.polls += 1
+        if self.loaded_until is None:
+            raise OSError("connection refused")
+        return datetime.datetime.fromtimestamp(self.loaded_until)
+
+class WatermarkPollerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = int(time.time())
+        self.pvsr = _Pvsr(self.now - 600)
+        self.poller = pvsr_watermark.WatermarkPoller(self.pvsr, 0.05)
+
+    def test_poll_wakes_the_reached_waiters(self):
+        woken = []
+        reached = self.poller.subscribe(300, self.now - 900, self.now + 60, woken.append)
+        pending = self.poller.subscribe(300, self.now - 300, self.now + 60)
+        self.assertEqual(self.poller.poll(300), self.now - 600)
+        self.assertTrue(reached.event.is_set())
+        self.assertTrue(reached.loaded)
+        self.assertEqual(woken, [True])
+        self.assertFalse(pending.event.is_set())
+        self.assertEqual(self.poller.stats(), {300: (self.now - 600, 1)})
+        self.poller.unsubscribe(pending)
+        self.assertEqual(self.poller.stats(), {300: (self.now - 600, 0)})
+
+    def test_known_watermark_wakes_at_subscribe(self):
+        self.poller.poll(300)
+        polls = self.pvsr.polls
+        waiter = self.poller.subscribe(300, self.now - 900, self.now + 60)
+        self.assertTrue(waiter.loaded)
+        self.assertEqual(self.pvsr.polls, polls)
+
+    def test_failed_poll_keeps_the_watermark(self):
+        self.poller.poll(300)
+        self.pvsr.loaded_until = None
+        self.assertIsNone(self.poller.poll(300))
+        self.assertEqual(self.poller.loaded_until(300), self.now - 600)
+
+    def test_watermark_does_not_go_back(self):
+        self.poller.poll(300)
+        self.pvsr.loaded_until = self.now - 1200
+        self.poller.poll(300)
+        self.assertEqual(self.poller.loaded_until(300), self.now - 600)
+
+    def test_deadline(self):
+        waiter = self.poller.subscribe(300, self.now - 300, time.time() - 1)
+        (due, wake_at) = self.poller._due_periods(time.time())
+        self.assertTrue(waiter.event.is_set())
+        self.assertFalse(waiter.loaded)
+        self.assertEqual(due, [])
+
+    def test_open_window_is_not_polled(self):
+        self.poller.subscribe(300, self.now + 300, self.now + 600)
+        (due, wake_at) = self.poller._due_periods(self.now)
+        self.assertEqual(due, [])
+        self.assertEqual(wake_at, self.now + 0.05)
+
+    def test_wait(self):
+        self.pvsr.loaded_until = self.now
+        self.assertTrue(self.poller.wait(300, self.now - 300, time.time() + 10))
+        self.assertEqual(self.poller.stats()[300][1], 0)
+
+    def test_wait_times_out(self):
+        self.assertFalse(self.poller.wait(300, self.now - 300, time.time() + 0.2))
+
+    def test_wait_is_interrupted(self):
+        started = time.time()
+        self.assertFalse(self.poller.wait(300, self.now - 300, time.time() + 60, lambda: True))
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(self.poller.stats()[300][1], 0)
+
+if __name__ == "__main__":
+    unittest.main()
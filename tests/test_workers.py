@@ -0,0 +1,86 @@
+#
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
+#
+# mPlane Protocol Reference Implementation
+# Information Model and Element Registry
+#
+# (c) 2013-2014 mPlane Consortium (http://www.ict-mplane.eu)
+#               Author: Balazs Szabo <balazs.szabo@netvisor.hu>
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Tests of pvsr_workers
+
+"""
+
+import json
+import unittest
+import unittest.mock
+import pvsr_admission
+
+try:
+    import pvsr_workers
+except ImportError:
+    pvsr_workers = None
+
+class _Conn(object):
+    """
+    Pipe stand-in, the worker fails every specification with error
+    """
+    def __init__(self, worker, error):
+        self._worker = worker
+        self._error = error
+
+    def send_bytes(self, data):
+        msg = json.loads(data.decode("utf-8"))
+        call = self._worker._calls[msg["id"]]
+        call.reply = json.loads(json.dumps(pvsr_workers.error_reply(msg["id"], self._error)))
+        call.done.set()
+
+class _Spec(object):
+    pass
+
+@unittest.skipIf(pvsr_workers is None, "needs mplane")
+class WorkersTest(unittest.TestCase):
+    def _call(self, error):
+        worker = pvsr_workers.WorkerProcess(0, "pvsr_proxy_probe.cfg", [])
+        worker._conn = _Conn(worker, error)
+        with unittest.mock.patch("mplane.model.unparse_json", return_value="{}"):
+            return worker.call("label", _Spec(), lambda: False)
+
+    def test_rejection_is_raised_again(self):
+        with self.assertRaises(pvsr_admission.AdmissionRejected) as cm:
+            self._call(pvsr_admission.AdmissionRejected(5))
+        self.assertEqual(cm.exception.retry_after, 5)
+
+    def test_other_errors(self):
+        self.assertRaisesRegex(ValueError, "no such equipment", self._call, KeyError("no such equipment"))
+
+    def test_share_admission_limits(self):
+        admission = {"max_running": 64, "max_queued": 10, "max_running_per_equipment": 16}
+        pvsr_workers.share_admission_limits(admission, 3)
+        self.assertEqual(admission, {"max_running": 22, "max_queued": 4, "max_running_per_equipment": 16})
+        admission = {"max_running": 1, "max_queued": 0}
+        pvsr_workers.share_admission_limits(admission, 4)
+        self.assertEqual(admission, {"max_running": 1, "max_queued": 0})
+
+    def test_assign_shards(self):
+        shards = pvsr_workers.assign_shards(["a", "b", "c"], 2, {"a": 1, "b": 1})
+        self.assertEqual(shards[1][0:2], ["a", "b"])
+        self.assertEqual(sum(len(names) for names in shards.values()), 3)
+
+if __name__ == "__main__":
+    unittest.main()